@@ -0,0 +1,248 @@
+"""
+dataset.py - Deterministic synthetic datasets for benchmarks and scale tests
+
+This module writes users, topics, sessions and reviews directly into a
+DataStore database, bypassing the object mapper so that millions of rows can
+be generated in seconds. Generation is seeded: the same parameters always
+produce byte-for-byte identical data, so benchmark and capacity runs compare
+like with like.
+
+Skew controls shape the data like a real course would:
+- hot_topic_skew: Zipf exponent of review counts per topic (0 = uniform),
+  a few topics receive most of the reviews.
+- reviewer_skew: Zipf exponent of review counts per user (0 = uniform),
+  a few prolific reviewers write most of the reviews.
+
+Usage (from the repository root):
+    $ python3 -m benchmarks.dataset bench.db --reviews 1m --seed 42
+"""
+
+import argparse
+import datetime
+import itertools
+import math
+import random
+import time
+
+from src.data_management.data_store import DataStore, SQLiteConnection
+from src.data_management.partitioned_data_store import PartitionedDataStore
+from src.user_management.user_info import UserInfo
+
+DEFAULT_PASSWORD = "bench_password"
+SIZE_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+BASE_TIME = datetime.datetime(2023, 10, 1, 9, 0, 0)
+# P(rating) for ratings 1-10, skewed towards the upper half like real peer reviews
+RATING_WEIGHTS = (1, 1, 2, 3, 5, 8, 12, 15, 13, 8)
+WORDS = ("the team met on time and everyone contributed to the design review we split the work "
+         "evenly although communication could improve before the next milestone the code was "
+         "tested carefully and documented well attendance at meetings was consistent and the "
+         "critical reviews raised useful points about the database schema and the user interface").split()
+
+
+def parse_size(size: str) -> int:
+    """
+    Parses a human readable dataset size such as "1k", "100k" or "1m".
+
+    Args:
+        size (str): The size to parse.
+
+    Returns:
+        int: The number of rows the size stands for.
+    """
+    size = size.strip().lower()
+    if size[-1] in SIZE_SUFFIXES:
+        return int(float(size[:-1]) * SIZE_SUFFIXES[size[-1]])
+    return int(size)
+
+
+def _zipf_cum_weights(count: int, exponent: float) -> list:
+    """
+    Builds cumulative Zipf weights for random.choices.
+
+    Args:
+        count (int): The number of items.
+        exponent (float): The Zipf exponent, 0 gives a uniform distribution.
+
+    Returns:
+        list: The cumulative weights of the items, the first item being the most likely.
+    """
+    return list(itertools.accumulate(1 / (rank ** exponent) for rank in range(1, count + 1)))
+
+
+class DatasetGenerator:
+    """Generates a reproducible synthetic Feedback Flow dataset."""
+
+    def __init__(self, users: int, topics: int, reviews: int, seed: int = 0,
+                 hot_topic_skew: float = 1.0, reviewer_skew: float = 1.0,
+                 session_fraction: float = 1.0, published_fraction: float = 0.8,
+                 mean_review_words: int = 40, password: str = DEFAULT_PASSWORD):
+        """
+        Initializes the generator.
+
+        Args:
+            users (int): The number of users.
+            topics (int): The number of topics.
+            reviews (int): The number of reviews.
+            seed (int): Seed of the random generator.
+            hot_topic_skew (float): Zipf exponent of reviews per topic.
+            reviewer_skew (float): Zipf exponent of reviews per user.
+            session_fraction (float): Fraction of users that have a session row.
+            published_fraction (float): Fraction of reviews that are published rather than drafts.
+            mean_review_words (int): Mean review length in words (log-normally distributed).
+            password (str): The password every generated user logs in with.
+        """
+        if users < 1 or topics < 1:
+            raise ValueError("A dataset needs at least one user and one topic.")
+        self.users = users
+        self.topics = topics
+        self.reviews = reviews
+        self.seed = seed
+        self.hot_topic_skew = hot_topic_skew
+        self.reviewer_skew = reviewer_skew
+        self.session_fraction = session_fraction
+        self.published_fraction = published_fraction
+        self.mean_review_words = mean_review_words
+        self.password = password
+
+    @classmethod
+    def for_reviews(cls, reviews: int, seed: int = 0, users: int = None, topics: int = None, **kwargs):
+        """
+        Creates a generator with users and topics scaled to the review count.
+
+        Args:
+            reviews (int): The number of reviews.
+            seed (int): Seed of the random generator.
+            users (int, optional): The number of users, one per 20 reviews by default.
+            topics (int, optional): The number of topics, one per 50 reviews by default.
+            **kwargs: Further DatasetGenerator arguments.
+
+        Returns:
+            DatasetGenerator: The configured generator.
+        """
+        return cls(users=users or max(10, reviews // 20), topics=topics or max(5, reviews // 50),
+                   reviews=reviews, seed=seed, **kwargs)
+
+    def _new_id(self, rng: random.Random) -> str:
+        """Returns a 32 character hex id, like uuid.uuid4().hex, drawn from the seeded generator."""
+        return f"{rng.getrandbits(128):032x}"
+
+    def _ratings(self, rng: random.Random, cum_weights: list) -> str:
+        """Returns the four ratings of a review, encoded the way Review.review_ratings stores them."""
+        return "[%d, %d, %d, %d]" % tuple(rng.choices(range(1, 11), cum_weights=cum_weights, k=4))
+
+    def _review_text(self, rng: random.Random, corpus: list) -> str:
+        """Returns review text with a log-normally distributed number of words."""
+        sigma = 0.6
+        mu = math.log(self.mean_review_words) - sigma ** 2 / 2
+        length = max(1, min(len(corpus) // 2, int(rng.lognormvariate(mu, sigma))))
+        start = rng.randrange(len(corpus) - length)
+        return " ".join(corpus[start:start + length]).capitalize() + "."
+
+    def write(self, db_path: str) -> dict:
+        """
+        Clears the database and writes the dataset into it.
+
+        Args:
+            db_path (str): The database name, relative to src/database/.
+
+        Returns:
+            dict: Usernames, user ids, (topic id, topic name) pairs, the password
+            and the time generation took.
+        """
+        started = time.perf_counter()
+        rng = random.Random(self.seed)
+        data_store = DataStore.open(db_path)
+        data_store.clear_tables()
+        hashed_password = UserInfo(db_path)._hash_password(self.password, salt=b"\0" * 16)
+        corpus = [rng.choice(WORDS) for _ in range(4096)]
+
+        users = [(self._new_id(rng), f"user{i}", f"user{i}@example.com", hashed_password)
+                 for i in range(self.users)]
+        topics = [(self._new_id(rng), users[rng.randrange(self.users)][0], f"topic{i}",
+                   f"Description of topic {i}") for i in range(self.topics)]
+
+        sessions = []
+        for user in users:
+            if rng.random() < self.session_fraction:
+                created_at = BASE_TIME + datetime.timedelta(seconds=rng.randrange(30 * 24 * 3600))
+                last_activity_at = created_at + datetime.timedelta(seconds=rng.randrange(3600))
+                sessions.append((self._new_id(rng), user[0], created_at,
+                                 created_at + datetime.timedelta(hours=1), last_activity_at,
+                                 int(rng.random() < 0.3)))
+
+        reviewer_weights = _zipf_cum_weights(self.users, self.reviewer_skew)
+        topic_weights = _zipf_cum_weights(self.topics, self.hot_topic_skew)
+        rating_weights = list(itertools.accumulate(RATING_WEIGHTS))
+
+        def reviews():
+            authors = rng.choices(users, cum_weights=reviewer_weights, k=self.reviews)
+            reviewed = rng.choices(topics, cum_weights=topic_weights, k=self.reviews)
+            for author, topic in zip(authors, reviewed):
+                status = "published" if rng.random() < self.published_fraction else "draft"
+                yield (self._new_id(rng), author[0], topic[0], self._review_text(rng, corpus),
+                       status, self._ratings(rng, rating_weights))
+
+        with SQLiteConnection(data_store.db_path) as connection:
+            connection.execute("PRAGMA synchronous=OFF;")
+            for table, rows in (("user", users), ("topic", topics), ("session", sessions),
+                                ("review", reviews())):
+                query, columns = self._insert_query(table)
+                # ids and timestamps are written in the form DataStore stores them in
+                connection.executemany(query, (data_store._adapt(table, columns, row) for row in rows))
+        if isinstance(data_store, PartitionedDataStore):
+            # the reviews were written to the main database, move them into the shards
+            data_store.rebalance()
+
+        return {
+            "usernames": [user[1] for user in users],
+            "user_ids": [user[0] for user in users],
+            "topics": [(topic[0], topic[2]) for topic in topics],
+            "password": self.password,
+            "generation_time_s": round(time.perf_counter() - started, 3),
+        }
+
+    @staticmethod
+    def _insert_query(table: str) -> str:
+        """
+        Builds the INSERT statement matching the tuple layout the generator uses.
+
+        Args:
+            table (str): The table name.
+
+        Returns:
+            Tuple[str, tuple]: The parametrised INSERT statement and its columns.
+        """
+        columns = {
+            "user": ("id", "username", "email", "hashed_password"),
+            "topic": ("id", "user_id", "name", "description"),
+            "session": ("id", "user_id", "created_at", "expires_at", "last_activity_at", "is_active"),
+            "review": ("id", "user_id", "topic_id", "review_text", "status", "review_ratings"),
+        }[table]
+        return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})", columns
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic Feedback Flow database.")
+    parser.add_argument("db_path", help="database name, relative to src/database/")
+    parser.add_argument("--reviews", default="1k", help="number of reviews, e.g. 1000, 100k or 1m")
+    parser.add_argument("--users", type=int, help="number of users (default: reviews / 20)")
+    parser.add_argument("--topics", type=int, help="number of topics (default: reviews / 50)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--hot-topic-skew", type=float, default=1.0)
+    parser.add_argument("--reviewer-skew", type=float, default=1.0)
+    parser.add_argument("--session-fraction", type=float, default=1.0)
+    parser.add_argument("--published-fraction", type=float, default=0.8)
+    args = parser.parse_args(argv)
+
+    reviews = parse_size(args.reviews)
+    generator = DatasetGenerator.for_reviews(
+        reviews, seed=args.seed, users=args.users, topics=args.topics,
+        hot_topic_skew=args.hot_topic_skew, reviewer_skew=args.reviewer_skew,
+        session_fraction=args.session_fraction, published_fraction=args.published_fraction)
+    summary = generator.write(args.db_path)
+    print(f"Wrote {generator.users} users, {generator.topics} topics and {reviews} reviews "
+          f"to src/database/{args.db_path} in {summary['generation_time_s']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+"""
+http_bench.py - End-to-end HTTP load tests for the WebServer routes
+
+This module drives a WebServer instance in-process through its WSGI interface
+(no sockets involved) against synthetic databases of a configurable number of
+reviews. For every route it measures throughput and p50/p95/p99 latency at
+one or more concurrency levels and emits the results as JSON so runs can be
+compared against each other.
+
+Usage (from the repository root):
+    $ python3 -m benchmarks.http_bench --sizes 1k,100k --concurrency 1,8 \
+          --requests 200 --output bench.json
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
+
+from benchmarks.dataset import DEFAULT_PASSWORD, DatasetGenerator, parse_size
+from src.data_management.data_store import DataStore
+from src.data_management.partitioned_data_store import PartitionedDataStore
+from src.server.server_app import WebServer
+
+ROUTES = ("/login", "/topics", "/reviews", "/reviews/search", "create_review")
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """
+    Returns the nearest-rank percentile of an already sorted list.
+
+    Args:
+        sorted_values (list): The values, sorted in ascending order.
+        pct (float): The percentile to compute, between 0 and 100.
+
+    Returns:
+        float: The value at the given percentile, 0.0 for an empty list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class WSGIClient:
+    """Calls a WSGI application in-process, without going through a socket."""
+
+    def __init__(self, app):
+        """
+        Initializes the client.
+
+        Args:
+            app: The WSGI application to call.
+        """
+        self.app = app
+
+    def request(self, method: str, path: str, form: dict = None, cookie: str = None):
+        """
+        Performs one request against the application.
+
+        Args:
+            method (str): The HTTP method.
+            path (str): The request path.
+            form (dict, optional): Form fields sent url-encoded in the body.
+            cookie (str, optional): The value of the Cookie header.
+
+        Returns:
+            Tuple[int, dict, bytes]: The status code, headers and body.
+        """
+        body = urlencode(form or {}).encode("utf-8")
+        environ = {}
+        setup_testing_defaults(environ)
+        environ.update({
+            "REQUEST_METHOD": method,
+            "PATH_INFO": path,
+            "QUERY_STRING": "",
+            "CONTENT_TYPE": "application/x-www-form-urlencoded",
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.input": io.BytesIO(body),
+        })
+        if cookie:
+            environ["HTTP_COOKIE"] = cookie
+
+        captured = {}
+
+        def start_response(status, headers, exc_info=None):
+            captured["status"] = int(status.split()[0])
+            captured["headers"] = headers
+
+        result = self.app(environ, start_response)
+        try:
+            payload = b"".join(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        return captured["status"], dict(captured["headers"]), payload
+
+
+class HTTPBenchmark:
+    """Runs the route scenarios against a single populated database."""
+
+    def __init__(self, db_path: str, dataset: dict, seed: int = 0):
+        """
+        Initializes the benchmark with a populated database.
+
+        Args:
+            db_path (str): The database name, relative to src/database/.
+            dataset (dict): The dataset summary returned by DatasetGenerator.write().
+            seed (int): Seed used to pick users, topics and queries.
+        """
+        self.server = WebServer()
+        self.server.database_path = db_path
+        # the load comes from one address on purpose, measure the handlers rather than the rate limit
+        self.server.uninstall(self.server.admission)
+        self.client = WSGIClient(self.server)
+        self.dataset = dataset
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.cookie = self._login(dataset["usernames"][0])
+
+    def _login(self, username: str) -> str:
+        """
+        Logs a user in and returns the session cookie to send with requests.
+
+        Args:
+            username (str): The user to log in.
+
+        Returns:
+            str: The "name=value" part of the session cookie.
+        """
+        status, headers, _ = self.client.request(
+            "POST", "/login", {"username": username, "password": self.dataset["password"]})
+        return headers.get("Set-Cookie", "").split(";")[0]
+
+    def _choice(self, values):
+        """Picks a random element, the generator is shared between worker threads."""
+        with self.rng_lock:
+            return self.rng.choice(values)
+
+    def scenario(self, route: str):
+        """
+        Returns a callable performing one request for the given route.
+
+        Args:
+            route (str): One of ROUTES.
+
+        Returns:
+            callable: A function returning the response status code.
+        """
+        if route == "/login":
+            return lambda: self.client.request(
+                "POST", "/login",
+                {"username": self._choice(self.dataset["usernames"]), "password": self.dataset["password"]})[0]
+        if route == "/topics":
+            return lambda: self.client.request("GET", "/topics", cookie=self.cookie)[0]
+        if route == "/reviews":
+            return lambda: self.client.request("GET", "/reviews", cookie=self.cookie)[0]
+        if route == "/reviews/search":
+            return lambda: self.client.request(
+                "POST", "/reviews/search", {"query": self._choice(self.dataset["topics"])[1]},
+                cookie=self.cookie)[0]
+        if route == "create_review":
+            def create_review():
+                topic_id = self._choice(self.dataset["topics"])[0]
+                form = {"review_text": "Benchmark review", "effort": 5, "communication": 5,
+                        "participation": 5, "attendance": 5, "publish": "1"}
+                return self.client.request("POST", f"/topics/{topic_id}/create_review", form,
+                                           cookie=self.cookie)[0]
+            return create_review
+        raise ValueError(f"Unknown route: {route}")
+
+    def run(self, route: str, requests: int, concurrency: int) -> dict:
+        """
+        Issues a number of requests against a route and measures them.
+
+        Args:
+            route (str): One of ROUTES.
+            requests (int): The total number of requests to issue.
+            concurrency (int): The number of requests in flight at once.
+
+        Returns:
+            dict: Throughput, latency percentiles and status code counts.
+        """
+        call = self.scenario(route)
+        latencies = []
+        statuses = {}
+        lock = threading.Lock()
+        remaining = iter(range(requests))
+
+        def worker():
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                start = time.perf_counter()
+                try:
+                    status = call()
+                except Exception as e:
+                    status = type(e).__name__
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for _ in range(concurrency):
+                executor.submit(worker)
+        wall_time = time.perf_counter() - started
+
+        latencies.sort()
+
+        def to_ms(seconds):
+            return round(seconds * 1000, 3)
+
+        return {
+            "route": route,
+            "concurrency": concurrency,
+            "requests": len(latencies),
+            "wall_time_s": round(wall_time, 4),
+            "throughput_rps": round(len(latencies) / wall_time, 2) if wall_time else 0.0,
+            "latency_ms": {
+                "mean": to_ms(sum(latencies) / len(latencies)) if latencies else 0.0,
+                "p50": to_ms(percentile(latencies, 50)),
+                "p95": to_ms(percentile(latencies, 95)),
+                "p99": to_ms(percentile(latencies, 99)),
+                "max": to_ms(latencies[-1]) if latencies else 0.0,
+            },
+            "status_counts": statuses,
+        }
+
+
+def run_benchmarks(sizes, routes=ROUTES, concurrency=(1,), requests: int = 100,
+                   seed: int = 0, rebuild: bool = False, shards: int = None) -> dict:
+    """
+    Runs every route at every concurrency level against every dataset size.
+
+    Args:
+        sizes (list): Dataset sizes, as review counts or strings like "100k".
+        routes (tuple): The routes to benchmark.
+        concurrency (tuple): The concurrency levels to run each route at.
+        requests (int): The number of requests per route and concurrency level.
+        seed (int): Seed for dataset generation and request selection.
+        rebuild (bool): Regenerate databases even if they already exist.
+        shards (int, optional): Shard the reviews across this many files, see PartitionedDataStore.
+
+    Returns:
+        dict: The machine-readable report.
+    """
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "requests": requests,
+            "seed": seed,
+            "shards": shards,
+        },
+        "results": [],
+    }
+    # UserInfo.login prints every user it scans, keep that out of the timings' way
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for size in sizes:
+            review_count = parse_size(str(size))
+            db_path = f"bench_{review_count}_{shards}shards.db" if shards else f"bench_{review_count}.db"
+            started = time.perf_counter()
+            if shards:
+                PartitionedDataStore.enable(db_path, shards)
+            if rebuild or not os.path.exists("src/database/" + db_path):
+                dataset = DatasetGenerator.for_reviews(review_count, seed).write(db_path)
+            else:
+                dataset = _describe(db_path)
+            populate_time = time.perf_counter() - started
+            benchmark = HTTPBenchmark(db_path, dataset, seed)
+            for route in routes:
+                for level in concurrency:
+                    result = benchmark.run(route, requests, level)
+                    result.update({"dataset": str(size), "reviews": review_count,
+                                   "setup_time_s": round(populate_time, 3)})
+                    report["results"].append(result)
+            PartitionedDataStore.disable(db_path)
+    return report
+
+
+def _describe(db_path: str) -> dict:
+    """
+    Reads the usernames and topics of an already populated database.
+
+    Args:
+        db_path (str): The database name, relative to src/database/.
+
+    Returns:
+        dict: The same structure DatasetGenerator.write() returns.
+    """
+    data_store = DataStore.open(db_path)
+    usernames = [row[0] for row in data_store.load_rows("user", columns=["username"])]
+    topics = data_store.load_rows("topic", columns=["id", "name"])
+    return {"usernames": usernames, "topics": topics, "password": DEFAULT_PASSWORD}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end HTTP benchmarks for Feedback Flow.")
+    parser.add_argument("--sizes", default="1k,100k,1m",
+                        help="comma separated dataset sizes in reviews (default: 1k,100k,1m)")
+    parser.add_argument("--routes", default=",".join(ROUTES), help="comma separated routes to run")
+    parser.add_argument("--concurrency", default="1,4", help="comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=100, help="requests per route and concurrency level")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rebuild", action="store_true", help="regenerate the benchmark databases")
+    parser.add_argument("--shards", type=int, help="shard the reviews across this many database files")
+    parser.add_argument("--output", help="file to write the JSON report to (default: stdout)")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(
+        sizes=args.sizes.split(","),
+        routes=tuple(args.routes.split(",")),
+        concurrency=tuple(int(level) for level in args.concurrency.split(",")),
+        requests=args.requests,
+        seed=args.seed,
+        rebuild=args.rebuild,
+        shards=args.shards,
+    )
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    else:
+        sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+"""
+micro_bench.py - Micro-benchmarks and regression gates for the data layer
+
+This module times the hot paths of the data layer (DataStore, ObjectMapper,
+SessionManager and UserInfo.search_review) against a populated database.
+Every benchmark is warmed up, repeated a number of times and summarised
+statistically. Results can be stored on disk as a baseline, and a regression
+mode compares a new run against that baseline and fails when a benchmark got
+slower than a configurable threshold.
+
+Usage (from the repository root):
+    $ python3 -m benchmarks.micro_bench --save-baseline
+    $ python3 -m benchmarks.micro_bench --check --threshold 0.2
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import time
+
+from benchmarks.dataset import DatasetGenerator
+from src.app_logic.app_logic import Review
+from src.data_management.data_store import DataStore
+from src.data_management.object_mapper import ObjectMapper
+from src.user_management.session_management import SessionManager
+from src.user_management.user_info import UserInfo
+
+DEFAULT_BASELINE = "benchmarks/baselines/micro_bench.json"
+BENCHMARKS = {}
+
+
+def benchmark(name: str):
+    """
+    Registers a benchmark factory under the given name.
+
+    A factory receives the BenchContext and the number of operations to run,
+    does its (untimed) preparation and returns a callable performing the i-th
+    timed operation.
+
+    Args:
+        name (str): The name the benchmark is reported and baselined under.
+    """
+    def register(factory):
+        BENCHMARKS[name] = factory
+        return factory
+    return register
+
+
+class BenchContext:
+    """The populated database and the objects the benchmarks run against."""
+
+    def __init__(self, db_path: str, review_count: int, seed: int = 0):
+        """
+        Populates the database and sets up the data layer objects.
+
+        Args:
+            db_path (str): The database name, relative to src/database/.
+            review_count (int): The number of reviews to populate the database with.
+            seed (int): Seed for the dataset generator.
+        """
+        self.db_path = db_path
+        self.dataset = DatasetGenerator.for_reviews(review_count, seed).write(db_path)
+        self.data_store = DataStore(db_path)
+        self.object_mapper = ObjectMapper(db_path)
+        self.session_manager = SessionManager(db_path)
+        self.user_info = UserInfo(db_path)
+        self.user_ids = self.dataset["user_ids"]
+        self.review_ids = [row["id"] for row in self.data_store.load("review")]
+        self.topic_ids = [topic_id for topic_id, _ in self.dataset["topics"]]
+        self.counter = 0
+
+    def unique(self) -> int:
+        """Returns a number that has not been handed out before, for unique column values."""
+        self.counter += 1
+        return self.counter
+
+    def new_review(self) -> Review:
+        """Returns a new, unsaved review for an existing user and topic."""
+        n = self.unique()
+        return Review(f"Micro benchmark review {n}", self.user_ids[n % len(self.user_ids)],
+                      self.topic_ids[n % len(self.topic_ids)], "published", "[5, 5, 5, 5]")
+
+
+@benchmark("data_store.save")
+def bench_data_store_save(ctx, number):
+    rows = [ctx.new_review().data for _ in range(number)]
+    return lambda i: ctx.data_store.save(rows[i], "review")
+
+
+@benchmark("data_store.load_all")
+def bench_data_store_load_all(ctx, number):
+    return lambda i: ctx.data_store.load("review")
+
+
+@benchmark("data_store.load_by_id")
+def bench_data_store_load_by_id(ctx, number):
+    ids = ctx.review_ids
+    return lambda i: ctx.data_store.load("review", id=ids[i % len(ids)])
+
+
+@benchmark("data_store.delete")
+def bench_data_store_delete(ctx, number):
+    rows = [ctx.new_review().data for _ in range(number)]
+    for row in rows:
+        ctx.data_store.save(row, "review")
+    return lambda i: ctx.data_store.delete(rows[i]["id"], "review")
+
+
+@benchmark("object_mapper.add")
+def bench_object_mapper_add(ctx, number):
+    reviews = [ctx.new_review() for _ in range(number)]
+    return lambda i: ctx.object_mapper.add(reviews[i])
+
+
+@benchmark("object_mapper.get_all")
+def bench_object_mapper_get_all(ctx, number):
+    return lambda i: ctx.object_mapper.get(Review)
+
+
+@benchmark("object_mapper.get_by_id")
+def bench_object_mapper_get_by_id(ctx, number):
+    ids = ctx.review_ids
+    return lambda i: ctx.object_mapper.get(Review, id=ids[i % len(ids)])
+
+
+@benchmark("object_mapper.remove")
+def bench_object_mapper_remove(ctx, number):
+    reviews = [ctx.new_review() for _ in range(number)]
+    for review in reviews:
+        ctx.object_mapper.add(review)
+    return lambda i: ctx.object_mapper.remove(reviews[i])
+
+
+@benchmark("session_manager.get_user_session")
+def bench_get_user_session(ctx, number):
+    user_ids = ctx.user_ids
+    return lambda i: ctx.session_manager.get_user_session(user_ids[-1 - i % len(user_ids)])
+
+
+@benchmark("user_info.search_review")
+def bench_search_review(ctx, number):
+    names = [name for _, name in ctx.dataset["topics"]]
+    return lambda i: ctx.user_info.search_review(names[i % len(names)])
+
+
+def summarize(samples: list) -> dict:
+    """
+    Computes summary statistics over per-operation timings.
+
+    Args:
+        samples (list): The mean time per operation of every repetition, in seconds.
+
+    Returns:
+        dict: min, median, mean, stdev and max in microseconds.
+    """
+    def to_us(seconds):
+        return round(seconds * 1_000_000, 3)
+
+    return {
+        "min_us": to_us(min(samples)),
+        "median_us": to_us(statistics.median(samples)),
+        "mean_us": to_us(statistics.mean(samples)),
+        "stdev_us": to_us(statistics.stdev(samples)) if len(samples) > 1 else 0.0,
+        "max_us": to_us(max(samples)),
+        "repetitions": len(samples),
+    }
+
+
+def run_benchmark(ctx: BenchContext, name: str, number: int, repetitions: int, warmup: int) -> dict:
+    """
+    Runs a single registered benchmark.
+
+    Args:
+        ctx (BenchContext): The context to run against.
+        name (str): The registered benchmark name.
+        number (int): The operations timed per repetition.
+        repetitions (int): The repetitions kept for the summary.
+        warmup (int): Repetitions run first and discarded.
+
+    Returns:
+        dict: The summary statistics of the benchmark.
+    """
+    factory = BENCHMARKS[name]
+    samples = []
+    for repetition in range(warmup + repetitions):
+        op = factory(ctx, number)
+        start = time.perf_counter()
+        for i in range(number):
+            op(i)
+        elapsed = time.perf_counter() - start
+        if repetition >= warmup:
+            samples.append(elapsed / number)
+    result = summarize(samples)
+    result["number"] = number
+    return result
+
+
+def run_all(names=None, review_count: int = 1000, number: int = 20, repetitions: int = 5,
+            warmup: int = 1, seed: int = 0, db_path: str = "micro_bench.db") -> dict:
+    """
+    Runs the selected benchmarks and returns a report.
+
+    Args:
+        names (list, optional): Benchmarks to run, all registered ones by default.
+        review_count (int): The number of reviews in the benchmark database.
+        number (int): The operations timed per repetition.
+        repetitions (int): The repetitions kept for the summary.
+        warmup (int): Repetitions run first and discarded.
+        seed (int): Seed for the dataset generator.
+        db_path (str): The database name, relative to src/database/.
+
+    Returns:
+        dict: The report, with a "benchmarks" entry per benchmark name.
+    """
+    ctx = BenchContext(db_path, review_count, seed)
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "reviews": review_count,
+            "seed": seed,
+        },
+        "benchmarks": {},
+    }
+    # UserInfo and SessionManager print while they work, keep that out of the timings
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for name in names or BENCHMARKS:
+            report["benchmarks"][name] = run_benchmark(ctx, name, number, repetitions, warmup)
+    return report
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list:
+    """
+    Compares a report against a baseline.
+
+    A benchmark regressed when its median is more than `threshold` (a
+    fraction, 0.2 meaning 20%) slower than the baseline median. Benchmarks
+    missing from the baseline are ignored.
+
+    Args:
+        report (dict): The report of the current run.
+        baseline (dict): A previously stored report.
+        threshold (float): The allowed slowdown as a fraction.
+
+    Returns:
+        list: One dictionary per regressed benchmark.
+    """
+    regressions = []
+    for name, result in report["benchmarks"].items():
+        base = baseline.get("benchmarks", {}).get(name)
+        if not base or not base["median_us"]:
+            continue
+        ratio = result["median_us"] / base["median_us"]
+        if ratio > 1 + threshold:
+            regressions.append({"benchmark": name, "baseline_us": base["median_us"],
+                                "current_us": result["median_us"], "ratio": round(ratio, 3)})
+    return regressions
+
+
+def save_baseline(report: dict, path: str = DEFAULT_BASELINE):
+    """
+    Stores a report on disk as the baseline for future runs.
+
+    Args:
+        report (dict): The report to store.
+        path (str): Where to write the baseline.
+    """
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(report, file, indent=2)
+
+
+def load_baseline(path: str = DEFAULT_BASELINE) -> dict:
+    """
+    Loads a stored baseline.
+
+    Args:
+        path (str): The baseline file.
+
+    Returns:
+        dict: The stored report.
+    """
+    with open(path) as file:
+        return json.load(file)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Data layer micro-benchmarks for Feedback Flow.")
+    parser.add_argument("--benchmarks", help="comma separated benchmark names (default: all)")
+    parser.add_argument("--reviews", type=int, default=1000, help="reviews in the benchmark database")
+    parser.add_argument("--number", type=int, default=20, help="operations timed per repetition")
+    parser.add_argument("--repetitions", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1, help="repetitions discarded before measuring")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline file")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--check", action="store_true", help="fail when slower than the baseline")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed slowdown against the baseline median (default: 0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    report = run_all(
+        names=args.benchmarks.split(",") if args.benchmarks else None,
+        review_count=args.reviews,
+        number=args.number,
+        repetitions=args.repetitions,
+        warmup=args.warmup,
+        seed=args.seed,
+    )
+    print(json.dumps(report, indent=2))
+
+    if args.save_baseline:
+        save_baseline(report, args.baseline)
+    if args.check:
+        regressions = compare(report, load_baseline(args.baseline), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression['benchmark']}: {regression['baseline_us']}us -> "
+                  f"{regression['current_us']}us (x{regression['ratio']})", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
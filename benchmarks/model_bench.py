@@ -0,0 +1,115 @@
+"""
+model_bench.py - Memory and throughput of loading reviews into model objects
+
+This module compares the slots-based models hydrated straight from row
+tuples (ObjectMapper.get) with the previous dict-backed models built from
+the dictionaries of DataStore.load. For both it reports the load throughput,
+the memory retained by the loaded objects and the peak memory while loading,
+as well as the cost of reading every review's ratings four times, as the
+review templates do.
+
+Usage (from the repository root):
+    $ python3 -m benchmarks.model_bench --reviews 1m
+"""
+
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+from benchmarks.dataset import DatasetGenerator, parse_size
+from src.app_logic.app_logic import Review
+from src.data_management.object_mapper import ObjectMapper
+
+
+class DictReview:
+    """The dict-backed review model, as it was before the slots-based models."""
+
+    def __init__(self, review_text, user_id, topic_id, status="draft", review_ratings=None, id=None):
+        self.id = id
+        self.review_text = review_text
+        self.user_id = user_id
+        self.topic_id = topic_id
+        self.status = status
+        self.review_ratings = review_ratings or '[]'
+
+    @property
+    def ratings(self):
+        return json.loads(self.review_ratings)
+
+
+def load_dict_models(object_mapper: ObjectMapper) -> list:
+    """Loads every review through DataStore.load and keyword construction."""
+    return [DictReview(**row) for row in object_mapper.data_store.load("review")]
+
+
+def load_slots_models(object_mapper: ObjectMapper) -> list:
+    """Loads every review through ObjectMapper.get."""
+    return object_mapper.get(Review)
+
+
+def measure(loader, object_mapper: ObjectMapper) -> dict:
+    """
+    Measures one way of loading the reviews.
+
+    Args:
+        loader: The function loading all reviews.
+        object_mapper (ObjectMapper): The mapper of the populated database.
+
+    Returns:
+        dict: Load time and throughput, retained and peak memory, and ratings access time.
+    """
+    gc.collect()
+    started = time.perf_counter()
+    reviews = loader(object_mapper)
+    load_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for review in reviews:
+        for index in range(4):
+            review.ratings[index]
+    ratings_time = time.perf_counter() - started
+    count = len(reviews)
+    del reviews
+
+    gc.collect()
+    tracemalloc.start()
+    reviews = loader(object_mapper)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del reviews
+
+    return {
+        "reviews": count,
+        "load_time_s": round(load_time, 3),
+        "reviews_per_s": round(count / load_time) if load_time else 0,
+        "ratings_x4_time_s": round(ratings_time, 3),
+        "retained_mb": round(retained / 2 ** 20, 1),
+        "peak_mb": round(peak / 2 ** 20, 1),
+        "bytes_per_review": round(retained / count) if count else 0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Model hydration memory and throughput benchmark.")
+    parser.add_argument("--reviews", default="1m", help="number of reviews, e.g. 100k or 1m")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rebuild", action="store_true", help="regenerate the benchmark database")
+    args = parser.parse_args(argv)
+
+    review_count = parse_size(args.reviews)
+    db_path = f"model_bench_{review_count}.db"
+    object_mapper = ObjectMapper(db_path)
+    if args.rebuild or not object_mapper.data_store.load_rows("review", columns=["id"]):
+        DatasetGenerator.for_reviews(review_count, args.seed).write(db_path)
+
+    report = {
+        "dict_models": measure(load_dict_models, object_mapper),
+        "slots_models": measure(load_slots_models, object_mapper),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,53 +1,214 @@
 import datetime
 import uuid
 import json
+import keyword
+
+# Row loaders generated by Base.row_loader, keyed by (model class, column names)
+_ROW_LOADERS = {}
 
 class Base:
+    """
+    Base of the models. Models declare their columns in FIELDS and store them in
+    __slots__, so instances carry no per-instance __dict__.
+
+    Objects loaded with only some of their columns (see ObjectMapper.get) keep
+    a (mapper, deferred field names) pair in _source and load the deferred
+    columns from the mapper on first access. They are instances of a subclass
+    of the model (see _deferred_class) until then, so that the attribute
+    lookups of fully loaded objects never go through __getattr__.
+
+    Objects also keep the (columns, values) they were loaded or last saved
+    with in _saved, so ObjectMapper.add writes only the fields that changed
+    since, see dirty_fields. Comparing with that snapshot when saving keeps
+    attribute assignment and the row loaders free of any bookkeeping.
+    """
+    __slots__ = ("id", "_source", "_saved")
+    # The columns of the model besides id, in the order data lists them
+    FIELDS = ()
+    # The columns ObjectMapper.get leaves out unless asked for, loaded on first access
+    DEFERRED = ()
+
     def __init__(self, id: str=None):
         self.id = id or uuid.uuid4().hex
+        self._source = None
+        self._saved = None
 
-class User(Base):
-    """
-    A user in the system
-    """
+    @property
+    def unloaded_fields(self):
+        """
+        The deferred fields of the object that have not been loaded yet.
+
+        Returns:
+            tuple: The field names.
+        """
+        source = self._source
+        if source is None:
+            return ()
+        return tuple(field for field in source[1] if not _slot_is_set(self, field))
+
+    @property
+    def dirty_fields(self):
+        """
+        The fields changed since the object was loaded or last saved.
+
+        Deferred fields that were never loaded are not changed. A new object,
+        or one whose id was changed, has all its fields changed.
+
+        Returns:
+            tuple: The field names, in FIELDS order.
+        """
+        saved = self._saved
+        if saved is None:
+            return self.FIELDS
+        previous = dict(zip(*saved))
+        if previous.get("id") != self.id:
+            return tuple(field for field in self.FIELDS if _slot_is_set(self, field))
+        return tuple(field for field in self.FIELDS if _slot_is_set(self, field)
+                     and (field not in previous or getattr(self, field) != previous[field]))
+
+    def mark_saved(self, data: dict):
+        """
+        Records the values the database now holds for the object, so they are not written again.
+
+        Args:
+            data (dict): The values written, by column name.
+        """
+        self._saved = (tuple(data), tuple(data.values()))
 
-    def __init__(self, username: str, email:str, hashed_password: str, 
-                 id: str=None):
-        super().__init__(id)
-        self.username = username
-        self.email = email
-        self.hashed_password = hashed_password
-    
     @property
     def data(self):
         """
         Allows you to access class data as a dictionary
-        
+
         This function creates an empty dictionary and if it is the first time
-        this class is initialized assigns the id a key in the dictionary. 
+        this class is initialized assigns the id a key in the dictionary.
         Then updates all other entries to their current states.
         In all updates after the first the id will remain the same.
 
-        Returns: 
+        Returns:
             the class variables as a dictionary
         """
         data = {}
         if self.id:
             data["id"] = self.id
+        for field in self.FIELDS:
+            data[field] = getattr(self, field)
+        return data
 
-        data.update({
-            "username" : self.username,
-            "email" : self.email,
-            "hashed_password" : self.hashed_password 
-            })
+    @classmethod
+    def row_loader(cls, columns):
+        """
+        Returns a function building an instance straight from a database row.
 
-        return data
+        The function bypasses __init__ and the intermediate dictionaries of
+        DataStore.load: it unpacks the row tuple directly into the slots named
+        by columns, keeps the row as the saved state and resets the internal
+        slots. Loaders are generated once per class and column layout. When
+        columns leave some fields out, the loader also stores the source the
+        missing fields are loaded from later.
+
+        Args:
+            columns: The column names, in the order the row tuples hold them.
+
+        Returns:
+            A function taking a row tuple and an optional (mapper, deferred
+            field names) source and returning an instance of the class.
+        """
+        key = (cls, tuple(columns))
+        loader = _ROW_LOADERS.get(key)
+        if loader is None:
+            known = ("id",) + cls.FIELDS
+            for column in columns:
+                if column not in known or not column.isidentifier() or keyword.iskeyword(column):
+                    raise ValueError(f"{cls.__name__} has no column {column!r}")
+            partial = bool(set(known) - set(columns))
+            internal = [slot for klass in cls.__mro__ for slot in getattr(klass, "__slots__", ())
+                        if slot not in known and slot not in ("_source", "_saved")]
+            lines = ["def load(row, source=None):",
+                     "    obj = new(deferred_cls)" if partial else "    obj = new(cls)",
+                     f"    {''.join(f'obj.{column}, ' for column in columns)}= row",
+                     f"    obj._source = {'source' if partial else 'None'}",
+                     "    obj._saved = (columns, row)"]
+            lines += [f"    obj.{slot} = None" for slot in internal]
+            lines.append("    return obj")
+            namespace = {"new": object.__new__, "cls": cls, "deferred_cls": _deferred_class(cls),
+                         "columns": tuple(columns)}
+            exec("\n".join(lines) + "\n", namespace)
+            loader = _ROW_LOADERS[key] = namespace["load"]
+        return loader
+
+
+# Subclasses created by _deferred_class, keyed by model class
+_DEFERRED_CLASSES = {}
+
+def _deferred_class(cls):
+    """
+    Returns the class of partially loaded instances of a model.
+
+    It only adds a __getattr__ loading deferred columns on first access and
+    keeps the model's name, so the object maps to the same table. Once the
+    deferred columns are loaded, ObjectMapper.load_deferred switches the
+    object back to the model class.
+
+    Args:
+        cls: The model class.
+
+    Returns:
+        The subclass.
+    """
+    deferred_cls = _DEFERRED_CLASSES.get(cls)
+    if deferred_cls is None:
+        def __getattr__(self, name):
+            # Only called when normal lookup failed, i.e. for slots that were never set
+            source = self._source
+            if source is not None and name in source[1]:
+                source[0].load_deferred([self])
+                return getattr(self, name)
+            raise AttributeError(f"{cls.__name__!r} object has no attribute {name!r}")
+
+        deferred_cls = _DEFERRED_CLASSES[cls] = type(cls.__name__, (cls,), {
+            "__slots__": (),
+            "__getattr__": __getattr__,
+            "__module__": cls.__module__,
+            "__qualname__": cls.__qualname__,
+            "model": cls,
+        })
+    return deferred_cls
+
+
+def _slot_is_set(obj, name) -> bool:
+    """Whether a slot of obj holds a value, without triggering deferred loading."""
+    try:
+        getattr(type(obj), name).__get__(obj)
+        return True
+    except AttributeError:
+        return False
+
+
+class User(Base):
+    """
+    A user in the system
+    """
+    __slots__ = ("username", "email", "hashed_password")
+    FIELDS = ("username", "email", "hashed_password")
+    # Only read when logging in, and never shown on a page
+    DEFERRED = ("email", "hashed_password")
+
+    def __init__(self, username: str, email:str, hashed_password: str, 
+                 id: str=None):
+        super().__init__(id)
+        self.username = username
+        self.email = email
+        self.hashed_password = hashed_password
 
     
 class Review(Base):
     """
     A review in the system
     """
+    __slots__ = ("review_text", "user_id", "topic_id", "status", "review_ratings",
+                 "_ratings_cache")
+    FIELDS = ("review_text", "user_id", "topic_id", "status", "review_ratings")
 
     def __init__(self, review_text: str, user_id: str, topic_id: str, 
                  status: str = "draft", review_ratings: str = None, 
@@ -58,43 +219,32 @@ class Review(Base):
         self.topic_id = topic_id
         self.status = status
         self.review_ratings = review_ratings or '[]'
+        self._ratings_cache = None
     
     @property
     def ratings(self):
-        return json.loads(self.review_ratings)
-
-    @property
-    def data(self):
         """
-        Allows you to access class data as a dictionary
-        
-        This function creates an empty dictionary and if it is the first time
-        this class is initialized assigns the id a key in the dictionary. 
-        Then updates all other entries to their current states.
-        In all updates after the first the id will remain the same.
+        The parsed review_ratings. The parsed list is cached and only re-parsed
+        once review_ratings is assigned a different value.
 
-        Returns: 
-            the class variables as a dictionary
+        Returns:
+            list: The ratings.
         """
-        data = {}
-        if self.id:
-            data["id"] = self.id
-
-        data.update({
-            "review_text" : self.review_text,
-            "user_id" : self.user_id,
-            "topic_id" : self.topic_id,
-            "status" : self.status,
-            "review_ratings" : self.review_ratings
-        })
-
-        return data
+        raw = self.review_ratings
+        cache = self._ratings_cache
+        if cache is not None and cache[0] is raw:
+            return cache[1]
+        ratings = json.loads(raw or '[]')
+        self._ratings_cache = (raw, ratings)
+        return ratings
 
 
 class Topic(Base):
     """
     a topic in the system 
     """
+    __slots__ = ("name", "description", "user_id")
+    FIELDS = ("name", "description", "user_id")
     
     def __init__(self, name: str, description: str, user_id: str, 
                  id: str = None):
@@ -103,36 +253,13 @@ class Topic(Base):
         self.description = description
         self.user_id = user_id
 
-    @property
-    def data(self):
-        """
-        Allows you to access class data as a dictionary
-        
-        This function creates an empty dictionary and if it is the first time
-        this class is initialized assigns the id a key in the dictionary. 
-        Then updates all other entries to their current states.
-        In all updates after the first the id will remain the same.
-
-        Returns: 
-            the class variables as a dictionary
-        """
-        data = {}
-        if self.id:
-            data["id"] = self.id
-
-        data.update({
-            "name" : self.name,
-            "description" : self.description,
-            "user_id" : self.user_id
-            })
-
-        return data
-
 
 class Session(Base):
     """
     A session with the server 
     """
+    __slots__ = ("user_id", "created_at", "expires_at", "last_activity_at", "is_active")
+    FIELDS = ("user_id", "created_at", "expires_at", "last_activity_at", "is_active")
 
     def __init__(self, user_id, created_at = None, expires_at = None, 
                  last_activity_at  = None, is_active = 0, id = None):
@@ -143,29 +270,3 @@ class Session(Base):
                                          + datetime.timedelta(hours=1))
         self.last_activity_at = last_activity_at or datetime.datetime.now()
         self.is_active = is_active
-
-    @property
-    def data(self):
-        """
-        Allows you to access class data as a dictionary
-        
-        This function creates an empty dictionary and if it is the first time
-        this class is initialized assigns the id a key in the dictionary. 
-        Then updates all other entries to their current states. 
-        In all updates after the first the id will remain the same.
-
-        Returns: 
-            the class variables as a dictionary
-        """
-        data = {}
-        if self.id:
-            data["id"] = self.id
-
-        data.update({"user_id" : self.user_id,
-            "created_at" : self.created_at,
-            "expires_at" : self.expires_at,
-            "last_activity_at" : self.last_activity_at,
-            "is_active" : self.is_active,
-        })
-
-        return data
\ No newline at end of file
@@ -0,0 +1,174 @@
+"""
+async_data_store.py - Asyncio facade over DataStore and ObjectMapper
+
+sqlite3 has no asynchronous API, so every operation runs on a thread of a
+ConnectionPool. The pool threads keep their SQLite connections open between
+operations instead of connecting for every call. SQLite releases the GIL
+while a statement runs, so independent reads awaited together, e.g. with
+asyncio.gather or get_all, run concurrently.
+
+Usage:
+    async with AsyncObjectMapper("database_path") as object_mapper:
+        reviews, users, topics = await object_mapper.get_all(Review, User, Topic)
+"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from src.data_management.data_store import DataStore, SQLiteConnection
+from src.data_management.object_mapper import ObjectMapper
+
+
+class ConnectionPool:
+    """Threads that each keep one open connection per database, to run blocking calls on."""
+
+    def __init__(self, size: int = 4):
+        """
+        Initializes the pool, its threads are started on first use.
+
+        Args:
+            size (int): The number of threads, and so of connections per database.
+        """
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="sqlite-pool",
+                                           initializer=self._keep_open)
+        # the connections each thread keeps open, by database, closed by close
+        self.connections = []
+        self.lock = threading.Lock()
+
+    def _keep_open(self):
+        """Makes a new pool thread keep its connections open, and remembers them."""
+        SQLiteConnection.keep_open()
+        with self.lock:
+            self.connections.append(SQLiteConnection.pooled.connections)
+
+    async def run(self, function, *args, **kwargs):
+        """
+        Runs a blocking call on a pool thread.
+
+        Args:
+            function: The callable.
+            *args: Its positional arguments.
+            **kwargs: Its keyword arguments.
+
+        Returns:
+            What the call returns.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(function, *args, **kwargs))
+
+    def close(self):
+        """Waits for the running calls and stops the threads, closing their connections."""
+        self.executor.shutdown(wait=True)
+        with self.lock:
+            connections, self.connections = self.connections, []
+        for thread_connections in connections:
+            for connection in thread_connections.values():
+                connection.close()
+            thread_connections.clear()
+
+
+class _AsyncFacade:
+    """Owns or shares the ConnectionPool of an async facade."""
+
+    def __init__(self, pool: ConnectionPool = None):
+        self.owns_pool = pool is None
+        self.pool = pool or ConnectionPool()
+
+    def close(self):
+        """Stops the pool, unless it was passed in by the caller."""
+        if self.owns_pool:
+            self.pool.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class AsyncDataStore(_AsyncFacade):
+    """The DataStore operations as coroutines."""
+
+    def __init__(self, db_path: str, pool: ConnectionPool = None):
+        """
+        Initializes an AsyncDataStore instance.
+
+        Args:
+            db_path (str): The path to the SQLite database file.
+            pool (ConnectionPool, optional): The pool to run on, a new one by default.
+        """
+        super().__init__(pool)
+        self.data_store = DataStore.open(db_path)
+
+    async def save(self, data, table_name, columns=None):
+        """Saves the provided data to the specified table, see DataStore.save."""
+        return await self.pool.run(self.data_store.save, data, table_name, columns)
+
+    async def load(self, table_name, id=None):
+        """Loads data from the specified table as dictionaries, see DataStore.load."""
+        return await self.pool.run(self.data_store.load, table_name, id)
+
+    async def load_rows(self, table_name, id=None, columns=None, ids=None):
+        """Loads rows from the specified table as tuples, see DataStore.load_rows."""
+        return await self.pool.run(self.data_store.load_rows, table_name, id, columns, ids)
+
+    async def delete(self, id, table_name):
+        """Deletes data from the specified table based on the ID, see DataStore.delete."""
+        return await self.pool.run(self.data_store.delete, id, table_name)
+
+    async def load_all(self, *table_names) -> list:
+        """
+        Loads several tables concurrently.
+
+        Args:
+            *table_names: The names of the tables.
+
+        Returns:
+            list: The rows of each table as dictionaries, in the order the tables were given.
+        """
+        return await asyncio.gather(*(self.load(table_name) for table_name in table_names))
+
+
+class AsyncObjectMapper(_AsyncFacade):
+    """The ObjectMapper operations as coroutines."""
+
+    def __init__(self, db_path: str, pool: ConnectionPool = None):
+        """
+        Initializes an AsyncObjectMapper instance.
+
+        Args:
+            db_path (str): The path to the SQLite database file.
+            pool (ConnectionPool, optional): The pool to run on, a new one by default.
+        """
+        super().__init__(pool)
+        self.object_mapper = ObjectMapper(db_path)
+        self.data_store = AsyncDataStore(db_path, self.pool)
+
+    async def add(self, obj) -> bool:
+        """Adds an object to the database, see ObjectMapper.add."""
+        return await self.pool.run(self.object_mapper.add, obj)
+
+    async def get(self, obj_class, id=None, only=None, defer=None):
+        """Retrieves objects from the database, see ObjectMapper.get."""
+        return await self.pool.run(self.object_mapper.get, obj_class, id, only, defer)
+
+    async def remove(self, obj) -> bool:
+        """Removes an object from the database, see ObjectMapper.remove."""
+        return await self.pool.run(self.object_mapper.remove, obj)
+
+    async def load_deferred(self, objs) -> None:
+        """Loads the deferred columns of several objects, see ObjectMapper.load_deferred."""
+        return await self.pool.run(self.object_mapper.load_deferred, objs)
+
+    async def get_all(self, *obj_classes) -> list:
+        """
+        Retrieves every object of several classes concurrently.
+
+        Args:
+            *obj_classes: The classes of the objects to retrieve.
+
+        Returns:
+            list: The objects of each class, in the order the classes were given.
+        """
+        return await asyncio.gather(*(self.get(obj_class) for obj_class in obj_classes))
@@ -0,0 +1,238 @@
+"""
+change_log.py - Incremental consumers of the change log
+
+Every insert, update and delete of the tracked tables is appended to the
+change_log table by SQL triggers (see db_schema.change_log_triggers), with a
+sequence number that only ever increases. A ChangeLogConsumer reads the
+entries after its checkpoint in batches and moves the checkpoint forward once
+a batch is handled, so caches, search indexes and aggregates can apply just
+what changed instead of rescanning whole tables.
+
+ChangeLog.compact keeps the log from growing without bound: only the latest
+entry of every row is kept, and deletions are dropped once every consumer
+has read them and they are older than the retention period. As an insert may
+be compacted away in favour of a later update, consumers should treat both
+as "the row now exists" and read its current state.
+
+The review shards of a partitioned database (see partitioned_data_store.py)
+each log the changes of their reviews in their own change_log. A ChangeLog
+reads the log of the main database, then those of the shards in shard order;
+every Change names the shard it was logged in, None for the main database,
+and a consumer keeps a checkpoint in every log. Changes are therefore
+ordered by (shard, seq), which keeps the changes of every review in order as
+a review is only ever written to the shard of its topic.
+
+Usage (from the repository root):
+    $ python3 -m src.data_management.change_log database_path --retention-hours 24
+"""
+
+import argparse
+import collections
+from src.data_management import db_schema
+from src.data_management.data_store import DataStore, SQLiteConnection, convert_id
+from src.data_management.partitioned_data_store import PartitionedDataStore
+
+# shard is the index of the review shard whose log the change was read from, None for the main database
+Change = collections.namedtuple("Change", ["seq", "table_name", "row_id", "operation", "changed_at", "shard"],
+                                defaults=(None,))
+
+
+class ChangeLog:
+    """Read access to the change log of a database, and its compaction."""
+
+    def __init__(self, db_path: str):
+        """
+        Initializes a ChangeLog instance.
+
+        Args:
+            db_path (str): The database name, relative to src/database/.
+        """
+        self.db_path = DataStore(db_path).db_path
+        # the database path of every log by shard, the main database first
+        self.logs = {None: self.db_path}
+        for index, shard in enumerate(PartitionedDataStore.stored_shards(db_path)):
+            self.logs[index] = shard.db_path
+        for path in self.logs.values():
+            with SQLiteConnection(path) as connection:
+                connection.execute(db_schema.CHANGE_LOG_CHECKPOINT_TABLE)
+
+    def latest_sequence(self, shard: int = None) -> int:
+        """
+        Returns the sequence number of the latest change of a log.
+
+        Args:
+            shard (int, optional): The review shard whose log is read, the main database's by default.
+
+        Returns:
+            int: The sequence number, 0 if nothing changed yet.
+        """
+        with SQLiteConnection(self.logs[shard]) as connection:
+            row = connection.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+        return row[0] if row else 0
+
+    def read(self, after, limit: int = 500, tables=None) -> list:
+        """
+        Reads the changes following a sequence number in every log.
+
+        Args:
+            after (int or dict): Only changes with a greater sequence number are read: a number for the log
+                of the main database, or the number of every log by shard. Logs not given are read from the start.
+            limit (int): The largest number of changes returned.
+            tables (tuple, optional): Only read the changes of these tables.
+
+        Returns:
+            list: The changes, as Change tuples ordered by shard, the main database first, and sequence.
+        """
+        positions = after if isinstance(after, dict) else {None: after}
+        query = "SELECT seq, table_name, row_id, operation, changed_at FROM change_log WHERE seq > ?"
+        if tables:
+            query += f" AND table_name IN ({', '.join('?' for _ in tables)})"
+        query += " ORDER BY seq LIMIT ?"
+        changes = []
+        for shard, path in self.logs.items():
+            if len(changes) >= limit:
+                break
+            params = (positions.get(shard, 0),) + tuple(tables or ()) + (limit - len(changes),)
+            with SQLiteConnection(path) as connection:
+                rows = DataStore._execute(connection, query, params, fetch=True)
+            changes += [Change(seq, table_name, convert_id(row_id), operation, changed_at, shard)
+                        for seq, table_name, row_id, operation, changed_at in rows]
+        return changes
+
+    def checkpoints(self, shard: int = None) -> dict:
+        """
+        Returns the checkpoint of every consumer in a log.
+
+        Args:
+            shard (int, optional): The review shard whose log is read, the main database's by default.
+
+        Returns:
+            dict: The last sequence number read, by consumer name.
+        """
+        with SQLiteConnection(self.logs[shard]) as connection:
+            return dict(connection.execute("SELECT consumer, seq FROM change_log_checkpoint"))
+
+    def compact(self, retention_seconds: float = 24 * 3600) -> dict:
+        """
+        Removes the entries no consumer needs any more, from every log.
+
+        An entry is superseded once a later entry exists for the same row: a
+        consumer catching up learns the row changed from the later entry and
+        reads its current state anyway. A deletion that is the latest entry of
+        its row is removed once every consumer has read it and it is older than
+        the retention period.
+
+        Args:
+            retention_seconds (float): How long deletions are kept for consumers that were not registered yet.
+
+        Returns:
+            dict: The number of superseded entries and of deletions removed.
+        """
+        superseded = deletions = 0
+        for shard, path in self.logs.items():
+            with SQLiteConnection(path) as connection:
+                superseded += connection.execute("""
+                    DELETE FROM change_log WHERE EXISTS (
+                        SELECT 1 FROM change_log AS later
+                        WHERE later.table_name = change_log.table_name
+                          AND later.row_id = change_log.row_id AND later.seq > change_log.seq)
+                """).rowcount
+                consumed = connection.execute("SELECT MIN(seq) FROM change_log_checkpoint").fetchone()[0]
+                if consumed is None:
+                    consumed = self.latest_sequence(shard)
+                deletions += connection.execute("""
+                    DELETE FROM change_log WHERE operation = 'delete' AND seq <= ?
+                      AND changed_at <= datetime('now', ?)
+                """, (consumed, f"-{retention_seconds} seconds")).rowcount
+        return {"superseded": superseded, "deletions": deletions}
+
+
+class ChangeLogConsumer:
+    """Reads the change log from a persistent checkpoint in every log, batch by batch."""
+
+    def __init__(self, db_path: str, name: str, batch_size: int = 500, tables=None, from_start: bool = True):
+        """
+        Initializes a consumer, registering its checkpoint on first use.
+
+        Args:
+            db_path (str): The database name, relative to src/database/.
+            name (str): The consumer name the checkpoint is stored under.
+            batch_size (int): The largest number of changes in a batch.
+            tables (tuple, optional): Only consume the changes of these tables.
+            from_start (bool): Whether a new consumer reads the whole log, or only
+                the changes made from now on.
+        """
+        self.change_log = ChangeLog(db_path)
+        self.name = name
+        self.batch_size = batch_size
+        self.tables = tuple(tables) if tables else None
+        for shard, path in self.change_log.logs.items():
+            start = 0 if from_start else self.change_log.latest_sequence(shard)
+            with SQLiteConnection(path) as connection:
+                connection.execute("INSERT OR IGNORE INTO change_log_checkpoint (consumer, seq) VALUES (?, ?)",
+                                   (name, start))
+
+    @property
+    def checkpoint(self) -> dict:
+        """The sequence number of the last change this consumer handled in every log, by shard."""
+        return {shard: self.change_log.checkpoints(shard).get(self.name, 0) for shard in self.change_log.logs}
+
+    def poll(self) -> list:
+        """
+        Reads the next batch of changes, without moving the checkpoint.
+
+        Returns:
+            list: Up to batch_size changes following the checkpoint.
+        """
+        return self.change_log.read(self.checkpoint, self.batch_size, self.tables)
+
+    def commit(self, seq: int, shard: int = None):
+        """
+        Moves the checkpoint of a log forward.
+
+        Args:
+            seq (int): The sequence number of the last change handled.
+            shard (int, optional): The review shard of the log, the main database by default.
+        """
+        with SQLiteConnection(self.change_log.logs[shard]) as connection:
+            connection.execute("UPDATE change_log_checkpoint SET seq = MAX(seq, ?) WHERE consumer = ?",
+                               (seq, self.name))
+
+    def consume(self, handler) -> int:
+        """
+        Hands every pending change to a handler, batch by batch.
+
+        The checkpoint is moved after each batch the handler returns from, so
+        a batch whose handler raises is read again by the next call.
+
+        Args:
+            handler: Called with each list of changes.
+
+        Returns:
+            int: The number of changes handled.
+        """
+        handled = 0
+        while True:
+            batch = self.poll()
+            if not batch:
+                return handled
+            handler(batch)
+            # the changes of every log are in sequence order, the last one of each is its new checkpoint
+            for shard, seq in {change.shard: change.seq for change in batch}.items():
+                self.commit(seq, shard)
+            handled += len(batch)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compact the change log of a database.")
+    parser.add_argument("db_path", help="database name, relative to src/database/")
+    parser.add_argument("--retention-hours", type=float, default=24.0,
+                        help="how long deletions are kept once every consumer has read them")
+    args = parser.parse_args(argv)
+
+    result = ChangeLog(args.db_path).compact(args.retention_hours * 3600)
+    print(f"Removed {result['superseded']} superseded entries and {result['deletions']} deletions")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,88 +1,766 @@
+import contextlib
+import datetime
 import os
+import random
 import sqlite3
+import threading
+import time
 from src.data_management import db_schema
 
+
+def adapt_timestamp(value):
+    """
+    Converts a datetime to the integer milliseconds since the epoch it is stored as.
+    Naive datetimes are local time, like datetime.now().
+
+    Args:
+        value: A datetime, an ISO formatted string as stored before, or a stored value.
+
+    Returns:
+        int: The milliseconds since the epoch, or the value itself if it is not a timestamp.
+    """
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    if isinstance(value, datetime.datetime):
+        return round(value.timestamp() * 1000)
+    return value
+
+
+def convert_timestamp(value):
+    """
+    Converts stored milliseconds since the epoch back to a naive local datetime.
+
+    Args:
+        value: The stored value.
+
+    Returns:
+        datetime: The timestamp, or the value itself if it is not one.
+    """
+    if isinstance(value, int):
+        return datetime.datetime.fromtimestamp(value / 1000)
+    if isinstance(value, str):
+        return datetime.datetime.fromisoformat(value)
+    return value
+
+
+def adapt_id(value):
+    """
+    Converts a 32 character hex id, as uuid.uuid4().hex makes, to the 16 bytes it is stored as.
+    Other ids are stored as text, numbers included, as the TEXT id columns stored them.
+
+    Args:
+        value: The id.
+
+    Returns:
+        bytes or str: The id as bytes, or as text if it is not a 32 character hex string.
+    """
+    if isinstance(value, str):
+        if len(value) == 32:
+            try:
+                return bytes.fromhex(value)
+            except ValueError:
+                pass
+        return value
+    if isinstance(value, int):
+        return str(value)
+    return value
+
+
+def convert_id(value):
+    """
+    Converts a stored 16 byte id back to its 32 character hex form.
+
+    Args:
+        value: The stored value.
+
+    Returns:
+        str: The hex id, or the value itself if it is not a blob.
+    """
+    if value.__class__ is bytes:
+        return value.hex()
+    return value
+
+
+# The database ":memory:" stands for: in-memory, and shared by every connection of the process
+MEMORY_URI = "file:feedback_flow?mode=memory&cache=shared"
+
+
+class DatabaseLocked(sqlite3.OperationalError):
+    """Raised when other connections held the database locked for longer than the retries or the deadline allow."""
+
+
+class ContentionPolicy:
+    """
+    How long to wait for the locks other connections hold, and how to retry when they hold them too long.
+
+    SQLite's busy handler waits up to busy_timeout for a lock. Some lock errors
+    are returned without waiting, e.g. to break a deadlock between two readers
+    upgrading to writers, and the busy timeout can run out during a write
+    burst; those statements are retried after a jittered exponential backoff,
+    up to retries times. Neither the busy timeout nor the backoff ever goes past
+    the deadline of the current thread, set by deadline, e.g. per web request.
+    When the database stays locked, DatabaseLocked is raised.
+    """
+    # The deadline of the work running on the current thread, see deadline
+    local = threading.local()
+
+    def __init__(self, busy_timeout: float = 5.0, retries: int = 5, backoff: float = 0.01, max_backoff: float = 0.5):
+        """
+        Initializes the policy.
+
+        Args:
+            busy_timeout (float): Seconds SQLite waits for a lock before giving up on a statement.
+            retries (int): Times a statement that failed on a lock is retried.
+            backoff (float): Seconds of the first backoff, doubled with every retry, the actual
+                delay is picked at random up to it so that the retrying writers spread out.
+            max_backoff (float): The largest backoff in seconds.
+        """
+        self.busy_timeout = busy_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lock_waits = 0
+        self.lock_wait_seconds = 0.0
+        self.lock_timeouts = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    @contextlib.contextmanager
+    def deadline(cls, seconds: float):
+        """
+        Bounds the lock waits of the database calls made by the current thread within the block.
+
+        Nested deadlines keep the earliest one.
+
+        Args:
+            seconds (float): Seconds from now.
+        """
+        previous = getattr(cls.local, "deadline", None)
+        deadline = time.monotonic() + seconds
+        cls.local.deadline = deadline if previous is None else min(previous, deadline)
+        try:
+            yield
+        finally:
+            cls.local.deadline = previous
+
+    @classmethod
+    def remaining(cls):
+        """Returns the seconds left until the current thread's deadline, None without a deadline."""
+        deadline = getattr(cls.local, "deadline", None)
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    def timeout(self) -> float:
+        """Returns the busy timeout to use now, bounded by the current thread's deadline."""
+        remaining = self.remaining()
+        return self.busy_timeout if remaining is None else min(self.busy_timeout, remaining)
+
+    @staticmethod
+    def is_lock_error(error: Exception) -> bool:
+        """Whether an error was raised because another connection held a lock."""
+        if not isinstance(error, sqlite3.OperationalError):
+            return False
+        code = getattr(error, "sqlite_errorcode", None)
+        if code is not None:
+            return code & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+        return "locked" in str(error) or "busy" in str(error)
+
+    def run(self, operation, connection: sqlite3.Connection = None):
+        """
+        Runs a database operation, retrying it while it fails on a lock.
+
+        Args:
+            operation: A callable without arguments, e.g. running one statement.
+            connection (sqlite3.Connection, optional): The connection the operation uses,
+                its busy timeout is shortened to the time left before each retry.
+
+        Returns:
+            The operation's result.
+
+        Raises:
+            DatabaseLocked: If the operation still failed on a lock after the retries, or at the deadline.
+        """
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                return operation()
+            except sqlite3.OperationalError as e:
+                if isinstance(e, DatabaseLocked) or not self.is_lock_error(e):
+                    raise
+                waited = time.perf_counter() - started
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                remaining = self.remaining()
+                if attempt >= self.retries or (remaining is not None and remaining <= delay):
+                    with self.lock:
+                        self.lock_timeouts += 1
+                        self.lock_wait_seconds += waited
+                    raise DatabaseLocked(f"{e}, gave up after {attempt + 1} attempts") from e
+                with self.lock:
+                    self.lock_waits += 1
+                    self.lock_wait_seconds += waited + delay
+                time.sleep(delay)
+                attempt += 1
+                if connection is not None:
+                    connection.execute(f"PRAGMA busy_timeout = {int(self.timeout() * 1000)}")
+
+
+class ConnectionCache:
+    """
+    Open connections to one database, shared by every thread, see SQLiteConnection.cache_connections.
+
+    A connection is used by one thread at a time. Up to size idle connections
+    are kept; those opened beyond that by concurrent calls are closed when
+    they are handed back.
+    """
+
+    def __init__(self, db_path: str, size: int = 4):
+        """
+        Initializes an empty cache.
+
+        Args:
+            db_path (str): The resolved path or URI of the database.
+            size (int): The largest number of idle connections kept open.
+        """
+        self.db_path = db_path
+        self.size = size
+        self.idle = []
+        self.opened = 0
+        # the number of cache_connections calls not yet matched by uncache_connections
+        self.users = 0
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def take(self):
+        """Returns an idle connection, None if there is none and the caller must open one."""
+        with self.lock:
+            return self.idle.pop() if self.idle else None
+
+    def give_back(self, connection: sqlite3.Connection) -> bool:
+        """
+        Keeps a connection for the next caller.
+
+        Returns:
+            bool: False if the cache is closed or full, and the caller must close the connection.
+        """
+        with self.lock:
+            if self.closed or len(self.idle) >= self.size:
+                return False
+            self.idle.append(connection)
+            return True
+
+    def close(self):
+        """Closes the idle connections, those in use are closed when they are handed back."""
+        with self.lock:
+            self.closed = True
+            idle, self.idle = self.idle, []
+        for connection in idle:
+            connection.close()
+
+
 class SQLiteConnection:
     """Context manager for SQLite database connection."""
+    # Callables notified with (db_path, elapsed_seconds) every time a connection is closed,
+    # used by the web layer to count DB calls and DB time per request.
+    listeners = []
+    # QueryTracer recording every statement run, see QueryTracer.install
+    tracer = None
+    # Connections kept open by the threads that pool them, see keep_open
+    pooled = threading.local()
+    # How lock waits are bounded and retried, see ContentionPolicy
+    contention = ContentionPolicy()
+    # Connections keeping the in-memory databases alive between calls, by URI, see keep_alive
+    memory_databases = {}
+    memory_lock = threading.Lock()
+    # ConnectionCache of the databases whose connections stay open between calls, by path, see cache_connections
+    caches = {}
+
     def __init__(self, db_path: str):
         self.db_path = db_path
+        # the ConnectionCache the connection is handed back to, see cache_connections
+        self.cache = None
+
+    @staticmethod
+    def is_memory(db_path: str) -> bool:
+        """Whether a resolved database path is an in-memory database URI."""
+        return db_path.startswith("file:") and "mode=memory" in db_path
+
+    @classmethod
+    def keep_alive(cls, db_path: str):
+        """
+        Keeps an in-memory database alive until release, SQLite drops it when its last connection closes.
+
+        Args:
+            db_path (str): The database URI, shared-cache so every connection sees the same data.
+        """
+        with cls.memory_lock:
+            if db_path not in cls.memory_databases:
+                cls.memory_databases[db_path] = sqlite3.connect(db_path, uri=True, check_same_thread=False)
+
+    @classmethod
+    def release(cls, db_path: str):
+        """
+        Lets an in-memory database go, its data is gone once no connection uses it anymore.
+
+        Args:
+            db_path (str): The database URI.
+        """
+        with cls.memory_lock:
+            connection = cls.memory_databases.pop(db_path, None)
+        if connection:
+            connection.close()
+
+    @classmethod
+    def cache_connections(cls, db_path: str, size: int = 4) -> ConnectionCache:
+        """
+        Keeps connections to a database open for the calls of every thread, until uncache_connections.
+
+        Args:
+            db_path (str): The resolved path or URI of the database.
+            size (int): The largest number of idle connections kept open.
+
+        Returns:
+            ConnectionCache: The cache, shared with earlier callers for the same database.
+        """
+        with cls.memory_lock:
+            cache = cls.caches.get(db_path)
+            if cache is None:
+                cache = cls.caches[db_path] = ConnectionCache(db_path, size)
+            cache.users += 1
+        return cache
+
+    @classmethod
+    def uncache_connections(cls, db_path: str):
+        """
+        Undoes one cache_connections call, closing the cache's connections after the last one.
+
+        Args:
+            db_path (str): The resolved path or URI of the database.
+        """
+        with cls.memory_lock:
+            cache = cls.caches.get(db_path)
+            if cache is None:
+                return
+            cache.users -= 1
+            if cache.users > 0:
+                return
+            del cls.caches[db_path]
+        cache.close()
+
+    @classmethod
+    def keep_open(cls):
+        """
+        Makes the current thread keep its connections open and reuse them, one per database.
+
+        The connections, by path, are in pooled.connections; whoever stops the thread closes them.
+        """
+        cls.pooled.connections = {}
 
     def __enter__(self) -> sqlite3.Connection:
         """Establishes a connection to the SQLite database and enables foreign key support. Returns the connection object."""
-        self.connection = sqlite3.connect(self.db_path)
+        self.started = time.perf_counter()
+        connections = getattr(self.pooled, "connections", None)
+        if connections is not None and self.db_path in connections:
+            self.connection = connections[self.db_path]
+            if ContentionPolicy.remaining() is not None:
+                self.connection.execute(f"PRAGMA busy_timeout = {int(self.contention.timeout() * 1000)}")
+            return self.connection
+        self.cache = self.caches.get(self.db_path) if connections is None else None
+        if self.cache is not None:
+            self.connection = self.cache.take()
+            if self.connection is not None:
+                # the busy timeout of the request that used it last may have been shortened by its deadline
+                self.connection.execute(f"PRAGMA busy_timeout = {int(self.contention.timeout() * 1000)}")
+                return self.connection
+        # cached connections move between threads, and pooled ones are closed by the pool's owner
+        self.connection = sqlite3.connect(self.db_path, timeout=self.contention.timeout(), uri=True,
+                                          check_same_thread=self.cache is None and connections is None)
         self.connection.execute("PRAGMA foreign_keys=ON;")
+        if connections is not None:
+            connections[self.db_path] = self.connection
+        elif self.cache is not None:
+            with self.cache.lock:
+                self.cache.opened += 1
         return self.connection
 
     def __exit__(self, exc_type, exc_value, traceback):
-        """Closes the connection to the SQLite database."""
-        self.connection.commit()
-        self.connection.close()
+        """Closes the connection to the SQLite database, or hands a pooled connection back."""
+        try:
+            self.contention.run(self.connection.commit, self.connection)
+        except sqlite3.Error:
+            self.connection.rollback()
+            self._hand_back()
+            raise
+        self._hand_back()
+        if self.listeners:
+            elapsed = time.perf_counter() - self.started
+            for listener in self.listeners:
+                listener(self.db_path, elapsed)
+
+    def _hand_back(self):
+        """Keeps a pooled or cached connection open for the next call, closes any other."""
+        if getattr(self.pooled, "connections", None) is not None:
+            self.connection.row_factory = None
+        elif self.cache is not None:
+            self.connection.row_factory = None
+            if not self.cache.give_back(self.connection):
+                self.connection.close()
+        else:
+            self.connection.close()
 
 class DataStore:
     TABLES = {
         "user": db_schema.USER_TABLE,
         "topic": db_schema.TOPIC_TABLE,
         "review": db_schema.REVIEW_TABLE,
-        "session": db_schema.SESSION_TABLE
+        "session": db_schema.SESSION_TABLE,
+        "change_log": db_schema.CHANGE_LOG_TABLE
     }
+    # Tables whose inserts, updates and deletes are recorded in change_log
+    TRACKED_TABLES = ("user", "topic", "review", "session")
+    # Callables creating the store of a database name, for databases that are not
+    # plain single-file stores, see open and PartitionedDataStore.enable
+    factories = {}
+    # GroupCommitWriter of a database file, its saves and deletes are handed to it when set
+    writers = {}
+    # Declared column types whose values are stored in another form: type -> (adapt, convert).
+    # Values are adapted when saved or compared, and converted back when loaded.
+    COLUMN_TYPES = {"TIMESTAMP_MS": (adapt_timestamp, convert_timestamp), "ID_BLOB": (adapt_id, convert_id)}
+    # Layout of the stored data, kept in PRAGMA user_version, see _migrate
+    SCHEMA_VERSION = 3
+    # (table schema, columns) -> adapt or convert functions per column, None when all are stored as is
+    _adapters = {}
+    _converters = {}
+    # (table schema, columns) -> generated function converting loaded rows, see _convert_rows
+    _row_converters = {}
+    # (table schema, inserted columns, updated columns) -> upsert query and its columns, see _construct_insert_query
+    _insert_queries = {}
+    # (store class, db_path) -> (PRAGMA schema_version, PRAGMA user_version) once its tables were
+    # created, so the stores opened for every request skip the CREATE statements, see _create_tables
+    _initialized = {}
+
+    @classmethod
+    def open(cls, db_path: str):
+        """
+        Opens the store configured for a database.
+
+        Args:
+            db_path (str): The path to the SQLite database file.
+
+        Returns:
+            DataStore: The store created by the registered factory, a DataStore by default.
+        """
+        return cls.factories.get(db_path, DataStore)(db_path)
 
     def __init__(self, db_path: str):
         """
         Initializes a DataStore instance with the path to the SQLite database file.
 
         Args:
-            db_path (str): The path to the SQLite database file.
+            db_path (str): The database, see resolve.
+        """
+        self.db_path = self.resolve(db_path)
+        if SQLiteConnection.is_memory(self.db_path):
+            SQLiteConnection.keep_alive(self.db_path)
+        self._create_tables()
+
+    @staticmethod
+    def resolve(db_path: str) -> str:
+        """
+        Returns the path or URI SQLite opens for a database.
+
+        Args:
+            db_path (str): A file name relative to src/database/, an absolute path, a "file:" URI
+                such as "file:name?mode=memory&cache=shared", or ":memory:" for the process's
+                shared in-memory database.
+
+        Returns:
+            str: The path or URI.
+        """
+        if db_path == ":memory:":
+            return MEMORY_URI
+        if db_path.startswith("file:") or os.path.isabs(db_path):
+            return db_path
+        return "src/database/" + db_path
+
+    @classmethod
+    def release(cls, db_path: str):
+        """
+        Frees an in-memory database, see SQLiteConnection.release. Files are left alone.
+
+        Args:
+            db_path (str): The database, as passed to DataStore.
+        """
+        SQLiteConnection.release(cls.resolve(db_path))
+
+    def snapshot(self, path: str):
+        """
+        Copies the database to a file, consistently while it stays in use, e.g. to keep an in-memory database.
+
+        Args:
+            path (str): The file to write, replaced if it exists.
+        """
+        temporary_path = path + ".tmp"
+        target = sqlite3.connect(temporary_path)
+        try:
+            with SQLiteConnection(self.db_path) as connection:
+                connection.backup(target)
+        finally:
+            target.close()
+        os.replace(temporary_path, path)
+
+    def restore(self, path: str):
         """
-        self.db_path = "src/database/" + db_path
+        Replaces the content of the database with a copy written by snapshot.
+
+        Args:
+            path (str): The file to read.
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        source = sqlite3.connect(path)
+        try:
+            with SQLiteConnection(self.db_path) as connection:
+                source.backup(connection)
+        finally:
+            source.close()
+        # the schema may differ from the one created, e.g. if the snapshot is from an older version
         self._create_tables()
 
     def _create_tables(self):
         """
         Creates the necessary tables in the database by executing the table schemas.
         """
-        # check if database folder exists, if not make one
-        if not os.path.exists("src/database"):
-            os.makedirs("src/database")
+        # check if the database folder exists, if not make one
+        if not self.db_path.startswith("file:"):
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
 
+        key = (self.__class__, self.db_path)
         with SQLiteConnection(self.db_path) as connection:
+            # the schema cookie changes with every schema change, and starts over in a new or replaced file
+            if self._initialized.get(key) == self._schema_cookie(connection):
+                return
+            # only takes effect on a new database, lets MaintenanceScheduler give free pages back
+            connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
             cursor = connection.cursor()
             for table in self.TABLES.values():
                 cursor.execute(table)
+            self._migrate(connection)
+            if "change_log" in self.TABLES:
+                cursor.execute(db_schema.CHANGE_LOG_INDEX)
+            if "session" in self.TABLES:
+                cursor.execute(db_schema.SESSION_EXPIRES_INDEX)
+                cursor.execute(db_schema.SESSION_ACTIVE_INDEX)
+            for table_name in self.TRACKED_TABLES:
+                for trigger in db_schema.change_log_triggers(table_name):
+                    cursor.execute(trigger)
+            connection.commit()
+            self._initialized[key] = self._schema_cookie(connection)
+
+    @staticmethod
+    def _schema_cookie(connection: sqlite3.Connection) -> tuple:
+        """Returns the schema version and the stored layout version of a database."""
+        return (connection.execute("PRAGMA schema_version").fetchone()[0],
+                connection.execute("PRAGMA user_version").fetchone()[0])
+
+    def _migrate(self, connection: sqlite3.Connection):
+        """
+        Brings the stored data of a database created by an older version up to SCHEMA_VERSION.
 
-    def save(self, data, table_name):
+        Version 1 stores the TIMESTAMP_MS columns as integer epoch milliseconds
+        instead of the ISO text the default sqlite3 adapter wrote, version 2
+        the ID_BLOB columns as 16 byte blobs instead of hex text. Older
+        databases are rebuilt table by table with the current schema, which
+        converts both; the new declared types also let SQLite use the primary
+        key indexes for joins, which the TEXT ids and INTEGER foreign keys
+        prevented. Indexes and change_log triggers are created again afterwards
+        by _create_tables, the rebuild itself is not logged. Version 3 saves
+        with upserts instead of REPLACE INTO, the change_log insert triggers
+        written for REPLACE are dropped and created again.
+
+        Args:
+            connection (sqlite3.Connection): The connection to the database.
+        """
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        if version >= self.SCHEMA_VERSION:
+            return
+        if version < 2:
+            # enforcing the keys while the tables are swapped would fail or cascade, check them once at the end
+            connection.commit()
+            connection.execute("PRAGMA foreign_keys = OFF")
+            try:
+                connection.execute("BEGIN")
+                for table_name in self.TABLES:
+                    self._rebuild_table(connection, table_name)
+                violation = connection.execute("PRAGMA foreign_key_check").fetchone()
+                if violation:
+                    connection.rollback()
+                    raise sqlite3.IntegrityError(f"FOREIGN KEY constraint failed migrating table {violation[0]}")
+                connection.commit()
+            finally:
+                connection.execute("PRAGMA foreign_keys = ON")
+        if version < 3:
+            for table_name in self.TRACKED_TABLES:
+                connection.execute(f"DROP TRIGGER IF EXISTS {table_name}_log_insert")
+        connection.commit()
+        connection.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+    def _rebuild_table(self, connection: sqlite3.Connection, table_name: str):
+        """
+        Recreates a table with its current schema, copying its rows in their current stored form.
+
+        Args:
+            connection (sqlite3.Connection): The connection to the database, foreign keys disabled.
+            table_name (str): The name of the table.
+        """
+        columns = self.columns(table_name)
+        rebuilt = f"{table_name}_rebuilt"
+        sequence = None
+        if "AUTOINCREMENT" in self.TABLES[table_name]:
+            sequence = connection.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table_name,)).fetchone()
+        connection.execute(self.TABLES[table_name].replace(f"EXISTS {table_name} (", f"EXISTS {rebuilt} (", 1))
+        rows = connection.execute(f"SELECT {', '.join(columns)} FROM {table_name}")
+        connection.executemany(f"INSERT INTO {rebuilt} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                               (self._adapt(table_name, columns, row) for row in rows))
+        connection.execute(f"DROP TABLE {table_name}")
+        connection.execute(f"ALTER TABLE {rebuilt} RENAME TO {table_name}")
+        if sequence:
+            # AUTOINCREMENT must not reuse the numbers of rows deleted before the rebuild
+            connection.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?", (sequence[0], table_name))
+
+    def _column_types(self, table_name: str) -> dict:
+        """
+        Returns the declared types of a table's columns that are listed in COLUMN_TYPES.
+
+        Args:
+            table_name (str): The name of the table.
+
+        Returns:
+            dict: The column names mapped to their declared types.
+        """
+        definitions = [definition.strip().split() for definition in self.TABLES[table_name].split("(")[1].split(",")]
+        return {definition[0]: definition[1].upper() for definition in definitions
+                if len(definition) > 1 and definition[1].upper() in self.COLUMN_TYPES}
+
+    def _column_functions(self, table_name: str, columns, which: int):
+        """
+        Returns the adapt (which=0) or convert (which=1) function of each column, cached per schema.
+
+        Args:
+            table_name (str): The name of the table.
+            columns: The column names.
+            which (int): 0 for the adapters, 1 for the converters.
+
+        Returns:
+            list or None: One function or None per column, None if no column needs one.
+        """
+        if table_name not in self.TABLES:
+            return None
+        cache = self._converters if which else self._adapters
+        key = (self.TABLES[table_name], tuple(columns))
+        if key not in cache:
+            column_types = self._column_types(table_name)
+            functions = [self.COLUMN_TYPES[column_types[column]][which] if column in column_types else None
+                         for column in columns]
+            cache[key] = functions if any(functions) else None
+        return cache[key]
+
+    def _adapt(self, table_name: str, columns, values) -> tuple:
+        """Converts the Python values of the given columns to the form they are stored in."""
+        adapters = self._column_functions(table_name, columns, 0)
+        if not adapters:
+            return tuple(values)
+        return tuple(adapt(value) if adapt else value for adapt, value in zip(adapters, values))
+
+    def _convert_rows(self, table_name: str, columns, rows: list) -> list:
+        """
+        Converts the stored values of rows holding the given columns back to Python values.
+
+        Every list of rows loaded goes through here, so the conversion is a list
+        comprehension generated once per table and column layout, unpacking each
+        row and calling only the converters of the columns that have one.
+        """
+        converters = self._column_functions(table_name, columns, 1)
+        if not converters:
+            return rows
+        key = (self.TABLES[table_name], tuple(columns))
+        convert = self._row_converters.get(key)
+        if convert is None:
+            names = [f"c{index}" for index in range(len(converters))]
+            values = [f"f{index}({name})" if converters[index] else name for index, name in enumerate(names)]
+            namespace = {f"f{index}": function for index, function in enumerate(converters) if function}
+            exec(f"def convert(rows):\n    return [({', '.join(values)},) for {', '.join(names)}, in rows]\n", namespace)
+            convert = self._row_converters[key] = namespace["convert"]
+        return convert(rows)
+
+    def save(self, data, table_name, columns=None):
         """
         Saves the provided data to the specified table.
 
+        A new row is inserted with the columns in data. When a row with the
+        same id exists, only the given columns of it are updated, in place,
+        so the indexes of the other columns are left alone and no delete
+        cascades to the rows referencing it.
+
         Args:
             data (dict): The data to be saved.
             table_name (str): The name of the table to save the data to.
+            columns (tuple, optional): The columns to update if the row exists, all columns in data by default.
 
         Returns:
             int or bool: The last inserted row id if successful, False if an integrity error occurs.
+
+        Raises:
+            DatabaseLocked: If other connections held the database locked for too long.
         """
-        query, columns = self._construct_insert_query(table_name)
+        query, columns = self._construct_insert_query(table_name, tuple(data), columns)
+        writer = self.writers.get(self.db_path)
+        if writer:
+            try:
+                writer.execute(query, self._adapt(table_name, columns, (data[column] for column in columns)))
+                return True
+            except DatabaseLocked:
+                raise
+            except Exception:
+                return False
         with SQLiteConnection(self.db_path) as connection:
             try:
-                data_values = tuple(data[column] for column in columns)
-                cursor = connection.cursor()
-                cursor.execute(query, data_values)
+                data_values = self._adapt(table_name, columns, (data[column] for column in columns))
+                self._execute(connection, query, data_values)
                 return True
+            except DatabaseLocked:
+                raise
             except Exception:
                 return False
 
-    def _construct_insert_query(self, table_name: str):
+    def _construct_insert_query(self, table_name: str, columns=None, update_columns=None):
         """
-        Generates an INSERT query for the given table name.
+        Generates an upsert query for the given table name, cached per schema and columns.
+
+        The row is inserted, or when its id exists the update columns are set
+        in place. REPLACE INTO would delete the existing row and insert it
+        again, rewriting every index and firing the ON DELETE actions.
 
         Args:
             table_name (str): The name of the table.
+            columns (tuple, optional): The columns inserted, all columns of the table by default.
+            update_columns (tuple, optional): The columns updated when the row exists, all inserted columns by default.
 
         Returns:
-            Tuple[str, List[str]]: The generated INSERT query and list of columns.
+            Tuple[str, List[str]]: The generated query and the columns its parameters are for.
         """
-        columns = self._get_columns_from_table_schema(self.TABLES[table_name])
-        placeholders = ", ".join(["?" for _ in columns])
-        return f"REPLACE INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})", columns  # Returning columns too
+        key = (self.TABLES[table_name], columns, update_columns)
+        cached = self._insert_queries.get(key)
+        if cached is None:
+            schema_columns = self._get_columns_from_table_schema(self.TABLES[table_name])
+            inserted = [column for column in schema_columns if columns is None or column in columns]
+            updated = [column for column in inserted
+                       if column != "id" and (update_columns is None or column in update_columns)]
+            placeholders = ", ".join(["?" for _ in inserted])
+            conflict = (f"DO UPDATE SET {', '.join(f'{column} = excluded.{column}' for column in updated)}"
+                        if updated else "DO NOTHING")
+            query = f"INSERT INTO {table_name} ({', '.join(inserted)}) VALUES ({placeholders}) ON CONFLICT (id) {conflict}"
+            cached = self._insert_queries[key] = (query, inserted)
+        return cached
 
     @staticmethod
     def _get_columns_from_table_schema(table_schema: str) -> list:
@@ -113,20 +791,173 @@ class DataStore:
         with SQLiteConnection(self.db_path) as connection:
             try:
                 connection.row_factory = sqlite3.Row
-                cursor = connection.cursor()
                 query = f"SELECT * FROM {table_name}"
+                params = ()
                 if id:
                     query += self._construct_where_clause(table_name, id)
-                cursor.execute(query)
-                rows = cursor.fetchall()
+                    params = self._adapt(table_name, ["id"], [id])
+                rows = self._execute(connection, query, params, fetch=True)
+                columns = rows[0].keys() if rows else ()
+                if self._column_functions(table_name, columns, 1):
+                    return [dict(zip(columns, row)) for row in self._convert_rows(table_name, columns, rows)]
                 return [dict(row) for row in rows]
+            except DatabaseLocked:
+                raise
+            except sqlite3.Error as e:
+                print(f"Error loading data from table {table_name}: {str(e)}")
+                return None
+
+    # Maximum number of ids bound in a single "WHERE id IN (...)" query
+    MAX_IDS_PER_QUERY = 500
+
+    def load_rows(self, table_name, id=None, columns=None, ids=None):
+        """
+        Loads rows from the specified table as plain tuples, optionally filtering by ID.
+
+        Unlike load, no dictionary is built per row, which makes this the fast
+        path for hydrating model objects.
+
+        Args:
+            table_name (str): The name of the table.
+            id (int, optional): The ID to filter by. Defaults to None.
+            columns (list, optional): The columns to select, all columns of the
+                table schema by default. Rows hold the values in this order.
+            ids (list, optional): Several IDs to filter by, loaded in batches.
+
+        Returns:
+            list or None: The rows as tuples, or None if the table or a column does not exist.
+        """
+        if table_name not in self.TABLES:
+            print(f"Error loading data from table {table_name}: no such table")
+            return None
+        table_columns = self.columns(table_name)
+        columns = columns or table_columns
+        unknown = [column for column in columns if column not in table_columns]
+        if unknown:
+            print(f"Error loading data from table {table_name}: no such columns {unknown}")
+            return None
+        query = f"SELECT {', '.join(columns)} FROM {table_name}"
+        with SQLiteConnection(self.db_path) as connection:
+            try:
+                if ids is not None:
+                    adapters = self._column_functions(table_name, ["id"], 0)
+                    ids = [adapters[0](value) for value in ids] if adapters else list(ids)
+                    rows = []
+                    for start in range(0, len(ids), self.MAX_IDS_PER_QUERY):
+                        batch = ids[start:start + self.MAX_IDS_PER_QUERY]
+                        placeholders = ", ".join("?" for _ in batch)
+                        rows += self._execute(connection, f"{query} WHERE id IN ({placeholders})",
+                                              tuple(batch), fetch=True)
+                    return self._convert_rows(table_name, columns, rows)
+                params = ()
+                if id:
+                    query += self._construct_where_clause(table_name, id)
+                    params = self._adapt(table_name, ["id"], [id])
+                return self._convert_rows(table_name, columns, self._execute(connection, query, params, fetch=True))
+            except DatabaseLocked:
+                raise
+            except sqlite3.Error as e:
+                print(f"Error loading data from table {table_name}: {str(e)}")
+                return None
+
+    def load_range(self, table_name, column, after=None, before=None, columns=None, equals=None):
+        """
+        Loads the rows whose column lies in a range, as an indexed range scan when the column is indexed.
+
+        Args:
+            table_name (str): The name of the table.
+            column (str): The column the range applies to, e.g. a timestamp.
+            after (optional): Only rows whose column is greater than this.
+            before (optional): Only rows whose column is less than or equal to this.
+            columns (list, optional): The columns to select, all columns of the table by default.
+            equals (dict, optional): Columns the rows must also have the given values in.
+
+        Returns:
+            list or None: The rows as tuples ordered by the column, or None if the table or a column does not exist.
+        """
+        query, params = self._range_query(table_name, column, after, before, equals)
+        if query is None:
+            return None
+        columns = columns or self.columns(table_name)
+        with SQLiteConnection(self.db_path) as connection:
+            try:
+                rows = self._execute(connection, f"SELECT {', '.join(columns)} FROM {table_name}{query} ORDER BY {column}",
+                                     params, fetch=True)
+                return self._convert_rows(table_name, columns, rows)
+            except DatabaseLocked:
+                raise
             except sqlite3.Error as e:
                 print(f"Error loading data from table {table_name}: {str(e)}")
                 return None
 
+    def delete_range(self, table_name, column, before, equals=None) -> int:
+        """
+        Deletes the rows whose column is less than or equal to a value, e.g. expired sessions.
+
+        Args:
+            table_name (str): The name of the table.
+            column (str): The column the range applies to.
+            before: Rows whose column is less than or equal to this are deleted.
+            equals (dict, optional): Columns the rows must also have the given values in.
+
+        Returns:
+            int: The number of deleted rows.
+        """
+        query, params = self._range_query(table_name, column, None, before, equals)
+        if query is None:
+            return 0
+        query = f"DELETE FROM {table_name}{query}"
+        writer = self.writers.get(self.db_path)
+        try:
+            if writer:
+                return writer.execute(query, params)
+            with SQLiteConnection(self.db_path) as connection:
+                return self._execute(connection, query, params).rowcount
+        except DatabaseLocked:
+            raise
+        except sqlite3.Error as e:
+            print(f"Error deleting entries from table {table_name}: {str(e)}")
+            return 0
+
+    def _range_query(self, table_name, column, after, before, equals):
+        """
+        Builds the WHERE clause of load_range and delete_range, with the bounds adapted to their stored form.
+
+        Returns:
+            tuple: The WHERE clause and its parameters, (None, None) if the table or a column does not exist.
+        """
+        if table_name not in self.TABLES:
+            print(f"Error loading data from table {table_name}: no such table")
+            return None, None
+        equals = equals or {}
+        unknown = {column, *equals} - set(self.columns(table_name))
+        if unknown:
+            print(f"Error loading data from table {table_name}: no such columns {sorted(unknown)}")
+            return None, None
+        conditions = [f"{name} = ?" for name in equals]
+        params = list(self._adapt(table_name, list(equals), equals.values()))
+        for operator, bound in ((">", after), ("<=", before)):
+            if bound is not None:
+                conditions.append(f"{column} {operator} ?")
+                params.append(self._adapt(table_name, [column], [bound])[0])
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), tuple(params)
+
+    def columns(self, table_name: str) -> list:
+        """
+        Returns the column names of a table in schema order.
+
+        Args:
+            table_name (str): The name of the table.
+
+        Returns:
+            list: The column names.
+        """
+        return self._get_columns_from_table_schema(self.TABLES[table_name])
+
     def _construct_where_clause(self, table_name: str, id: int) -> str:
         """
         Generates a WHERE clause for the query based on the table name and ID.
+        The ID is bound as a parameter rather than formatted into the query.
 
         Args:
             table_name (str): The name of the table.
@@ -135,7 +966,7 @@ class DataStore:
         Returns:
             str: The generated WHERE clause.
         """
-        return f" WHERE id = '{id}'"
+        return " WHERE id = ?"
 
     def delete(self, id, table_name):
         """
@@ -148,15 +979,48 @@ class DataStore:
         Returns:
             bool: True if the deletion is successful, False otherwise.
         """
+        query = f"DELETE FROM {table_name} WHERE id = ?"
+        params = self._adapt(table_name, ["id"], [id])
+        writer = self.writers.get(self.db_path)
+        if writer:
+            try:
+                return writer.execute(query, params) > 0
+            except DatabaseLocked:
+                raise
+            except sqlite3.Error as e:
+                print(f"Error deleting entry from table {table_name}: {str(e)}")
+                return False
         with SQLiteConnection(self.db_path) as connection:
             try:
-                cursor = connection.cursor()
-                cursor.execute(f"DELETE FROM {table_name} WHERE id = ?", (id,))
+                cursor = self._execute(connection, query, params)
                 return cursor.rowcount > 0
+            except DatabaseLocked:
+                raise
             except sqlite3.Error as e:
                 print(f"Error deleting entry from table {table_name}: {str(e)}")
                 return False
             
+    @staticmethod
+    def _execute(connection: sqlite3.Connection, query: str, params: tuple = (), fetch: bool = False):
+        """
+        Executes a query, reporting its duration to the installed QueryTracer if any.
+
+        Args:
+            connection (sqlite3.Connection): The connection to execute on.
+            query (str): The query.
+            params (tuple): The query parameters.
+            fetch (bool): Whether to fetch and return all rows, the timing then includes the fetch.
+
+        Returns:
+            list or sqlite3.Cursor: The rows if fetch is set, the cursor otherwise.
+        """
+        started = time.perf_counter()
+        cursor = SQLiteConnection.contention.run(lambda: connection.execute(query, params), connection)
+        result = cursor.fetchall() if fetch else cursor
+        if SQLiteConnection.tracer:
+            SQLiteConnection.tracer.record(connection, query, params, time.perf_counter() - started)
+        return result
+
     def clear_tables(self):
         """
         Clears all tables in the database.
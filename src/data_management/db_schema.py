@@ -1,8 +1,9 @@
 
-# Table creation statements
+# Table creation statements. ID_BLOB columns hold the 32 character hex ids as 16 byte
+# blobs and TIMESTAMP_MS columns hold integer epoch milliseconds, see DataStore.COLUMN_TYPES.
 USER_TABLE = """
 CREATE TABLE IF NOT EXISTS user (
-    id TEXT PRIMARY KEY,
+    id ID_BLOB PRIMARY KEY,
     username TEXT NOT NULL UNIQUE,
     hashed_password TEXT NOT NULL,
     email TEXT NOT NULL UNIQUE
@@ -11,8 +12,8 @@ CREATE TABLE IF NOT EXISTS user (
 
 TOPIC_TABLE = """
 CREATE TABLE IF NOT EXISTS topic (
-    id TEXT PRIMARY KEY,
-    user_id INTEGER,
+    id ID_BLOB PRIMARY KEY,
+    user_id ID_BLOB,
     name TEXT NOT NULL UNIQUE,
     description TEXT NOT NULL,
     FOREIGN KEY (user_id) REFERENCES user (id) ON DELETE CASCADE
@@ -21,9 +22,9 @@ CREATE TABLE IF NOT EXISTS topic (
 
 REVIEW_TABLE = """
 CREATE TABLE IF NOT EXISTS review (
-    id TEXT PRIMARY KEY,
-    user_id INTEGER,
-    topic_id INTEGER,
+    id ID_BLOB PRIMARY KEY,
+    user_id ID_BLOB,
+    topic_id ID_BLOB,
     review_text TEXT,
     status TEXT,
     review_ratings TEXT,
@@ -34,13 +35,105 @@ CREATE TABLE IF NOT EXISTS review (
 
 SESSION_TABLE = """
 CREATE TABLE IF NOT EXISTS session (
-    id TEXT PRIMARY KEY,
-    user_id INTEGER,
-    created_at TIMESTAMP NOT NULL,
-    expires_at TIMESTAMP NOT NULL,
-    last_activity_at TIMESTAMP NOT NULL,
+    id ID_BLOB PRIMARY KEY,
+    user_id ID_BLOB,
+    created_at TIMESTAMP_MS NOT NULL,
+    expires_at TIMESTAMP_MS NOT NULL,
+    last_activity_at TIMESTAMP_MS NOT NULL,
     is_active BOOLEAN NOT NULL,
     FOREIGN KEY (user_id) REFERENCES user (id) ON DELETE CASCADE
 );
 """
 
+# Expiry sweeps and active session lookups are range scans of these indexes.
+SESSION_EXPIRES_INDEX = """
+CREATE INDEX IF NOT EXISTS session_expires_at ON session (expires_at);
+"""
+
+SESSION_ACTIVE_INDEX = """
+CREATE INDEX IF NOT EXISTS session_active ON session (is_active, expires_at);
+"""
+
+
+# Append-only log of every insert, update and delete of the tracked tables, written by
+# the triggers of change_log_triggers. AUTOINCREMENT keeps seq increasing even after
+# compaction deleted the newest entries.
+CHANGE_LOG_TABLE = """
+CREATE TABLE IF NOT EXISTS change_log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    table_name TEXT NOT NULL,
+    row_id ID_BLOB NOT NULL,
+    operation TEXT NOT NULL,
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+CHANGE_LOG_INDEX = """
+CREATE INDEX IF NOT EXISTS change_log_row ON change_log (table_name, row_id, seq);
+"""
+
+CHANGE_LOG_CHECKPOINT_TABLE = """
+CREATE TABLE IF NOT EXISTS change_log_checkpoint (
+    consumer TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL
+);
+"""
+
+
+def change_log_triggers(table_name: str) -> list:
+    """
+    Returns the statements creating the triggers that log the changes of a table.
+
+    Rows are saved with upserts (INSERT ... ON CONFLICT (id) DO UPDATE). Their
+    BEFORE INSERT triggers fire even when the row exists and is updated, so
+    inserts are logged AFTER INSERT, which only fires for rows actually
+    inserted; the update trigger logs the others.
+
+    Args:
+        table_name (str): The table to track.
+
+    Returns:
+        list: The CREATE TRIGGER statements.
+    """
+    return [f"""
+CREATE TRIGGER IF NOT EXISTS {table_name}_log_insert AFTER INSERT ON {table_name}
+BEGIN
+    INSERT INTO change_log (table_name, row_id, operation) VALUES ('{table_name}', NEW.id, 'insert');
+END;
+""", f"""
+CREATE TRIGGER IF NOT EXISTS {table_name}_log_update AFTER UPDATE ON {table_name}
+BEGIN
+    INSERT INTO change_log (table_name, row_id, operation) VALUES ('{table_name}', NEW.id, 'update');
+END;
+""", f"""
+CREATE TRIGGER IF NOT EXISTS {table_name}_log_delete AFTER DELETE ON {table_name}
+BEGIN
+    INSERT INTO change_log (table_name, row_id, operation) VALUES ('{table_name}', OLD.id, 'delete');
+END;
+"""]
+
+
+# Durable background jobs, see job_queue.py. run_at is when a queued job may run next,
+# or when the lease of a running job expires and another worker may claim it again.
+JOB_TABLE = """
+CREATE TABLE IF NOT EXISTS job (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_at TIMESTAMP_MS NOT NULL,
+    created_at TIMESTAMP_MS NOT NULL,
+    finished_at TIMESTAMP_MS,
+    worker TEXT,
+    error TEXT,
+    result TEXT
+);
+"""
+
+# Claiming walks the claimable jobs in priority order, finished jobs are left out of the index.
+JOB_CLAIM_INDEX = """
+CREATE INDEX IF NOT EXISTS job_claim ON job (priority DESC, run_at) WHERE status IN ('queued', 'running');
+"""
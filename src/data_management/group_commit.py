@@ -0,0 +1,179 @@
+"""
+group_commit.py - A single writer thread committing DataStore writes in groups
+
+Without it every save and delete opens its own connection and commits, so
+concurrent requests queue up on the SQLite write lock and each pays for its
+own fsync. Once a GroupCommitWriter is installed for a database, DataStore
+hands its writes to the writer thread instead. The thread owns the only write
+connection, collects every write that arrives within a short window and
+commits them in one transaction. Each write runs inside its own SAVEPOINT, so
+a write that fails is rolled back on its own without failing the others in
+its group. Callers wait on a future resolved once their write is committed,
+at most until the deadline of their thread (see ContentionPolicy.deadline):
+a write still queued then is cancelled and DatabaseLocked raised, as when a
+direct write finds the database locked for too long. Reads keep using their
+own connections.
+
+Usage:
+    writer = GroupCommitWriter("database_path", window_ms=2).install()
+    ...
+    writer.uninstall()
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from src.data_management.data_store import ContentionPolicy, DatabaseLocked, DataStore, SQLiteConnection
+
+_STOP = object()
+
+
+class GroupCommitWriter:
+    """Owns the write connection of a database and group-commits the writes submitted to it."""
+
+    def __init__(self, db_path: str, window_ms: float = 2.0, max_batch: int = 256):
+        """
+        Initializes the writer, the thread is started by install.
+
+        Args:
+            db_path (str): The database name, relative to src/database/.
+            window_ms (float): How long to wait for more writes after the first write of a group.
+            max_batch (int): The largest number of writes committed together.
+        """
+        self.db_path = DataStore(db_path).db_path
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.thread = None
+        self.commits = 0
+        self.operations = 0
+
+    def install(self):
+        """Starts the writer thread and routes the database's DataStore writes through it."""
+        self.thread = threading.Thread(target=self._run, name=f"group-commit {self.db_path}", daemon=True)
+        self.thread.start()
+        DataStore.writers[self.db_path] = self
+        return self
+
+    def uninstall(self):
+        """Stops routing writes through the writer, then commits what is queued and stops the thread."""
+        if DataStore.writers.get(self.db_path) is self:
+            del DataStore.writers[self.db_path]
+        if self.thread:
+            self.queue.put(_STOP)
+            self.thread.join()
+            self.thread = None
+
+    def submit(self, query: str, params: tuple = ()) -> Future:
+        """
+        Queues a write statement.
+
+        Args:
+            query (str): The statement.
+            params (tuple): The statement parameters.
+
+        Returns:
+            Future: Resolved with the number of rows changed once the write is
+            committed, or with the exception the write raised.
+        """
+        future = Future()
+        self.queue.put((query, params, future))
+        return future
+
+    def execute(self, query: str, params: tuple = ()) -> int:
+        """
+        Runs a write statement and waits for it to be committed, until the current thread's deadline.
+
+        Args:
+            query (str): The statement.
+            params (tuple): The statement parameters.
+
+        Returns:
+            int: The number of rows changed.
+
+        Raises:
+            DatabaseLocked: If the write was not committed by the deadline. A write that
+                had not started yet is cancelled, one being committed may still be.
+        """
+        future = self.submit(query, params)
+        try:
+            return future.result(timeout=ContentionPolicy.remaining())
+        except FutureTimeoutError:
+            cancelled = future.cancel()
+            contention = SQLiteConnection.contention
+            with contention.lock:
+                contention.lock_timeouts += 1
+            if cancelled:
+                raise DatabaseLocked("the write was still queued for the group commit writer at the deadline")
+            raise DatabaseLocked("the group commit writer did not commit the write by the deadline")
+
+    def _collect(self, first) -> list:
+        """Returns the first write and every write arriving within the window after it."""
+        batch = [first]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                operation = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(operation)
+            if operation is _STOP:
+                break
+        return batch
+
+    def _run(self):
+        """The writer thread: commits the queued writes group by group until stopped."""
+        connection = sqlite3.connect(self.db_path, isolation_level=None, timeout=SQLiteConnection.contention.busy_timeout,
+                                     uri=True)
+        connection.execute("PRAGMA foreign_keys=ON;")
+        if SQLiteConnection.tracer:
+            SQLiteConnection.tracer.attach(connection)
+        stopping = False
+        while not stopping:
+            batch = self._collect(self.queue.get())
+            stopping = batch[-1] is _STOP
+            operations = [operation for operation in batch if operation is not _STOP]
+            if operations:
+                self._commit(connection, operations)
+        connection.close()
+
+    def _commit(self, connection: sqlite3.Connection, operations: list):
+        """
+        Runs a group of writes in a single transaction and resolves their futures.
+
+        Args:
+            connection (sqlite3.Connection): The write connection.
+            operations (list): (query, params, future) tuples.
+        """
+        # writes cancelled at their caller's deadline are skipped, the others can no longer be cancelled
+        operations = [operation for operation in operations if operation[2].set_running_or_notify_cancel()]
+        if not operations:
+            return
+        results = []
+        try:
+            SQLiteConnection.contention.run(lambda: connection.execute("BEGIN IMMEDIATE"), connection)
+            for query, params, future in operations:
+                connection.execute("SAVEPOINT write")
+                try:
+                    results.append(DataStore._execute(connection, query, params).rowcount)
+                    connection.execute("RELEASE write")
+                except sqlite3.Error as e:
+                    connection.execute("ROLLBACK TO write")
+                    connection.execute("RELEASE write")
+                    results.append(e)
+            SQLiteConnection.contention.run(lambda: connection.execute("COMMIT"), connection)
+        except sqlite3.Error as e:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            results = [e] * len(operations)
+
+        self.commits += 1
+        self.operations += len(operations)
+        for (query, params, future), result in zip(operations, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
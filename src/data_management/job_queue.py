@@ -0,0 +1,346 @@
+"""
+job_queue.py - Durable background jobs
+
+Some work does not need to hold up the request that causes it: cascading
+deletes, recomputing aggregates, exports and session cleanup. A handler puts
+such work on a JobQueue and returns right away, and a pool of JobWorkers
+threads runs it. The jobs are rows of the job table of the database, so they
+survive restarts and every server process sharing the database can work on
+them.
+
+A worker claims the queued job with the highest priority whose run_at has
+passed, in a single UPDATE ... RETURNING statement so no two workers claim the
+same job. Claiming leases the job for the visibility timeout: if the worker
+dies, or takes longer than that, the job becomes claimable again. A job that
+fails is retried with exponential backoff until it ran max_attempts times,
+after which it is marked failed with its last error. Finished jobs are kept
+for inspection until purged.
+
+Usage (from the repository root):
+    $ python3 -m src.data_management.job_queue database_path --purge-hours 24
+"""
+
+import argparse
+import collections
+import json
+import logging
+import random
+import threading
+import time
+from src.data_management import db_schema
+from src.data_management.data_store import DataStore, SQLiteConnection
+
+logger = logging.getLogger(__name__)
+
+Job = collections.namedtuple("Job", ["id", "kind", "payload", "priority", "attempts", "max_attempts", "worker"])
+
+# Job statuses. Queued and running jobs are claimable once their run_at has passed.
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class JobQueue:
+    """The durable queue of background jobs of a database."""
+
+    def __init__(self, db_path: str, retry_delay: float = 1.0, max_retry_delay: float = 300.0, clock=time.time):
+        """
+        Initializes a JobQueue instance, creating the job table if needed.
+
+        Args:
+            db_path (str): The database name, relative to src/database/.
+            retry_delay (float): Seconds before the first retry of a failed job, doubled on every further retry.
+            max_retry_delay (float): The longest delay between two attempts, in seconds.
+            clock: Returns the current time in seconds since the epoch.
+        """
+        self.db_path = DataStore(db_path).db_path
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.clock = clock
+        # notified on enqueue so idle workers of this process pick the job up without waiting for their next poll
+        self.enqueued = threading.Condition()
+        with SQLiteConnection(self.db_path) as connection:
+            connection.execute(db_schema.JOB_TABLE)
+            connection.execute(db_schema.JOB_CLAIM_INDEX)
+
+    def _now(self) -> int:
+        """Returns the current time in epoch milliseconds."""
+        return int(self.clock() * 1000)
+
+    def enqueue(self, kind: str, payload: dict = None, priority: int = 0, delay: float = 0.0,
+                max_attempts: int = 3) -> int:
+        """
+        Adds a job to the queue.
+
+        Args:
+            kind (str): The job kind, selecting the handler that runs it.
+            payload (dict, optional): The JSON-serializable arguments of the handler.
+            priority (int): Jobs with a higher priority are claimed first.
+            delay (float): Seconds before the job may run.
+            max_attempts (int): How many times the job runs before it is marked failed.
+
+        Returns:
+            int: The job id.
+        """
+        now = self._now()
+        with SQLiteConnection(self.db_path) as connection:
+            cursor = DataStore._execute(connection, """
+                INSERT INTO job (kind, payload, priority, status, max_attempts, run_at, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (kind, json.dumps(payload or {}), priority, QUEUED, max_attempts, now + int(delay * 1000), now))
+            job_id = cursor.lastrowid
+        with self.enqueued:
+            self.enqueued.notify()
+        return job_id
+
+    def claim(self, worker: str, visibility_timeout: float = 60.0):
+        """
+        Claims the next job to run, leasing it to a worker.
+
+        Running jobs whose lease expired are claimed again, unless they already
+        ran max_attempts times: those are marked failed instead.
+
+        Args:
+            worker (str): The name of the claiming worker.
+            visibility_timeout (float): Seconds before the job may be claimed by another worker.
+
+        Returns:
+            Job: The claimed job, None if no job is ready.
+        """
+        while True:
+            now = self._now()
+            # the statuses are literals so the planner can use the partial index job_claim
+            with SQLiteConnection(self.db_path) as connection:
+                rows = DataStore._execute(connection, """
+                    UPDATE job SET status = 'running', attempts = attempts + 1, run_at = ?, worker = ?
+                    WHERE id = (SELECT id FROM job WHERE status IN ('queued', 'running') AND run_at <= ?
+                                ORDER BY priority DESC, run_at LIMIT 1)
+                    RETURNING id, kind, payload, priority, attempts, max_attempts, worker
+                """, (now + int(visibility_timeout * 1000), worker, now), fetch=True)
+            if not rows:
+                return None
+            job_id, kind, payload, priority, attempts, max_attempts, worker = rows[0]
+            job = Job(job_id, kind, json.loads(payload), priority, attempts, max_attempts, worker)
+            if attempts <= max_attempts:
+                return job
+            # the worker of the last attempt went away without finishing it
+            self.fail(job, "visibility timeout expired on the last attempt", retry=False)
+
+    def complete(self, job: Job, result=None) -> bool:
+        """
+        Marks a claimed job done.
+
+        Args:
+            job (Job): The job, as returned by claim.
+            result: The JSON-serializable result of the job.
+
+        Returns:
+            bool: False if the lease had expired and the job was claimed again, the result is then dropped.
+        """
+        return self._finish(job, DONE, self._now(), "result = ?", json.dumps(result))
+
+    def fail(self, job: Job, error: str, retry: bool = True) -> bool:
+        """
+        Records a failed attempt, queueing the job again with backoff or marking it failed.
+
+        Args:
+            job (Job): The job, as returned by claim.
+            error (str): Description of the failure.
+            retry (bool): Whether the job may be retried, if it has attempts left.
+
+        Returns:
+            bool: False if the lease had expired and the job was claimed again.
+        """
+        if retry and job.attempts < job.max_attempts:
+            delay = min(self.retry_delay * 2 ** (job.attempts - 1), self.max_retry_delay)
+            run_at = self._now() + int(random.uniform(delay / 2, delay) * 1000)
+            return self._finish(job, QUEUED, None, "error = ?, run_at = ?", error, run_at)
+        return self._finish(job, FAILED, self._now(), "error = ?", error)
+
+    def extend(self, job: Job, visibility_timeout: float) -> bool:
+        """
+        Renews the lease of a job that is still running, so it is not claimed again.
+
+        Args:
+            job (Job): The job, as returned by claim.
+            visibility_timeout (float): Seconds from now before the job may be claimed by another worker.
+
+        Returns:
+            bool: False if the lease had already expired and the job was claimed again.
+        """
+        run_at = self._now() + int(visibility_timeout * 1000)
+        return self._finish(job, RUNNING, None, "run_at = ?", run_at)
+
+    def _finish(self, job: Job, status: str, finished_at, assignments: str, *params) -> bool:
+        """Updates a job, provided the worker still holds the lease of this attempt."""
+        with SQLiteConnection(self.db_path) as connection:
+            cursor = DataStore._execute(connection, f"""
+                UPDATE job SET status = ?, finished_at = ?, {assignments}
+                WHERE id = ? AND status = ? AND worker = ? AND attempts = ?
+            """, (status, finished_at) + params + (job.id, RUNNING, job.worker, job.attempts))
+            return cursor.rowcount == 1
+
+    def get(self, job_id: int):
+        """
+        Returns the state of a job.
+
+        Args:
+            job_id (int): The job id.
+
+        Returns:
+            dict: The job columns, with the payload and result decoded, None if there is no such job.
+        """
+        with SQLiteConnection(self.db_path) as connection:
+            cursor = DataStore._execute(connection, "SELECT * FROM job WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            job = dict(zip([column[0] for column in cursor.description], row))
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def counts(self) -> dict:
+        """
+        Returns the number of jobs by status.
+
+        Returns:
+            dict: The number of queued, running, done and failed jobs.
+        """
+        with SQLiteConnection(self.db_path) as connection:
+            counts = dict(DataStore._execute(connection, "SELECT status, COUNT(*) FROM job GROUP BY status", fetch=True))
+        return {status: counts.get(status, 0) for status in (QUEUED, RUNNING, DONE, FAILED)}
+
+    def pending(self, kind: str) -> int:
+        """
+        Returns the number of jobs of a kind that are queued or running.
+
+        Args:
+            kind (str): The job kind.
+
+        Returns:
+            int: The number of jobs not finished yet.
+        """
+        with SQLiteConnection(self.db_path) as connection:
+            return DataStore._execute(connection, "SELECT COUNT(*) FROM job WHERE kind = ? AND status IN (?, ?)",
+                                      (kind, QUEUED, RUNNING), fetch=True)[0][0]
+
+    def purge(self, older_than: float = 24 * 3600) -> int:
+        """
+        Deletes the finished jobs, done or failed, that finished longer ago than older_than seconds.
+
+        Returns:
+            int: The number of deleted jobs.
+        """
+        with SQLiteConnection(self.db_path) as connection:
+            return DataStore._execute(connection, "DELETE FROM job WHERE status IN (?, ?) AND finished_at <= ?",
+                                      (DONE, FAILED, self._now() - int(older_than * 1000))).rowcount
+
+
+class JobWorkers:
+    """A pool of threads running the jobs of a JobQueue with their handlers."""
+
+    def __init__(self, queue: JobQueue, handlers: dict, workers: int = 2, poll_interval: float = 1.0,
+                 visibility_timeout: float = 60.0, name: str = "job-worker"):
+        """
+        Initializes the pool, the threads are started by start.
+
+        Args:
+            queue (JobQueue): The queue to run the jobs of.
+            handlers (dict): The handler of each job kind, called with the payload and returning the result.
+            workers (int): The number of worker threads.
+            poll_interval (float): Seconds an idle worker waits before looking for jobs again.
+            visibility_timeout (float): Seconds a job may run before another worker may claim it again.
+            name (str): The name of the worker threads, also recorded on the jobs they claim.
+        """
+        self.queue = queue
+        self.handlers = handlers
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.name = name
+        self.completed = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.threads = []
+
+    def start(self):
+        """Starts the worker threads."""
+        self.stopped.clear()
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._run, args=(f"{self.name}-{number}",),
+                                      name=f"{self.name}-{number}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self):
+        """Stops the worker threads, waiting for the jobs in progress to finish."""
+        self.stopped.set()
+        with self.queue.enqueued:
+            self.queue.enqueued.notify_all()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def _run(self, worker: str):
+        """Runs jobs until stopped, waiting for new ones when the queue is empty."""
+        while not self.stopped.is_set():
+            try:
+                if self.run_once(worker):
+                    continue
+            except Exception:
+                # e.g. the database stayed locked, try again after the poll interval
+                logger.exception("%s could not claim a job", worker)
+            with self.queue.enqueued:
+                if not self.stopped.is_set():
+                    self.queue.enqueued.wait(self.poll_interval)
+
+    def run_once(self, worker: str = None) -> bool:
+        """
+        Claims and runs a single job.
+
+        Args:
+            worker (str, optional): The name recorded on the job, the pool name by default.
+
+        Returns:
+            bool: Whether a job was ready.
+        """
+        job = self.queue.claim(worker or self.name, self.visibility_timeout)
+        if job is None:
+            return False
+        handler = self.handlers.get(job.kind)
+        if handler is None:
+            self.queue.fail(job, f"no handler for job kind {job.kind!r}", retry=False)
+            self._count("failed")
+            return True
+        try:
+            result = handler(job.payload)
+        except Exception as e:
+            logger.warning("job %s (%s) failed on attempt %s: %r", job.id, job.kind, job.attempts, e)
+            self.queue.fail(job, repr(e))
+            self._count("failed")
+            return True
+        self.queue.complete(job, result)
+        self._count("completed")
+        return True
+
+    def _count(self, counter: str):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show the job counts of a database and purge finished jobs.")
+    parser.add_argument("db_path", help="database name, relative to src/database/")
+    parser.add_argument("--purge-hours", type=float,
+                        help="delete the done and failed jobs that finished longer ago than this")
+    args = parser.parse_args(argv)
+
+    queue = JobQueue(args.db_path)
+    if args.purge_hours is not None:
+        print(f"Purged {queue.purge(args.purge_hours * 3600)} finished jobs")
+    print(", ".join(f"{status}: {count}" for status, count in queue.counts().items()))
+
+
+if __name__ == "__main__":
+    main()
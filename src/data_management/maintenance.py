@@ -0,0 +1,254 @@
+"""
+maintenance.py - Scheduled database maintenance
+
+Updates and deletes leave free pages behind, so the database
+files only grow, and the query planner has no statistics unless someone runs
+ANALYZE. A MaintenanceScheduler periodically, for the main database file and
+every review shard:
+- runs PRAGMA optimize, which analyzes the tables whose statistics are
+  missing or stale, with a bounded analysis limit so it stays cheap,
+- runs incremental vacuum a few pages at a time until the free pages are gone
+  or the time budget is spent, so writers are never held up for long,
+- takes an online backup through the sqlite3 backup API, copying a few pages
+  per step so readers keep going while it runs.
+
+Incremental vacuum needs auto_vacuum=INCREMENTAL. DataStore sets it on new
+databases; older ones are converted once, with a full VACUUM, by
+enable_incremental_vacuum or the --enable-incremental-vacuum option.
+
+Every run returns a report with the durations and the space reclaimed, also
+logged at INFO level.
+
+Usage (from the repository root):
+    $ python3 -m src.data_management.maintenance database_path --backup-dir src/database/backups
+"""
+
+import argparse
+import datetime
+import glob
+import logging
+import os
+import sqlite3
+import threading
+import time
+from src.data_management.data_store import DataStore, SQLiteConnection
+
+logger = logging.getLogger(__name__)
+
+# PRAGMA auto_vacuum values
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+class MaintenanceScheduler:
+    """Runs ANALYZE, incremental vacuum and online backups of a database on a schedule."""
+
+    def __init__(self, db_path: str, interval: float = 3600.0, vacuum_budget: float = 0.5,
+                 vacuum_step_pages: int = 64, backup_dir: str = None, keep_backups: int = 3,
+                 backup_step_pages: int = 256):
+        """
+        Initializes the scheduler, the thread is started by start.
+
+        Args:
+            db_path (str): The database name, relative to src/database/.
+            interval (float): Seconds between two maintenance runs.
+            vacuum_budget (float): Seconds incremental vacuum may take per file and run.
+            vacuum_step_pages (int): Free pages released per incremental vacuum step.
+            backup_dir (str, optional): The directory backups are written to, no backups when None.
+            keep_backups (int): The number of backups kept per file, older ones are deleted.
+            backup_step_pages (int): Pages copied per backup step.
+        """
+        data_store = DataStore.open(db_path)
+        # the main file first, then the review shards of a partitioned database
+        self.paths = [data_store.db_path] + [shard.db_path for shard in getattr(data_store, "shards", ())]
+        self.interval = interval
+        self.vacuum_budget = vacuum_budget
+        self.vacuum_step_pages = vacuum_step_pages
+        self.backup_dir = backup_dir
+        self.keep_backups = keep_backups
+        self.backup_step_pages = backup_step_pages
+        self.reports = []
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Starts running maintenance every interval seconds in a background thread."""
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, name="database-maintenance", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stops the background thread, waiting for a run in progress to finish."""
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        """Runs maintenance until stopped."""
+        while not self.stopped.wait(self.interval):
+            self.run_once()
+
+    def run_once(self) -> dict:
+        """
+        Optimizes, vacuums and backs up every file of the database once.
+
+        Returns:
+            dict: The report of each file by path, and the total duration and reclaimed bytes.
+        """
+        started = time.perf_counter()
+        report = {"files": {}, "reclaimed_bytes": 0}
+        for path in self.paths:
+            file_report = {}
+            for name, task in (("optimize", self.optimize), ("vacuum", self.incremental_vacuum),
+                               ("backup", self.backup if self.backup_dir else None)):
+                if task is None:
+                    continue
+                try:
+                    file_report[name] = task(path)
+                except (sqlite3.Error, OSError) as e:
+                    # e.g. the write lock was busy for longer than the timeout, the next run tries again
+                    file_report[name] = {"error": str(e)}
+            report["files"][path] = file_report
+            report["reclaimed_bytes"] += file_report["vacuum"].get("reclaimed_bytes", 0)
+        report["duration_s"] = round(time.perf_counter() - started, 3)
+        self.reports = (self.reports + [report])[-10:]
+        logger.info("database maintenance: %s", report)
+        return report
+
+    @staticmethod
+    def optimize(path: str) -> dict:
+        """
+        Refreshes the query planner statistics of the tables that need it.
+
+        Args:
+            path (str): The database file.
+
+        Returns:
+            dict: The duration, and whether a full ANALYZE was run because no statistics existed.
+        """
+        started = time.perf_counter()
+        with SQLiteConnection(path) as connection:
+            analyzed = connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone() is None
+            # sample at most about 1000 rows per index, so the run stays fast on large tables
+            connection.execute("PRAGMA analysis_limit = 1000")
+            if analyzed:
+                connection.execute("ANALYZE")
+            else:
+                connection.execute("PRAGMA optimize")
+        return {"analyzed": analyzed, "duration_s": round(time.perf_counter() - started, 3)}
+
+    def incremental_vacuum(self, path: str) -> dict:
+        """
+        Releases free pages a few at a time until none are left or the time budget is spent.
+
+        Each step is its own short write transaction, so writers only ever wait for one step.
+
+        Args:
+            path (str): The database file.
+
+        Returns:
+            dict: The pages freed and left, the bytes reclaimed and the duration.
+        """
+        started = time.perf_counter()
+        freed = 0
+        with SQLiteConnection(path) as connection:
+            page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+            free = connection.execute("PRAGMA freelist_count").fetchone()[0]
+            if connection.execute("PRAGMA auto_vacuum").fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+                return {"skipped": "auto_vacuum is not incremental", "free_pages": free}
+            while free and time.perf_counter() - started < self.vacuum_budget:
+                connection.execute(f"PRAGMA incremental_vacuum({self.vacuum_step_pages})").fetchall()
+                connection.commit()
+                left = connection.execute("PRAGMA freelist_count").fetchone()[0]
+                freed += free - left
+                free = left
+        return {"freed_pages": freed, "free_pages": free, "reclaimed_bytes": freed * page_size,
+                "duration_s": round(time.perf_counter() - started, 3)}
+
+    @staticmethod
+    def enable_incremental_vacuum(path: str) -> dict:
+        """
+        Converts a database created without auto_vacuum, which takes a full VACUUM.
+
+        The VACUUM rewrites the whole file and blocks writers while it runs,
+        so this is meant to be run once, e.g. during a deploy.
+
+        Args:
+            path (str): The database file.
+
+        Returns:
+            dict: The file size before and after and the duration.
+        """
+        started = time.perf_counter()
+        size = os.path.getsize(path)
+        with SQLiteConnection(path) as connection:
+            if connection.execute("PRAGMA auto_vacuum").fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+                connection.execute(f"PRAGMA auto_vacuum = {AUTO_VACUUM_INCREMENTAL}")
+                connection.execute("VACUUM")
+        return {"size_before": size, "size_after": os.path.getsize(path),
+                "duration_s": round(time.perf_counter() - started, 3)}
+
+    def backup(self, path: str) -> dict:
+        """
+        Copies a database file to the backup directory while it stays in use.
+
+        The backup API copies backup_step_pages pages per step and lets other
+        connections run in between; if the database is written to meanwhile,
+        the copy restarts so the backup is always consistent. The copy is
+        written to a temporary file and renamed once complete, and only the
+        newest keep_backups backups of the file are kept.
+
+        Args:
+            path (str): The database file.
+
+        Returns:
+            dict: The backup's path, size in bytes and the duration.
+        """
+        started = time.perf_counter()
+        os.makedirs(self.backup_dir, exist_ok=True)
+        stem, extension = os.path.splitext(os.path.basename(path))
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        target_path = os.path.join(self.backup_dir, f"{stem}.{stamp}{extension}")
+        temporary_path = target_path + ".tmp"
+        target = sqlite3.connect(temporary_path)
+        try:
+            with SQLiteConnection(path) as connection:
+                connection.backup(target, pages=self.backup_step_pages)
+        finally:
+            target.close()
+        os.replace(temporary_path, target_path)
+
+        # the stamp sorts by time, and keeps the backups of "x.db" apart from those of a shard "x.review-0.db"
+        pattern = f"{glob.escape(stem)}.{'[0-9]' * 8}-{'[0-9]' * 6}-{'[0-9]' * 6}{glob.escape(extension)}"
+        backups = sorted(glob.glob(os.path.join(glob.escape(self.backup_dir), pattern)))
+        for old_backup in backups[:-self.keep_backups]:
+            os.remove(old_backup)
+        return {"path": target_path, "bytes": os.path.getsize(target_path),
+                "duration_s": round(time.perf_counter() - started, 3)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the maintenance of a database once.")
+    parser.add_argument("db_path", help="database name, relative to src/database/")
+    parser.add_argument("--vacuum-budget", type=float, default=5.0, help="seconds incremental vacuum may take per file")
+    parser.add_argument("--backup-dir", help="write an online backup of every file to this directory")
+    parser.add_argument("--keep-backups", type=int, default=3)
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="convert a database created without auto_vacuum first, with a full VACUUM")
+    args = parser.parse_args(argv)
+
+    scheduler = MaintenanceScheduler(args.db_path, vacuum_budget=args.vacuum_budget,
+                                     backup_dir=args.backup_dir, keep_backups=args.keep_backups)
+    if args.enable_incremental_vacuum:
+        for path in scheduler.paths:
+            print(f"{path}: {scheduler.enable_incremental_vacuum(path)}")
+    report = scheduler.run_once()
+    for path, file_report in report["files"].items():
+        print(f"{path}: {file_report}")
+    print(f"Reclaimed {report['reclaimed_bytes']} bytes in {report['duration_s']} s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+migrate.py - Converts a database to the current storage layout
+
+DataStore migrates a database created by an older version the first time it
+opens it, see DataStore._migrate; the version is kept in PRAGMA user_version.
+This tool runs the migration ahead of starting the server, review shards
+included, and then vacuums every file so that the space freed by the smaller
+keys and timestamps is given back, reporting the sizes before and after.
+
+Usage (from the repository root):
+    $ python3 -m src.data_management.migrate database_path
+"""
+
+import argparse
+import os
+from src.data_management.data_store import DataStore, SQLiteConnection
+from src.data_management.partitioned_data_store import PartitionedDataStore
+
+
+def _user_version(path: str) -> int:
+    """Returns the stored layout version of a database file, 0 if it does not exist."""
+    if not path.startswith("file:") and not os.path.exists(path):
+        return 0
+    with SQLiteConnection(path) as connection:
+        return connection.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _size(paths: list) -> int:
+    """Returns the total size in bytes of the existing files among paths."""
+    return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+
+def migrate(db_path: str, vacuum: bool = True) -> dict:
+    """
+    Migrates a database, and its review shards if it is partitioned.
+
+    Args:
+        db_path (str): The database name, relative to src/database/.
+        vacuum (bool): Whether to vacuum the files afterwards.
+
+    Returns:
+        dict: The version before and after, and the total size in bytes before and after vacuuming.
+    """
+    main_path = DataStore.resolve(db_path)
+    from_version = _user_version(main_path)
+    data_store = DataStore(db_path)
+    with SQLiteConnection(data_store.db_path) as connection:
+        partitioned = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'partition_map'").fetchone()
+    paths = [data_store.db_path]
+    if partitioned:
+        data_store = PartitionedDataStore(db_path)
+        data_store.close()
+        paths += [shard.db_path for shard in data_store.shards]
+    migrated_size = _size(paths)
+
+    if vacuum:
+        for path in paths:
+            with SQLiteConnection(path) as connection:
+                connection.execute("VACUUM")
+    return {"from_version": from_version, "to_version": _user_version(main_path),
+            "size_before_vacuum": migrated_size, "size_after_vacuum": _size(paths)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert a database to the current storage layout.")
+    parser.add_argument("db_path", help="database name, relative to src/database/")
+    parser.add_argument("--no-vacuum", action="store_true", help="do not vacuum the files afterwards")
+    args = parser.parse_args(argv)
+
+    result = migrate(args.db_path, vacuum=not args.no_vacuum)
+    print(f"Migrated {args.db_path} from version {result['from_version']} to {result['to_version']}, "
+          f"{result['size_before_vacuum']} bytes before vacuuming, {result['size_after_vacuum']} bytes after.")
+
+
+if __name__ == "__main__":
+    main()
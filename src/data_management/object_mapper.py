@@ -1,10 +1,18 @@
+import logging
 from src.data_management.data_store import DataStore
 
+logger = logging.getLogger(__name__)
+
 class ObjectMapper:
     """
     The `ObjectMapper` class is responsible for mapping objects to the database using the `DataStore` class.
     It provides methods to add, remove, and retrieve objects from the database.
     """
+    # Callables notified with (obj_type, obj, db_path) every time an object is added or updated,
+    # used by the web layer to push changes to the pages viewing them.
+    listeners = []
+    # Callables notified with (obj_type, obj, db_path) every time an object is removed.
+    remove_listeners = []
 
     def __init__(self, db_path: str) -> None:
         """
@@ -13,7 +21,8 @@ class ObjectMapper:
         Args:
             db_path: The path to the database file.
         """
-        self.data_store = DataStore(db_path)
+        self.db_path = db_path
+        self.data_store = DataStore.open(db_path)
 
     def _get_obj_type(self, obj) -> str:
         """
@@ -33,9 +42,28 @@ class ObjectMapper:
         
         return type_name
 
+    def _notify(self, listeners: list, obj_type: str, obj):
+        """
+        Calls the listeners of a committed write, logging their errors so the write still succeeds.
+
+        Args:
+            listeners (list): The listeners to call.
+            obj_type (str): The type of the object.
+            obj: The object written.
+        """
+        for listener in listeners:
+            try:
+                listener(obj_type, obj, self.db_path)
+            except Exception:
+                logger.exception("listener %r failed for %s %s", listener, obj_type, obj.id)
+
     def add(self, obj) -> bool:
         """
-        Adds an object to the database.
+        Adds an object to the database, or writes the fields changed since it was loaded or last saved.
+
+        Only the changed fields are updated when the row exists, see
+        Base.dirty_fields and DataStore.save, and nothing is written when no
+        field changed.
 
         Args:
             obj: The object to add.
@@ -44,12 +72,18 @@ class ObjectMapper:
             True if successful, False otherwise.
         """
         obj_type = self._get_obj_type(obj)
-        if obj_type in self.data_store.TABLES.keys():
-            result = self.data_store.save(obj.data, obj_type)
-        else:
+        if obj_type not in self.data_store.TABLES.keys():
             raise ValueError(f"Invalid object type: {obj_type}")
-        
+        dirty_fields = obj.dirty_fields
+        if not dirty_fields:
+            return True
+        # the inserted half of the upsert must satisfy NOT NULL even when the row exists, so deferred fields are loaded
+        data = obj.data
+        result = self.data_store.save(data, obj_type, dirty_fields)
+
         if result:
+            obj.mark_saved(data)
+            self._notify(self.listeners, obj_type, obj)
             return result
         else:
             raise ValueError(f"error adding {obj_type} with id {obj.id}")
@@ -66,30 +100,138 @@ class ObjectMapper:
         obj_type = self._get_obj_type(obj)
         result = self.data_store.delete(obj.id, obj_type)
         if result:
+            self._notify(self.remove_listeners, obj_type, obj)
             return result
         else:
             raise ValueError(f"{obj_type} with id {obj.id} not found")
         
 
-    def get(self, obj_class, id=None):
+    def get(self, obj_class, id=None, only=None, defer=None):
         """
         Retrieves an object from the database.
+
+        Rows are hydrated straight from the row tuples into the model's slots,
+        see Base.row_loader. By default the columns listed in the model's
+        DEFERRED are not loaded; they are loaded on first access instead.
+
         Args:
             obj_class: The class of the object to retrieve.
             id: The ID of the object to retrieve.
+            only: Load only these columns (and the id), all others are deferred.
+            defer: The columns to defer, overriding the model's DEFERRED.
+                Pass an empty tuple to load every column.
 
         Returns:
             The object if found, None otherwise.
         """
         try:
             obj_type = self._get_obj_type(obj_class)
-            data = self.data_store.load(obj_type, id=id)
-            if data is None:
+            columns = self._select_columns(obj_class, obj_type, only, defer)
+            rows = self.data_store.load_rows(obj_type, id=id, columns=columns)
+            if rows is None:
                 raise ValueError(f"{obj_type} with id {id} not found")
-            result = [obj_class(**obj_data) for obj_data in data]
+            result = self._hydrate(obj_class, columns, rows)
             if result and id:
                 return result[0]
             return result
         except Exception as e:
             print(f"Error retrieving {obj_type}: {str(e)}")
             raise e
+
+    def get_range(self, obj_class, column, after=None, before=None, **equals) -> list:
+        """
+        Retrieves the objects whose column lies in a range, e.g. the sessions expiring after now.
+
+        Args:
+            obj_class: The class of the objects to retrieve.
+            column: The column the range applies to.
+            after: Only objects whose column is greater than this.
+            before: Only objects whose column is less than or equal to this.
+            **equals: Columns the objects must also have the given values in.
+
+        Returns:
+            The objects, ordered by the column.
+        """
+        obj_type = self._get_obj_type(obj_class)
+        columns = self._select_columns(obj_class, obj_type)
+        rows = self.data_store.load_range(obj_type, column, after, before, columns, equals)
+        if rows is None:
+            raise ValueError(f"error retrieving {obj_type} by {column}")
+        return self._hydrate(obj_class, columns, rows)
+
+    def _hydrate(self, obj_class, columns: list, rows: list) -> list:
+        """
+        Builds the objects of loaded rows, see Base.row_loader.
+
+        Args:
+            obj_class: The class of the objects.
+            columns: The columns the rows hold, in order.
+            rows: The rows.
+
+        Returns:
+            The objects.
+        """
+        load = obj_class.row_loader(columns)
+        # shared by every loaded object, the fields left out are loaded through it
+        source = (self, tuple(field for field in obj_class.FIELDS if field not in columns))
+        return [load(row, source) for row in rows]
+
+    def _select_columns(self, obj_class, obj_type: str, only=None, defer=None) -> list:
+        """
+        Works out which columns of a table get() selects.
+
+        Args:
+            obj_class: The class of the objects being retrieved.
+            obj_type: The table name.
+            only: The columns to load, besides the id.
+            defer: The columns not to load, the class's DEFERRED when None.
+
+        Returns:
+            The column names, in schema order.
+        """
+        if obj_type not in self.data_store.TABLES:
+            return None
+        columns = self.data_store.columns(obj_type)
+        if only is not None:
+            unknown = set(only) - set(columns)
+            if unknown:
+                raise ValueError(f"{obj_type} has no columns {sorted(unknown)}")
+            keep = set(only) | {"id"}
+            return [column for column in columns if column in keep]
+        skip = set(obj_class.DEFERRED if defer is None else defer) - {"id"}
+        return [column for column in columns if column not in skip]
+
+    def load_deferred(self, objs) -> None:
+        """
+        Loads the deferred columns of several objects in batched queries.
+
+        Accessing a deferred attribute loads the columns of that one object;
+        calling this first avoids one query per object when the attribute is
+        about to be read on a whole list.
+
+        Args:
+            objs: The objects, all of the same class.
+        """
+        pending = {}
+        for obj in objs:
+            fields = obj.unloaded_fields
+            if fields:
+                pending.setdefault((type(obj), fields), []).append(obj)
+
+        for (obj_class, fields), group in pending.items():
+            obj_type = self._get_obj_type(obj_class)
+            by_id = {obj.id: obj for obj in group}
+            rows = self.data_store.load_rows(obj_type, columns=["id", *fields], ids=by_id)
+            if rows is None:
+                raise ValueError(f"error loading deferred columns of {obj_type}")
+            if len(rows) < len(by_id):
+                missing = set(by_id) - {row[0] for row in rows}
+                raise ValueError(f"{obj_type} with id {missing.pop()} not found")
+            for row in rows:
+                obj = by_id[row[0]]
+                for field, value in zip(fields, row[1:]):
+                    setattr(obj, field, value)
+                columns, values = obj._saved or ((), ())
+                obj._saved = (columns + fields, values + tuple(row[1:]))
+                obj._source = None
+                obj.__class__ = obj_class.model
@@ -0,0 +1,430 @@
+"""
+partitioned_data_store.py - Reviews sharded across several SQLite files
+
+A PartitionedDataStore keeps users, topics and sessions in the main database
+file and spreads the review table over N shard files next to it, chosen by a
+hash of the review's topic_id. Every shard has its own database lock, so
+reviews written to different shards no longer wait on each other. Review
+reads fan out to every shard in parallel and merge the results.
+
+The topic_id of a review is its partition key and must not change once the
+review is saved. The shard count is stored in the main database; changing it
+requires moving the reviews with the rebalancing tool, which also moves the
+reviews of a database that was not partitioned before.
+
+Every shard logs the changes of its reviews in its own change_log table,
+ChangeLog reads the logs of the main database and of every shard.
+
+Usage (from the repository root):
+    $ python3 -m src.data_management.partitioned_data_store database_path --shards 8
+"""
+
+import argparse
+import os
+import re
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from src.data_management import db_schema
+from src.data_management.data_store import DataStore, SQLiteConnection
+
+DEFAULT_SHARDS = 4
+PARTITION_TABLE = """
+CREATE TABLE IF NOT EXISTS partition_map (
+    table_name TEXT PRIMARY KEY,
+    shards INTEGER NOT NULL
+);
+"""
+
+
+def _without_foreign_keys(table_schema: str) -> str:
+    """
+    Removes the foreign key constraints from a table schema.
+
+    The referenced tables live in the main database, which SQLite cannot
+    enforce constraints against from another file.
+
+    Args:
+        table_schema (str): The schema of the table.
+
+    Returns:
+        str: The schema without its FOREIGN KEY clauses.
+    """
+    lines = [line for line in table_schema.splitlines() if not line.strip().upper().startswith("FOREIGN")]
+    return re.sub(r",(\s*\);)", r"\1", "\n".join(lines))
+
+
+def shard_name(db_path: str, index: int) -> str:
+    """
+    Returns the database name of a shard, e.g. "feedback.review-0.db" for "feedback.db".
+
+    Args:
+        db_path (str): The name of the main database.
+        index (int): The shard index.
+
+    Returns:
+        str: The name of the shard database.
+    """
+    name = DataStore.resolve(db_path) if db_path == ":memory:" else db_path
+    if name.startswith("file:"):
+        # "file:feedback.review-0?mode=memory" for "file:feedback?mode=memory"
+        location, separator, query = name.partition("?")
+        return f"{location}.{PartitionedDataStore.PARTITIONED_TABLE}-{index}{separator}{query}"
+    stem, extension = os.path.splitext(name)
+    return f"{stem}.{PartitionedDataStore.PARTITIONED_TABLE}-{index}{extension}"
+
+
+class ReviewShard(DataStore):
+    """One shard file of a PartitionedDataStore, holding only reviews and the log of their changes."""
+    TABLES = {"review": _without_foreign_keys(db_schema.REVIEW_TABLE), "change_log": db_schema.CHANGE_LOG_TABLE}
+    TRACKED_TABLES = ("review",)
+
+
+class PartitionedDataStore(DataStore):
+    """
+    DataStore whose review table is sharded by a hash of topic_id.
+
+    The store exposes the same operations as DataStore, so ObjectMapper and
+    everything built on it work unchanged once a database is registered
+    with enable.
+    """
+    PARTITIONED_TABLE = "review"
+    PARTITION_KEY = "topic_id"
+
+    def __init__(self, db_path: str, shards: int = None):
+        """
+        Opens a partitioned database, partitioning it on first use.
+
+        Args:
+            db_path (str): The path to the main SQLite database file.
+            shards (int, optional): The expected number of shards. Defaults to
+                the stored shard count, or DEFAULT_SHARDS for a new database.
+
+        Raises:
+            ValueError: If the database is partitioned into a different number of shards.
+        """
+        super().__init__(db_path)
+        self.name = db_path
+        stored = self._stored_shard_count()
+        if stored is None:
+            stored = shards or DEFAULT_SHARDS
+            self._store_shard_count(stored)
+        elif shards and shards != stored:
+            raise ValueError(f"{db_path} is partitioned into {stored} shards, "
+                             f"rebalance it to change the shard count to {shards}")
+        self.shards = [ReviewShard(self._shard_name(index)) for index in range(stored)]
+        self.executor = ThreadPoolExecutor(max_workers=stored, thread_name_prefix="review-shard")
+
+    @classmethod
+    def enable(cls, db_path: str, shards: int = None):
+        """
+        Makes every DataStore.open of a database return a PartitionedDataStore.
+
+        The store is shared by all callers, so that its shard threads are
+        started once rather than for every ObjectMapper.
+
+        Args:
+            db_path (str): The path to the main SQLite database file.
+            shards (int, optional): The expected number of shards.
+
+        Returns:
+            PartitionedDataStore: The shared store.
+        """
+        store = cls(db_path, shards)
+        DataStore.factories[db_path] = lambda path: store
+        return store
+
+    @staticmethod
+    def disable(db_path: str):
+        """
+        Makes DataStore.open return plain DataStores for a database again.
+
+        Args:
+            db_path (str): The path to the main SQLite database file.
+        """
+        factory = DataStore.factories.pop(db_path, None)
+        if factory:
+            factory(db_path).close()
+
+    @classmethod
+    def stored_shards(cls, db_path: str) -> list:
+        """
+        Opens the shards of a database without starting the threads of a PartitionedDataStore.
+
+        Args:
+            db_path (str): The path to the main SQLite database file.
+
+        Returns:
+            list: The ReviewShard of every shard, empty if the database is not partitioned.
+        """
+        with SQLiteConnection(DataStore.resolve(db_path)) as connection:
+            partitioned = connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'partition_map'").fetchone()
+            row = partitioned and connection.execute("SELECT shards FROM partition_map WHERE table_name = ?",
+                                                     (cls.PARTITIONED_TABLE,)).fetchone()
+        return [ReviewShard(shard_name(db_path, index)) for index in range(row[0])] if row else []
+
+    def _create_tables(self):
+        """Creates the tables of the main database, and the table holding the shard count."""
+        super()._create_tables()
+        with SQLiteConnection(self.db_path) as connection:
+            connection.execute(PARTITION_TABLE)
+
+    def _stored_shard_count(self):
+        """Returns the shard count stored in the main database, None if it is not partitioned yet."""
+        with SQLiteConnection(self.db_path) as connection:
+            row = connection.execute("SELECT shards FROM partition_map WHERE table_name = ?",
+                                     (self.PARTITIONED_TABLE,)).fetchone()
+        return row[0] if row else None
+
+    def _store_shard_count(self, shards: int):
+        """Stores the shard count in the main database."""
+        with SQLiteConnection(self.db_path) as connection:
+            connection.execute("REPLACE INTO partition_map (table_name, shards) VALUES (?, ?)",
+                               (self.PARTITIONED_TABLE, shards))
+
+    def _shard_name(self, index: int) -> str:
+        """Returns the database name of a shard, see shard_name."""
+        return shard_name(self.name, index)
+
+    @staticmethod
+    def shard_index(topic_id, shards: int) -> int:
+        """
+        Returns the shard a topic's reviews are stored in.
+
+        The hash is stable across processes, unlike the built-in hash of a string.
+
+        Args:
+            topic_id: The partition key.
+            shards (int): The number of shards.
+
+        Returns:
+            int: The shard index.
+        """
+        return zlib.crc32(str(topic_id).encode()) % shards
+
+    def shard_for(self, topic_id) -> ReviewShard:
+        """
+        Returns the shard holding the reviews of a topic.
+
+        Args:
+            topic_id: The ID of the topic.
+
+        Returns:
+            ReviewShard: The shard.
+        """
+        return self.shards[self.shard_index(topic_id, len(self.shards))]
+
+    def _fan_out(self, operation) -> list:
+        """
+        Runs an operation on every shard in parallel.
+
+        SQLite releases the GIL while it executes a statement, so the shards
+        are queried concurrently.
+
+        Args:
+            operation: Called with each shard.
+
+        Returns:
+            list: The results, in shard order.
+        """
+        if len(self.shards) == 1:
+            return [operation(self.shards[0])]
+        return list(self.executor.map(operation, self.shards))
+
+    @staticmethod
+    def _merge(results: list):
+        """Concatenates the rows returned by the shards, None if any shard failed."""
+        if any(result is None for result in results):
+            return None
+        return [row for result in results for row in result]
+
+    def save(self, data, table_name, columns=None):
+        """
+        Saves the provided data, reviews going to the shard of their topic.
+
+        Args:
+            data (dict): The data to be saved.
+            table_name (str): The name of the table to save the data to.
+            columns (tuple, optional): The columns to update if the row exists, see DataStore.save.
+
+        Returns:
+            bool: True if successful, False if an integrity error occurs.
+        """
+        if table_name != self.PARTITIONED_TABLE:
+            return super().save(data, table_name, columns)
+        return self.shard_for(data[self.PARTITION_KEY]).save(data, table_name, columns)
+
+    def load(self, table_name, id=None):
+        """
+        Loads data from the specified table, optionally filtering by ID.
+
+        Args:
+            table_name (str): The name of the table.
+            id (int, optional): The ID to filter by. Defaults to None.
+
+        Returns:
+            list or None: The loaded data as a list of dictionaries, or None if no data is found.
+        """
+        if table_name != self.PARTITIONED_TABLE:
+            return super().load(table_name, id)
+        return self._merge(self._fan_out(lambda shard: shard.load(table_name, id)))
+
+    def load_rows(self, table_name, id=None, columns=None, ids=None):
+        """
+        Loads rows from the specified table as plain tuples, see DataStore.load_rows.
+
+        Args:
+            table_name (str): The name of the table.
+            id (int, optional): The ID to filter by. Defaults to None.
+            columns (list, optional): The columns to select.
+            ids (list, optional): Several IDs to filter by.
+
+        Returns:
+            list or None: The rows as tuples, or None if the table or a column does not exist.
+        """
+        if table_name != self.PARTITIONED_TABLE:
+            return super().load_rows(table_name, id, columns, ids)
+        if ids is not None:
+            ids = list(ids)
+        return self._merge(self._fan_out(lambda shard: shard.load_rows(table_name, id, columns, ids)))
+
+    def load_range(self, table_name, column, after=None, before=None, columns=None, equals=None):
+        """
+        Loads the rows whose column lies in a range, see DataStore.load_range.
+
+        Returns:
+            list or None: The rows as tuples, ordered by the column within each shard.
+        """
+        if table_name != self.PARTITIONED_TABLE:
+            return super().load_range(table_name, column, after, before, columns, equals)
+        return self._merge(self._fan_out(
+            lambda shard: shard.load_range(table_name, column, after, before, columns, equals)))
+
+    def delete_range(self, table_name, column, before, equals=None) -> int:
+        """
+        Deletes the rows whose column is less than or equal to a value, see DataStore.delete_range.
+
+        Returns:
+            int: The number of deleted rows.
+        """
+        if table_name != self.PARTITIONED_TABLE:
+            return super().delete_range(table_name, column, before, equals)
+        return sum(self._fan_out(lambda shard: shard.delete_range(table_name, column, before, equals)))
+
+    def delete(self, id, table_name):
+        """
+        Deletes data from the specified table based on the ID.
+
+        The reviews of a deleted user or topic are deleted from the shards, as
+        the foreign keys would do in a single database.
+
+        Args:
+            id (int): The ID of the data to delete.
+            table_name (str): The name of the table.
+
+        Returns:
+            bool: True if the deletion is successful, False otherwise.
+        """
+        if table_name == self.PARTITIONED_TABLE:
+            return any(self._fan_out(lambda shard: shard.delete(id, table_name)))
+        deleted = super().delete(id, table_name)
+        if deleted and table_name == "topic":
+            self._delete_reviews([self.shard_for(id)], self.PARTITION_KEY, id)
+        elif deleted and table_name == "user":
+            self._delete_reviews(self.shards, "user_id", id)
+        return deleted
+
+    def _delete_reviews(self, shards: list, column: str, value):
+        """Deletes the reviews whose column has the given value from the given shards."""
+        for shard in shards:
+            with SQLiteConnection(shard.db_path) as connection:
+                self._execute(connection, f"DELETE FROM {self.PARTITIONED_TABLE} WHERE {column} = ?",
+                              self._adapt(self.PARTITIONED_TABLE, [column], [value]))
+
+    def clear_tables(self):
+        """
+        Clears all tables in the main database and in every shard.
+        """
+        super().clear_tables()
+        self._fan_out(lambda shard: shard.clear_tables())
+
+    def rebalance(self, shards: int = None) -> dict:
+        """
+        Moves every review to the shard it belongs to under a new shard count.
+
+        Reviews left in the main database, e.g. by a database that was not
+        partitioned before, are moved into the shards as well. Each review is
+        written to its new shard before it is deleted from the old one, so an
+        interrupted rebalance loses nothing and can simply be run again. The
+        application should not be writing reviews while it runs.
+
+        A moved review is logged as inserted in the change log of its new
+        shard, the deletion from its old one is not logged, as the review still
+        exists. The logs of the shards removed when the count shrinks are
+        removed with them, so change log consumers should be caught up first.
+
+        Args:
+            shards (int, optional): The new number of shards, the current one by default.
+
+        Returns:
+            dict: The new shard count and the number of reviews moved.
+        """
+        shards = shards or len(self.shards)
+        targets = [ReviewShard(self._shard_name(index)) for index in range(shards)]
+        sources = [self] + [shard for shard in self.shards if shard.db_path not in
+                            {target.db_path for target in targets}] + targets
+        columns = self.columns(self.PARTITIONED_TABLE)
+        key = columns.index(self.PARTITION_KEY)
+        insert_query, _ = targets[0]._construct_insert_query(self.PARTITIONED_TABLE)
+        moved = 0
+
+        for source in sources:
+            rows = DataStore.load_rows(source, self.PARTITIONED_TABLE, columns=columns) or []
+            by_target = {}
+            for row in rows:
+                target = targets[self.shard_index(row[key], shards)]
+                if target.db_path != source.db_path:
+                    by_target.setdefault(target.db_path, []).append(row)
+
+            for target_path, target_rows in by_target.items():
+                # the rows were loaded as Python values, write them back in their stored form
+                stored_rows = [self._adapt(self.PARTITIONED_TABLE, columns, row) for row in target_rows]
+                with SQLiteConnection(target_path) as connection:
+                    connection.executemany(insert_query, stored_rows)
+                with SQLiteConnection(source.db_path) as connection:
+                    connection.executemany(f"DELETE FROM {self.PARTITIONED_TABLE} WHERE id = ?",
+                                           [(row[0],) for row in stored_rows])
+                    connection.executemany("DELETE FROM change_log WHERE table_name = ? AND row_id = ? "
+                                           "AND operation = 'delete'",
+                                           [(self.PARTITIONED_TABLE, row[0]) for row in stored_rows])
+                moved += len(target_rows)
+
+        self._store_shard_count(shards)
+        for shard in self.shards[shards:]:
+            if SQLiteConnection.is_memory(shard.db_path):
+                SQLiteConnection.release(shard.db_path)
+            else:
+                os.remove(shard.db_path)
+        self.executor.shutdown()
+        self.shards = targets
+        self.executor = ThreadPoolExecutor(max_workers=shards, thread_name_prefix="review-shard")
+        return {"shards": shards, "moved": moved}
+
+    def close(self):
+        """Stops the threads used to query the shards."""
+        self.executor.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Partition the reviews of a database, or change its shard count.")
+    parser.add_argument("db_path", help="database name, relative to src/database/")
+    parser.add_argument("--shards", type=int, help="the new number of shards (default: unchanged)")
+    args = parser.parse_args(argv)
+
+    data_store = PartitionedDataStore(args.db_path)
+    result = data_store.rebalance(args.shards)
+    data_store.close()
+    print(f"Moved {result['moved']} reviews, src/database/{args.db_path} now has {result['shards']} review shards")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import logging
+import re
+import threading
+from src.data_management.data_store import SQLiteConnection
+
+logger = logging.getLogger(__name__)
+
+# String and numeric literals, replaced by "?" so that statements only differing
+# in their values are aggregated together.
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+_EXPLAINABLE = ("SELECT", "INSERT", "REPLACE", "UPDATE", "DELETE", "WITH")
+
+
+class StatementStats:
+    """Aggregate statistics of one normalized SQL statement."""
+
+    def __init__(self, sql: str):
+        """
+        Initializes empty statistics.
+
+        Args:
+            sql (str): The normalized statement.
+        """
+        self.sql = sql
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.slow_count = 0
+        self.plan = None
+        self.full_scan = False
+
+    @property
+    def data(self):
+        """
+        Allows you to access the statistics as a dictionary
+
+        Returns:
+            the statistics as a dictionary, times in milliseconds
+        """
+        return {
+            "sql": self.sql,
+            "count": self.count,
+            "total_ms": round(self.total_time * 1000, 3),
+            "mean_ms": round(self.total_time * 1000 / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_time * 1000, 3),
+            "slow_count": self.slow_count,
+            "full_scan": self.full_scan,
+            "plan": self.plan,
+        }
+
+
+class QueryTracer:
+    """
+    Traces the SQL statements DataStore runs.
+
+    Once installed, the tracer records every statement SQLiteConnection runs.
+    It keeps per-statement aggregate statistics (count, total, mean and max
+    time), captures the EXPLAIN QUERY PLAN of every distinct statement the
+    first time it runs so that full table scans are flagged right away, and
+    logs statements slower than the threshold together with their query plan.
+    Statements are kept and logged with their placeholders only, never with
+    their bound values, which include password hashes, emails and session ids.
+    """
+
+    def __init__(self, slow_threshold_ms: float = 100.0, capture_plans: bool = True):
+        """
+        Initializes the tracer.
+
+        Args:
+            slow_threshold_ms (float): Statements taking at least this long are logged.
+            capture_plans (bool): Whether to run EXPLAIN QUERY PLAN on new statements.
+        """
+        self.slow_threshold = slow_threshold_ms / 1000
+        self.capture_plans = capture_plans
+        self.statements = {}
+        self.lock = threading.Lock()
+
+    def install(self):
+        """Starts recording the statements SQLiteConnection runs."""
+        SQLiteConnection.tracer = self
+        return self
+
+    def uninstall(self):
+        """Stops recording statements."""
+        if SQLiteConnection.tracer is self:
+            SQLiteConnection.tracer = None
+
+    @staticmethod
+    def normalize(sql: str) -> str:
+        """
+        Normalizes a statement so executions with different values share statistics.
+
+        Args:
+            sql (str): The statement.
+
+        Returns:
+            str: The statement with literals replaced by "?" and whitespace collapsed.
+        """
+        return _WHITESPACE.sub(" ", _LITERALS.sub("?", sql)).strip()
+
+    def explain(self, connection, sql: str, params: tuple = ()) -> list:
+        """
+        Returns the query plan of a statement.
+
+        Args:
+            connection (sqlite3.Connection): The connection to explain on.
+            sql (str): The statement.
+            params (tuple): The statement parameters.
+
+        Returns:
+            list: The plan steps, e.g. "SCAN review" or "SEARCH user USING INDEX ...",
+            empty for statements that cannot be explained.
+        """
+        if not sql.lstrip().upper().startswith(_EXPLAINABLE):
+            return []
+        try:
+            return [row[3] for row in connection.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        except Exception:
+            return []
+
+    def record(self, connection, sql: str, params: tuple, elapsed: float):
+        """
+        Records one execution of a statement.
+
+        Args:
+            connection (sqlite3.Connection): The connection the statement ran on.
+            sql (str): The statement as passed to execute.
+            params (tuple): The statement parameters.
+            elapsed (float): The execution time, in seconds.
+        """
+        key = self.normalize(sql)
+        with self.lock:
+            stats = self.statements.get(key)
+            new = stats is None
+            if new:
+                stats = self.statements[key] = StatementStats(key)
+            stats.count += 1
+            stats.total_time += elapsed
+            stats.max_time = max(stats.max_time, elapsed)
+
+        slow = elapsed >= self.slow_threshold
+        if (new and self.capture_plans) or slow:
+            plan = self.explain(connection, sql, params)
+            with self.lock:
+                stats.plan = plan
+                stats.full_scan = any(_is_full_scan(step) for step in plan)
+                stats.slow_count += slow
+            if slow:
+                logger.warning("Slow query (%.1f ms): %s\n  plan: %s",
+                               elapsed * 1000, key, "; ".join(plan) or "n/a")
+
+    def stats(self) -> list:
+        """
+        Returns the statistics of every statement, most expensive first.
+
+        Returns:
+            list: One dictionary per normalized statement.
+        """
+        with self.lock:
+            return sorted((stats.data for stats in self.statements.values()),
+                          key=lambda data: data["total_ms"], reverse=True)
+
+    def full_scans(self) -> list:
+        """
+        Returns the statistics of the statements whose plan scans a whole table.
+
+        Returns:
+            list: One dictionary per normalized statement.
+        """
+        return [data for data in self.stats() if data["full_scan"]]
+
+    def reset(self):
+        """Forgets all statistics collected so far."""
+        with self.lock:
+            self.statements = {}
+
+
+def _is_full_scan(step: str) -> bool:
+    """Whether a query plan step reads a whole table rather than searching an index."""
+    return step.startswith("SCAN ") and " USING " not in step
@@ -0,0 +1,190 @@
+"""
+admission.py - Admission control for CPU-heavy routes
+
+Logging in and registering each hash a password with 100,000 PBKDF2
+iterations, so a burst of them can take every CPU the server has. This file
+contains a Bottle plugin that admits requests to the routes marked with
+admission=True only while:
+- the client's token bucket has a token left, limiting each client's rate,
+- the global token bucket has a token left, limiting the overall rate,
+- fewer than max_concurrent of them run, or a place is free in the bounded
+  queue waiting for one to finish.
+
+Other requests are answered right away with 429 Too Many Requests and a
+Retry-After header, so the rest of the site stays responsive during a login
+storm.
+"""
+
+import collections
+import math
+import os
+import threading
+import time
+from bottle import HTTPResponse, request
+
+
+class TokenBucket:
+    """A token bucket, not thread-safe on its own."""
+
+    def __init__(self, rate: float, burst: float, now: float):
+        """
+        Initializes a full bucket.
+
+        Args:
+            rate (float): Tokens added per second.
+            burst (float): The largest number of tokens the bucket holds.
+            now (float): The current time, in seconds.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """
+        Takes a token if there is one.
+
+        Args:
+            now (float): The current time, in seconds.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the seconds until one is available.
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionControlPlugin:
+    """
+    Bottle plugin limiting the rate and concurrency of the routes marked with admission=True.
+    """
+    name = "admission"
+    api = 2
+
+    def __init__(self, client_rate: float = 1.0, client_burst: float = 5,
+                 global_rate: float = 20.0, global_burst: float = 40,
+                 max_concurrent: int = None, max_queue: int = 16, queue_timeout: float = 2.0,
+                 max_clients: int = 10000, trusted_proxies=(), clock=time.monotonic):
+        """
+        Initializes the plugin.
+
+        Args:
+            client_rate (float): Requests per second admitted per client address.
+            client_burst (float): Requests a client may make at once after being idle.
+            global_rate (float): Requests per second admitted in total.
+            global_burst (float): Requests admitted at once in total.
+            max_concurrent (int, optional): Requests running at once, the number of CPUs by default.
+            max_queue (int): Requests waiting for a running one to finish, beyond that they are rejected.
+            queue_timeout (float): Seconds a request waits in the queue before it is rejected.
+            max_clients (int): Client buckets kept, the least recently used ones are dropped.
+            trusted_proxies: Addresses of the reverse proxies in front of the server. Only
+                requests from them are counted against the address they forwarded, the
+                X-Forwarded-For header of any other request is ignored.
+            clock: Returns the current time in seconds.
+        """
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_clients = max_clients
+        self.trusted_proxies = frozenset(trusted_proxies)
+        self.clock = clock
+        self.global_bucket = TokenBucket(global_rate, global_burst, clock())
+        self.client_buckets = collections.OrderedDict()
+        self.running = threading.BoundedSemaphore(max_concurrent or os.cpu_count() or 1)
+        self.waiting = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def _client(self) -> str:
+        """
+        Returns the address the request is counted against.
+
+        bottle's request.remote_addr is the first X-Forwarded-For address, which
+        any client can set, so the socket address is used unless it is a trusted
+        proxy. Then the nearest forwarded address that is not a proxy is used.
+        """
+        client = request.environ.get("REMOTE_ADDR") or "unknown"
+        if client in self.trusted_proxies:
+            forwarded = [address.strip() for address in request.environ.get("HTTP_X_FORWARDED_FOR", "").split(",")]
+            for address in reversed(forwarded):
+                if address and address not in self.trusted_proxies:
+                    return address
+        return client
+
+    def _take_tokens(self, client: str) -> float:
+        """
+        Takes a token from the client's bucket and from the global bucket.
+
+        Args:
+            client (str): The client address.
+
+        Returns:
+            float: 0 if the request is admitted, otherwise the seconds until it would be.
+        """
+        now = self.clock()
+        with self.lock:
+            bucket = self.client_buckets.pop(client, None)
+            if bucket is None:
+                bucket = TokenBucket(self.client_rate, self.client_burst, now)
+                if len(self.client_buckets) >= self.max_clients:
+                    self.client_buckets.popitem(last=False)
+            self.client_buckets[client] = bucket
+            return bucket.take(now) or self.global_bucket.take(now)
+
+    def _enter(self) -> bool:
+        """
+        Waits for a free slot to run in, if there is a place in the queue.
+
+        Returns:
+            bool: True once the request may run, False if it is rejected.
+        """
+        if self.running.acquire(blocking=False):
+            return True
+        with self.lock:
+            if self.waiting >= self.max_queue:
+                return False
+            self.waiting += 1
+        try:
+            return self.running.acquire(timeout=self.queue_timeout)
+        finally:
+            with self.lock:
+                self.waiting -= 1
+
+    def _reject(self, retry_after: float):
+        """Returns the 429 response of a rejected request, raised so the metrics count it."""
+        with self.lock:
+            self.rejected += 1
+        return HTTPResponse("Too many requests, please try again shortly.", status=429,
+                            headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+    def apply(self, callback, route):
+        """
+        Wraps the callback of a route marked with admission=True.
+
+        Args:
+            callback: The route callback.
+            route: The bottle Route the callback belongs to.
+
+        Returns:
+            The wrapped callback, or the callback itself for other routes.
+        """
+        if not route.config.get("admission"):
+            return callback
+
+        def wrapper(*args, **kwargs):
+            wait = self._take_tokens(self._client())
+            if wait:
+                raise self._reject(wait)
+            if not self._enter():
+                raise self._reject(self.queue_timeout)
+            try:
+                return callback(*args, **kwargs)
+            finally:
+                self.running.release()
+
+        return wrapper
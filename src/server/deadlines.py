@@ -0,0 +1,55 @@
+"""
+deadlines.py - Request deadlines and graceful lock contention
+
+During a write burst a request can wait on the database write lock for the
+whole busy timeout, and then some more while ContentionPolicy retries. This
+file contains a Bottle plugin giving every request a deadline, which bounds
+those waits for the database calls it makes, and answering requests that
+still find the database locked with 503 Service Unavailable and a
+Retry-After header instead of an error page.
+"""
+
+from bottle import HTTPResponse
+from src.data_management.data_store import ContentionPolicy, DatabaseLocked
+
+
+class DeadlinePlugin:
+    """
+    Bottle plugin bounding the database lock waits of each request.
+    """
+    name = "deadline"
+    api = 2
+
+    def __init__(self, timeout: float = 5.0, retry_after: int = 1):
+        """
+        Initializes the plugin.
+
+        Args:
+            timeout (float): Seconds a request may spend waiting for database locks in total.
+            retry_after (int): Seconds the client is told to wait before retrying when the database stayed locked.
+        """
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.rejected = 0
+
+    def apply(self, callback, route):
+        """
+        Wraps a route callback.
+
+        Args:
+            callback: The route callback.
+            route: The bottle Route the callback belongs to.
+
+        Returns:
+            The wrapped callback.
+        """
+        def wrapper(*args, **kwargs):
+            try:
+                with ContentionPolicy.deadline(self.timeout):
+                    return callback(*args, **kwargs)
+            except DatabaseLocked:
+                self.rejected += 1
+                raise HTTPResponse("The site is busy, please try again shortly.", status=503,
+                                   headers={"Retry-After": str(self.retry_after)})
+
+        return wrapper
@@ -0,0 +1,245 @@
+"""
+metrics.py - Per-route request metrics for the web application
+
+This file contains a Bottle plugin that records, for every route, the number
+of requests by status code, a latency histogram, a response size histogram,
+the number of requests currently in flight and the number of database calls
+and database time spent serving them, and the database lock waits of the
+whole process. The collected metrics are rendered in the Prometheus text
+exposition format.
+"""
+
+import bisect
+import threading
+import time
+from bottle import HTTPResponse, response
+from src.data_management.data_store import SQLiteConnection
+
+# Upper bounds of the histogram buckets, +Inf is implied
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+class Histogram:
+    """A fixed-bucket histogram, not thread-safe on its own."""
+
+    def __init__(self, buckets: tuple):
+        """
+        Initializes an empty histogram.
+
+        Args:
+            buckets (tuple): The ascending upper bounds of the buckets.
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        """
+        Records a single observation.
+
+        Args:
+            value (float): The observed value.
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """
+        Returns the cumulative bucket counts, as Prometheus expects them.
+
+        Returns:
+            list: (upper bound label, cumulative count) pairs, ending with "+Inf".
+        """
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class RouteStats:
+    """The metrics collected for a single route and method."""
+
+    def __init__(self):
+        self.statuses = {}
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.size = Histogram(SIZE_BUCKETS)
+        self.in_flight = 0
+        self.db_calls = 0
+        self.db_time = 0.0
+
+
+class MetricsPlugin:
+    """
+    Bottle plugin recording per-route request metrics.
+
+    Database calls are attributed to the request being served on the current
+    thread through SQLiteConnection.listeners, so every DataStore operation a
+    handler triggers is counted without the handlers knowing about it.
+    """
+    name = "metrics"
+    api = 2
+
+    def __init__(self, prefix: str = "feedback_flow"):
+        """
+        Initializes the plugin.
+
+        Args:
+            prefix (str): Prefix of every exported metric name.
+        """
+        self.prefix = prefix
+        self.routes = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def setup(self, app):
+        """Starts attributing database calls to requests when the plugin is installed."""
+        if self.record_db_call not in SQLiteConnection.listeners:
+            SQLiteConnection.listeners.append(self.record_db_call)
+
+    def close(self):
+        """Stops listening to database calls when the plugin is uninstalled."""
+        if self.record_db_call in SQLiteConnection.listeners:
+            SQLiteConnection.listeners.remove(self.record_db_call)
+
+    def record_db_call(self, db_path: str, elapsed: float):
+        """
+        Attributes a database call to the request running on this thread, if any.
+
+        Args:
+            db_path (str): The database the call went to.
+            elapsed (float): The time the connection was open, in seconds.
+        """
+        counters = getattr(self.local, "db", None)
+        if counters is not None:
+            counters[0] += 1
+            counters[1] += elapsed
+
+    def _stats(self, key) -> RouteStats:
+        """Returns the stats of a route, creating them on first use. Must hold self.lock."""
+        stats = self.routes.get(key)
+        if stats is None:
+            stats = self.routes[key] = RouteStats()
+        return stats
+
+    def apply(self, callback, route):
+        """
+        Wraps a route callback so every call is measured.
+
+        Args:
+            callback: The route callback.
+            route: The bottle Route the callback belongs to.
+
+        Returns:
+            The wrapped callback.
+        """
+        key = (route.rule, route.method)
+
+        def wrapper(*args, **kwargs):
+            with self.lock:
+                self._stats(key).in_flight += 1
+            self.local.db = db = [0, 0.0]
+            status = 500
+            size = 0
+            start = time.perf_counter()
+            try:
+                result = callback(*args, **kwargs)
+                status = response.status_code
+                size = _body_size(result)
+                return result
+            except HTTPResponse as http_response:
+                # redirects and aborts are raised as responses
+                status = http_response.status_code
+                size = _body_size(http_response.body)
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                self.local.db = None
+                with self.lock:
+                    stats = self._stats(key)
+                    stats.in_flight -= 1
+                    stats.statuses[status] = stats.statuses.get(status, 0) + 1
+                    stats.latency.observe(elapsed)
+                    stats.size.observe(size)
+                    stats.db_calls += db[0]
+                    stats.db_time += db[1]
+
+        return wrapper
+
+    def render(self) -> str:
+        """
+        Renders every collected metric in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics page.
+        """
+        with self.lock:
+            routes = sorted(self.routes.items())
+            lines = []
+            metric = f"{self.prefix}_http_requests_total"
+            lines += [f"# HELP {metric} Requests handled, by route, method and status.",
+                      f"# TYPE {metric} counter"]
+            for (rule, method), stats in routes:
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append(f'{metric}{{{_labels(rule, method)},status="{status}"}} {count}')
+
+            metric = f"{self.prefix}_http_requests_in_flight"
+            lines += [f"# HELP {metric} Requests currently being handled.",
+                      f"# TYPE {metric} gauge"]
+            for (rule, method), stats in routes:
+                lines.append(f"{metric}{{{_labels(rule, method)}}} {stats.in_flight}")
+
+            for name, description, attribute in (
+                    ("http_request_duration_seconds", "Time spent handling requests.", "latency"),
+                    ("http_response_size_bytes", "Size of response bodies.", "size")):
+                metric = f"{self.prefix}_{name}"
+                lines += [f"# HELP {metric} {description}", f"# TYPE {metric} histogram"]
+                for (rule, method), stats in routes:
+                    histogram = getattr(stats, attribute)
+                    labels = _labels(rule, method)
+                    for bound, count in histogram.cumulative():
+                        lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {count}')
+                    lines.append(f"{metric}_sum{{{labels}}} {histogram.sum}")
+                    lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+
+            for name, description, attribute in (
+                    ("db_calls_total", "Database calls made while handling requests.", "db_calls"),
+                    ("db_time_seconds_total", "Time spent in the database while handling requests.", "db_time")):
+                metric = f"{self.prefix}_{name}"
+                lines += [f"# HELP {metric} {description}", f"# TYPE {metric} counter"]
+                for (rule, method), stats in routes:
+                    lines.append(f"{metric}{{{_labels(rule, method)}}} {getattr(stats, attribute)}")
+
+        contention = SQLiteConnection.contention
+        for name, description, value in (
+                ("db_lock_waits_total", "Database statements retried because another connection held a lock.",
+                 contention.lock_waits),
+                ("db_lock_wait_seconds_total", "Time spent failing on and backing off from database locks.",
+                 contention.lock_wait_seconds),
+                ("db_lock_timeouts_total", "Database statements given up on because the database stayed locked.",
+                 contention.lock_timeouts)):
+            metric = f"{self.prefix}_{name}"
+            lines += [f"# HELP {metric} {description}", f"# TYPE {metric} counter", f"{metric} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+def _labels(rule: str, method: str) -> str:
+    """Formats the route labels of a sample, escaping them as the exposition format requires."""
+    rule = rule.replace("\\", "\\\\").replace('"', '\\"')
+    return f'route="{rule}",method="{method}"'
+
+
+def _body_size(body) -> int:
+    """
+    Returns the size of a response body without copying it.
+
+    Text bodies are measured in characters, which equals their size in bytes
+    for the ASCII pages the templates render. Streamed bodies count as 0.
+    """
+    if isinstance(body, (str, bytes)):
+        return len(body)
+    return 0
@@ -0,0 +1,206 @@
+"""
+notifications.py - Live review updates for the topics page
+
+The NotificationBus listens to ObjectMapper.add and pushes every published
+or edited review to the browsers viewing its topic as Server-Sent Events, so
+the topics page updates itself instead of being reloaded. Each connection
+has a bounded queue: a client that cannot keep up is sent a "reset" event,
+telling it to reload the page once, and disconnected, rather than letting
+its backlog grow. The number of open streams is capped.
+"""
+
+import json
+import queue
+import threading
+import time
+from src.data_management.object_mapper import ObjectMapper
+
+
+class TooManySubscribers(Exception):
+    """Raised when the bus already serves as many streams as it allows."""
+
+
+class Subscription:
+    """The bounded queue of events of one stream."""
+
+    def __init__(self, topics, maxsize: int):
+        """
+        Initializes an empty subscription.
+
+        Args:
+            topics: The IDs of the topics to receive events for, all topics if empty.
+            maxsize (int): The largest number of events waiting to be sent.
+        """
+        self.topics = frozenset(topics)
+        self.queue = queue.Queue(maxsize)
+        self.overflowed = False
+
+    def wants(self, topic_id) -> bool:
+        """Whether the subscription receives the events of a topic."""
+        return not self.topics or topic_id in self.topics
+
+    def offer(self, event) -> bool:
+        """
+        Queues an event without waiting.
+
+        Args:
+            event: The (event name, data) pair.
+
+        Returns:
+            bool: False if the queue is full, the subscription is then marked overflowed.
+        """
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except queue.Full:
+            self.overflowed = True
+            return False
+
+
+class NotificationBus:
+    """In-process publish/subscribe of review updates, by topic."""
+
+    def __init__(self, max_subscribers: int = 100, queue_size: int = 100,
+                 heartbeat: float = 15.0, max_duration: float = 300.0, db_path: str = None):
+        """
+        Initializes the bus.
+
+        Args:
+            max_subscribers (int): The largest number of open streams.
+            queue_size (int): The largest number of events waiting to be sent to one stream.
+            heartbeat (float): Seconds without events after which a comment keeps the connection alive.
+            max_duration (float): Seconds after which a stream ends and the browser reconnects,
+                so a server thread is never held forever.
+            db_path (str, optional): Only publish the reviews of this database, those of every database when None.
+        """
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.max_duration = max_duration
+        self.db_path = db_path
+        self.subscriptions = set()
+        self.lock = threading.Lock()
+
+    def install(self):
+        """Starts publishing the reviews ObjectMapper adds."""
+        if self.on_add not in ObjectMapper.listeners:
+            ObjectMapper.listeners.append(self.on_add)
+        return self
+
+    def uninstall(self):
+        """Stops publishing the reviews ObjectMapper adds."""
+        if self.on_add in ObjectMapper.listeners:
+            ObjectMapper.listeners.remove(self.on_add)
+
+    def subscribe(self, topics=()) -> Subscription:
+        """
+        Opens a subscription.
+
+        Args:
+            topics: The IDs of the topics to receive events for, all topics if empty.
+
+        Returns:
+            Subscription: The new subscription.
+
+        Raises:
+            TooManySubscribers: If max_subscribers subscriptions are open already.
+        """
+        with self.lock:
+            if len(self.subscriptions) >= self.max_subscribers:
+                raise TooManySubscribers(f"{self.max_subscribers} streams are open already")
+            subscription = Subscription(topics, self.queue_size)
+            self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """
+        Closes a subscription.
+
+        Args:
+            subscription (Subscription): The subscription to close.
+        """
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+    def publish(self, topic_id, event: str, data: dict):
+        """
+        Sends an event to every subscription of a topic.
+
+        Subscriptions whose queue is full are dropped from the bus, their
+        stream ends with a reset event.
+
+        Args:
+            topic_id: The topic the event belongs to.
+            event (str): The event name.
+            data (dict): The JSON-serializable event data.
+        """
+        with self.lock:
+            subscriptions = [subscription for subscription in self.subscriptions if subscription.wants(topic_id)]
+        for subscription in subscriptions:
+            if not subscription.offer((event, data)):
+                self.unsubscribe(subscription)
+
+    def on_add(self, obj_type: str, obj, db_path: str = None):
+        """
+        Publishes a review that was added or updated.
+
+        Published reviews are sent to be shown or updated; other reviews are
+        sent as removed, as an edit may have turned a published review back
+        into a draft.
+
+        Args:
+            obj_type (str): The type of the object.
+            obj: The object.
+            db_path (str, optional): The database the object was saved to.
+        """
+        if obj_type != "review" or (self.db_path and db_path != self.db_path):
+            return
+        if obj.status == "published":
+            self.publish(obj.topic_id, "review", {"id": obj.id, "topic_id": obj.topic_id,
+                                                  "review_text": obj.review_text, "ratings": obj.ratings})
+        else:
+            self.publish(obj.topic_id, "review-removed", {"id": obj.id, "topic_id": obj.topic_id})
+
+    def stream(self, subscription: Subscription):
+        """
+        Yields the events of a subscription in the Server-Sent Events format until it ends.
+
+        Args:
+            subscription (Subscription): The subscription to stream.
+
+        Yields:
+            str: Event stream chunks.
+        """
+        deadline = time.monotonic() + self.max_duration
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                if subscription.overflowed:
+                    # the client fell behind, the events it missed are on the reloaded page
+                    yield format_event("reset", {})
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    event, data = subscription.queue.get(timeout=min(self.heartbeat, remaining))
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_event(event, data)
+        finally:
+            self.unsubscribe(subscription)
+
+
+def format_event(event: str, data: dict) -> str:
+    """
+    Formats an event in the Server-Sent Events format.
+
+    Args:
+        event (str): The event name.
+        data (dict): The JSON-serializable event data.
+
+    Returns:
+        str: The event, terminated by a blank line.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
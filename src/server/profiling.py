@@ -0,0 +1,370 @@
+"""
+profiling.py - On-demand profiling of a running server
+
+The metrics show which route got slow, not why. A ProfilerPlugin captures
+the next N requests of a route when asked to, with two profilers at once:
+- cProfile, whose statistics are summarized as text and exported in the
+  pstats format for snakeviz, pstats or gprof2dot,
+- a sampler thread that records the call stack of the profiled requests
+  every few milliseconds, exported as collapsed stacks ("a;b;c 12" lines)
+  for flamegraph.pl, speedscope or inferno.
+Routes that are not being captured only pay a dictionary lookup.
+
+A MemoryProfiler takes tracemalloc snapshots and compares them, to find the
+lines allocating the most memory, e.g. in ObjectMapper.get or in template
+rendering. Tracing slows every allocation down, so it starts with the first
+snapshot and runs until stopped.
+"""
+
+import cProfile
+import collections
+import io
+import itertools
+import marshal
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+
+
+class Capture:
+    """The profile of the next requests of a route."""
+
+    def __init__(self, capture_id: int, rule: str, method: str, requests: int, sample_interval: float):
+        """
+        Initializes a capture, armed until the given number of requests completed.
+
+        Args:
+            capture_id (int): The capture id.
+            rule (str): The route rule, e.g. "/reviews".
+            method (str): The route method, e.g. "GET".
+            requests (int): The number of requests to profile.
+            sample_interval (float): Seconds between two stack samples.
+        """
+        self.id = capture_id
+        self.rule = rule
+        self.method = method
+        self.requests = requests
+        self.sample_interval = sample_interval
+        self.started = 0
+        self.completed = 0
+        self.profiles = []
+        # the number of samples of every stack, as tuples of frame names from the outermost
+        self.stacks = collections.Counter()
+        self.samples = 0
+        # the root frame of each request being profiled, by thread id, walked by the sampler
+        self.running = {}
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.sampler = threading.Thread(target=self._sample, name=f"profiler-{capture_id}", daemon=True)
+        self.sampler.start()
+
+    def _sample(self):
+        """Records the stacks of the requests being profiled until the capture is done."""
+        while not self.done.wait(self.sample_interval):
+            with self.lock:
+                running = dict(self.running)
+            if not running:
+                continue
+            frames = sys._current_frames()
+            with self.lock:
+                for thread_id, root in running.items():
+                    frame = frames.get(thread_id)
+                    stack = []
+                    while frame is not None and frame is not root:
+                        stack.append(_frame_name(frame))
+                        frame = frame.f_back
+                    if frame is root and stack:
+                        self.stacks[tuple(reversed(stack))] += 1
+                        self.samples += 1
+
+    def run(self, callback, args, kwargs):
+        """Calls a route callback, profiling it."""
+        profile = cProfile.Profile()
+        thread_id = threading.get_ident()
+        with self.lock:
+            self.running[thread_id] = sys._getframe()
+        try:
+            profile.enable()
+        except ValueError:
+            # another profiler is active on this thread, only the samples are recorded
+            profile = None
+        try:
+            return callback(*args, **kwargs)
+        finally:
+            if profile:
+                profile.disable()
+            with self.lock:
+                del self.running[thread_id]
+                if profile:
+                    self.profiles.append(profile)
+                self.completed += 1
+                if self.completed >= self.requests:
+                    self.done.set()
+
+    def cancel(self):
+        """Stops profiling further requests, the requests in progress still complete."""
+        with self.lock:
+            self.requests = self.started
+            if self.completed >= self.requests:
+                self.done.set()
+
+    def stats(self):
+        """
+        Returns the cProfile statistics of the completed requests.
+
+        Returns:
+            pstats.Stats: The merged statistics, None if no request completed yet.
+        """
+        with self.lock:
+            profiles = list(self.profiles)
+        if not profiles:
+            return None
+        return pstats.Stats(*profiles)
+
+    def pstats_dump(self) -> bytes:
+        """Returns the statistics in the marshal format pstats.Stats loads, empty before any request completed."""
+        stats = self.stats()
+        if stats is None:
+            return b""
+        # dump_stats only writes to files, this is what it writes
+        return marshal.dumps(stats.stats)
+
+    def collapsed(self) -> str:
+        """Returns the sampled stacks in the collapsed format flame graph tools read."""
+        with self.lock:
+            stacks = sorted(self.stacks.items())
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in stacks)
+
+    def report(self, limit: int = 30, sort: str = "cumulative") -> dict:
+        """
+        Summarizes the capture.
+
+        Args:
+            limit (int): The number of functions listed.
+            sort (str): The pstats sort key, e.g. "cumulative", "tottime" or "ncalls".
+
+        Returns:
+            dict: The progress of the capture, and the top functions as pstats prints them.
+        """
+        stats = self.stats()
+        top = ""
+        if stats is not None:
+            stream = io.StringIO()
+            stats.stream = stream
+            stats.sort_stats(sort).print_stats(limit)
+            top = stream.getvalue()
+        with self.lock:
+            return {"id": self.id, "route": self.rule, "method": self.method, "requests": self.requests,
+                    "started": self.started, "completed": self.completed, "done": self.done.is_set(),
+                    "samples": self.samples, "top": top}
+
+
+class ProfilerPlugin:
+    """
+    Bottle plugin profiling the next requests of a route on demand.
+
+    Installed last so it wraps the route callback directly and the time spent
+    in the other plugins is left out.
+    """
+    name = "profiler"
+    api = 2
+
+    def __init__(self, sample_interval: float = 0.005, keep: int = 10):
+        """
+        Initializes the plugin.
+
+        Args:
+            sample_interval (float): Seconds between two stack samples.
+            keep (int): The number of captures kept, older ones are dropped.
+        """
+        self.sample_interval = sample_interval
+        self.keep = keep
+        self.captures = collections.OrderedDict()
+        # the armed capture of each route, by (rule, method)
+        self.armed = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def capture(self, rule: str, method: str = "GET", requests: int = 10) -> Capture:
+        """
+        Starts profiling the next requests of a route, replacing a capture of the same route in progress.
+
+        Args:
+            rule (str): The route rule, as registered, e.g. "/reviews/<review_id>/edit".
+            method (str): The route method.
+            requests (int): The number of requests to profile.
+
+        Returns:
+            Capture: The new capture.
+
+        Raises:
+            ValueError: If requests is less than 1, the capture would never complete.
+        """
+        if requests < 1:
+            raise ValueError("requests must be at least 1")
+        capture = Capture(next(self.ids), rule, method.upper(), requests, self.sample_interval)
+        with self.lock:
+            previous = self.armed.get((rule, capture.method))
+            self.armed[(rule, capture.method)] = capture
+            self.captures[capture.id] = capture
+            dropped = []
+            while len(self.captures) > self.keep:
+                dropped.append(self.captures.popitem(last=False)[1])
+        for old in dropped + ([previous] if previous else []):
+            old.cancel()
+        return capture
+
+    def apply(self, callback, route):
+        """
+        Wraps a route callback so it is profiled while its route is being captured.
+
+        Args:
+            callback: The route callback.
+            route: The bottle Route the callback belongs to.
+
+        Returns:
+            The wrapped callback.
+        """
+        key = (route.rule, route.method)
+
+        def wrapper(*args, **kwargs):
+            capture = self.armed.get(key)
+            if capture is None:
+                return callback(*args, **kwargs)
+            with self.lock:
+                if self.armed.get(key) is not capture or capture.started >= capture.requests:
+                    capture = None
+                else:
+                    capture.started += 1
+                    if capture.started >= capture.requests:
+                        del self.armed[key]
+            if capture is None:
+                return callback(*args, **kwargs)
+            return capture.run(callback, args, kwargs)
+
+        return wrapper
+
+
+class MemoryProfiler:
+    """Takes tracemalloc snapshots and reports the lines allocating the most memory."""
+
+    def __init__(self, frames: int = 25, keep: int = 5):
+        """
+        Initializes the profiler, tracing starts with the first snapshot.
+
+        Args:
+            frames (int): The number of frames stored per allocation, more find the callers of hot lines.
+            keep (int): The number of snapshots kept, older ones are dropped.
+        """
+        self.frames = frames
+        self.keep = keep
+        self.snapshots = collections.OrderedDict()
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    @property
+    def tracing(self) -> bool:
+        """Whether allocations are being traced."""
+        return tracemalloc.is_tracing()
+
+    def snapshot(self) -> int:
+        """
+        Takes a snapshot of the memory allocated since tracing started, starting it if needed.
+
+        Returns:
+            int: The snapshot id.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ))
+        with self.lock:
+            snapshot_id = next(self.ids)
+            self.snapshots[snapshot_id] = snapshot
+            while len(self.snapshots) > self.keep:
+                self.snapshots.popitem(last=False)
+        return snapshot_id
+
+    def _get(self, snapshot_id: int, match: str = None):
+        """Returns a kept snapshot, keeping only the allocations made with a frame in a matching file."""
+        with self.lock:
+            snapshot = self.snapshots.get(snapshot_id)
+        if snapshot is None:
+            raise KeyError(snapshot_id)
+        if match:
+            snapshot = snapshot.filter_traces((tracemalloc.Filter(True, match, all_frames=True),))
+        return snapshot
+
+    def top(self, snapshot_id: int, limit: int = 20, key_type: str = "lineno", match: str = None) -> dict:
+        """
+        Reports the largest allocations of a snapshot.
+
+        Args:
+            snapshot_id (int): The snapshot id.
+            limit (int): The number of entries reported.
+            key_type (str): How allocations are grouped: "lineno", "filename" or "traceback".
+            match (str, optional): Only count allocations with a frame in a file matching this pattern,
+                e.g. "*object_mapper.py".
+
+        Returns:
+            dict: The total size, and the top entries with their size and number of blocks.
+
+        Raises:
+            KeyError: If the snapshot is not kept.
+        """
+        statistics = self._get(snapshot_id, match).statistics(key_type)
+        return {"snapshot": snapshot_id, "total_kb": _kb(sum(stat.size for stat in statistics)),
+                "top": [{"where": _where(stat.traceback, key_type), "size_kb": _kb(stat.size), "count": stat.count}
+                        for stat in statistics[:limit]]}
+
+    def diff(self, first: int, second: int, limit: int = 20, key_type: str = "lineno", match: str = None) -> dict:
+        """
+        Reports what was allocated, and freed, between two snapshots.
+
+        Args:
+            first (int): The id of the older snapshot.
+            second (int): The id of the newer snapshot.
+            limit (int): The number of entries reported.
+            key_type (str): How allocations are grouped: "lineno", "filename" or "traceback".
+            match (str, optional): Only count allocations with a frame in a file matching this pattern.
+
+        Returns:
+            dict: The change of the total size, and the entries that grew or shrank the most.
+
+        Raises:
+            KeyError: If a snapshot is not kept.
+        """
+        statistics = self._get(second, match).compare_to(self._get(first, match), key_type)
+        return {"from": first, "to": second, "size_diff_kb": _kb(sum(stat.size_diff for stat in statistics)),
+                "top": [{"where": _where(stat.traceback, key_type), "size_kb": _kb(stat.size),
+                         "size_diff_kb": _kb(stat.size_diff), "count": stat.count, "count_diff": stat.count_diff}
+                        for stat in statistics[:limit]]}
+
+    def stop(self):
+        """Stops tracing and drops the snapshots."""
+        tracemalloc.stop()
+        with self.lock:
+            self.snapshots.clear()
+
+
+def _frame_name(frame) -> str:
+    """Names a frame of a collapsed stack after its function, file and first line."""
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _where(traceback, key_type: str):
+    """Formats the location of a statistic, the frames from the outermost for tracebacks."""
+    if key_type == "traceback":
+        return [f"{frame.filename}:{frame.lineno}" for frame in reversed(traceback)]
+    frame = traceback[0]
+    return frame.filename if key_type == "filename" else f"{frame.filename}:{frame.lineno}"
+
+
+def _kb(size: int) -> float:
+    return round(size / 1024, 1)
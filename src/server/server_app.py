@@ -17,15 +17,41 @@ Version:
 - 1.0
 """
 
+import hmac
 import random
 import json
+import logging
 import os
-from bottle import Bottle, run, template, request, redirect, response, static_file, TEMPLATE_PATH
+import pstats
+import time
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIServer
+from bottle import Bottle, HTTPError, run, template, request, redirect, response, static_file, TEMPLATE_PATH
 from src.user_management.user_info import UserInfo
-from src.app_logic.app_logic import Topic, Review
+from src.user_management.session_management import SessionManager
+from src.user_management.session_tokens import RevocationList, SessionTokens, load_signing_key
+from src.app_logic.app_logic import Topic, Review, User
+from src.data_management.query_tracer import QueryTracer
+from src.data_management.group_commit import GroupCommitWriter
+from src.data_management.job_queue import JobQueue, JobWorkers
+from src.data_management.maintenance import MaintenanceScheduler
+from src.data_management.partitioned_data_store import PartitionedDataStore
+from src.data_management.data_store import ContentionPolicy, SQLiteConnection
+from src.server.admission import AdmissionControlPlugin
+from src.server.deadlines import DeadlinePlugin
+from src.server.metrics import MetricsPlugin
+from src.server.notifications import NotificationBus, TooManySubscribers
+from src.server.profiling import MemoryProfiler, ProfilerPlugin
+from src.server.suggestions import SuggestionIndex
+from src.server.tenants import TenantRouter, UnknownTenant
+from src.server.warmup import WarmUp
 
 TEMPLATE_PATH.insert(0, './src/templates/')
 
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    """The wsgiref server, handling every connection on its own thread."""
+    daemon_threads = True
+
 class WebServer(Bottle):
     """
     WebServer class to handle web application routing and functionality, uses Bottle.
@@ -35,20 +61,55 @@ class WebServer(Bottle):
         Initialize the WebServer instance.
         """
         super().__init__()
+        # the startup time reported by the warm-up is measured from here
+        self.created = time.perf_counter()
         self.TEMPLATES_PATH = os.path.join(os.path.dirname(__file__), '../../templates')
-        self.database_path = 'database_path'
+        # the database of requests to hosts that are not tenants, see database_path
+        self.default_database_path = 'database_path'
+        # TenantRouter when each course has its own database, picked by subdomain
+        self.tenants = None
         self.secret = 'secret'
+        # SessionTokens when sessions are stateless signed tokens rather than session rows, see session_tokens
+        self.default_session_tokens = None
+        self.metrics = MetricsPlugin()
+        self.install(self.metrics)
+        # password hashing routes are rate limited, installed after metrics so rejections are counted
+        self.admission = AdmissionControlPlugin()
+        self.install(self.admission)
+        # bounds the database lock waits of every request, a database that stays locked is answered with 503
+        self.deadlines = DeadlinePlugin()
+        self.install(self.deadlines)
+        # profiles the next requests of a route on demand, installed last so it wraps the route callbacks directly
+        self.profiler = ProfilerPlugin()
+        self.install(self.profiler)
+        self.memory_profiler = MemoryProfiler()
+        # the bearer token of the /admin routes, which answer 404 while it is None
+        self.admin_token = None
+        # only publishes the reviews of the server's own database, each tenant has its own bus
+        self.default_notifications = NotificationBus(db_path=self.default_database_path).install()
+        # topic names and usernames completed by /search/suggest, loaded on first use, see load_suggestions
+        self.default_suggestions = SuggestionIndex().install()
+        # compiles the templates and primes the database and caches, /ready answers 503 until it is done
+        self.warm_up = WarmUp(self)
+        # JobQueue of the work handlers hand to background workers, None runs it inline, see enqueue
+        self.jobs = None
+        self.job_handlers = {"remove": self.remove_job, "expire_sessions": self.expire_sessions_job}
+        # seconds between two runs of the expire_sessions job, which queues its next run itself
+        self.session_cleanup_interval = 3600.0
+
+        self.add_hook('before_request', self._bind_tenant)
 
         # Route definitions
         self.route('/', callback=self.home)
         self.route('/home', callback=self.home)
         self.route('/login', callback=self.login)
-        self.route('/login', method='POST', callback=self.do_login)
+        self.route('/login', method='POST', callback=self.do_login, admission=True)
         self.route('/register', callback=self.register)
-        self.route('/register', method='POST', callback=self.do_register)
+        self.route('/register', method='POST', callback=self.do_register, admission=True)
         self.route('/dashboard', callback=self.dashboard)
         self.route('/dashboard', method='POST', callback=self.create_review)
         self.route('/topics', callback=self.list_topics)
+        self.route('/topics/stream', callback=self.stream_topics)
         self.route('/topics/add', callback=self.show_create_topic_form)
         self.route('/topics/create', method='POST', callback=self.create_topic)
         self.route('/topics/<topic_id>/create_review', method=['GET', 'POST'], callback=self.create_review)
@@ -56,13 +117,317 @@ class WebServer(Bottle):
         self.route('/reviews/<review_id>/edit', method=['GET', 'POST'], callback=self.edit_review)
         self.route('/reviews/<review_id>/delete', method=['GET', 'POST'], callback=self.delete_review)
         self.route('/reviews/search', method=['GET', 'POST'], callback=self.search_review)
+        self.route('/search/suggest', callback=self.suggest)
         self.route('/logout', method=['GET', 'POST'], callback=self.logout)
         self.route('/static/<filepath:path>', callback=self.server_static)
+        self.route('/metrics', callback=self.show_metrics)
+        self.route('/ready', callback=self.ready)
+        self.route('/jobs/<job_id:int>', callback=self.show_job)
+        self.route('/admin/profile', method='POST', callback=self.start_profile)
+        self.route('/admin/profile/<capture_id:int>', callback=self.show_profile)
+        self.route('/admin/profile/<capture_id:int>/pstats', callback=self.export_profile_pstats)
+        self.route('/admin/profile/<capture_id:int>/collapsed', callback=self.export_profile_collapsed)
+        self.route('/admin/memory/snapshot', method='POST', callback=self.take_memory_snapshot)
+        self.route('/admin/memory/<snapshot_id:int>', callback=self.show_memory_snapshot)
+        self.route('/admin/memory/diff', callback=self.diff_memory_snapshots)
+        self.route('/admin/memory/stop', method='POST', callback=self.stop_memory_profiler)
+
+    def _bind_tenant(self):
+        """Opens the tenant the request is for, answering 404 for unknown tenants."""
+        if self.tenants is None:
+            return
+        name = self.tenants.resolve(request.get_header('Host'))
+        if name is not None:
+            try:
+                request.environ['feedback_flow.tenant'] = self.tenants.get(name)
+            except UnknownTenant:
+                raise HTTPError(404, "Unknown course.")
+
+    def _tenant(self):
+        """Returns the Tenant of the current request, None for the server's own database."""
+        if self.tenants is None:
+            return None
+        try:
+            return request.environ.get('feedback_flow.tenant')
+        except RuntimeError:
+            # outside of a request, e.g. during the warm-up
+            return None
+
+    @property
+    def database_path(self):
+        """The database of the current request, the tenant's own when tenants are enabled."""
+        tenant = self._tenant()
+        return tenant.database_path if tenant else self.default_database_path
+
+    @database_path.setter
+    def database_path(self, database_path):
+        self.default_database_path = database_path
+        self.default_notifications.db_path = database_path
+
+    @property
+    def session_tokens(self):
+        """The session token signer of the current request's database, tokens of other tenants do not verify."""
+        tenant = self._tenant()
+        if tenant is None or self.default_session_tokens is None:
+            return self.default_session_tokens
+        if tenant.session_tokens is None:
+            tenant.session_tokens = self.default_session_tokens.derive(tenant.name)
+        return tenant.session_tokens
+
+    @session_tokens.setter
+    def session_tokens(self, session_tokens):
+        self.default_session_tokens = session_tokens
+
+    @property
+    def notifications(self):
+        """The live update bus of the current request's database."""
+        tenant = self._tenant()
+        return tenant.notifications if tenant else self.default_notifications
+
+    @property
+    def suggestions(self):
+        """The autocomplete index of the current request's database."""
+        tenant = self._tenant()
+        return tenant.suggestions if tenant else self.default_suggestions
 
     def server_static(self, filepath):
         """Serve static files."""
         return static_file(filepath, root='./static/')
 
+    def show_metrics(self):
+        """
+        Callback for the metrics route, scraped by Prometheus.
+
+        Returns:
+            str: Per-route request metrics in the Prometheus text format.
+        """
+        response.content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        return self.metrics.render()
+
+    def ready(self):
+        """
+        Callback for the readiness route, polled by the load balancer.
+
+        Returns:
+            dict: The warm-up report once the server is warmed up, a 503 response before.
+        """
+        if not self.warm_up.ready.is_set():
+            response.status = 503
+            return {"ready": False}
+        return {"ready": True, "warm_up": self.warm_up.report}
+
+    def admin_check(self):
+        """
+        Lets requests through to the /admin routes only with the admin token.
+
+        Raises:
+            HTTPError: 404 when no admin token is set, 403 without the token as bearer token.
+        """
+        if not self.admin_token:
+            raise HTTPError(404, "Not found.")
+        token = request.get_header('Authorization', '').partition('Bearer ')[2]
+        if not hmac.compare_digest(token.encode(), self.admin_token.encode()):
+            raise HTTPError(403, "Forbidden.")
+
+    def start_profile(self):
+        """
+        Callback starting to profile the next requests of a route.
+
+        The route and method parameters name the route as it is registered,
+        e.g. /reviews/<review_id>/edit, and requests how many to profile.
+
+        Returns:
+            dict: The capture, whose id the other /admin/profile routes take.
+        """
+        self.admin_check()
+        rule = request.params.get('route')
+        method = request.params.get('method', 'GET').upper()
+        if not any(route.rule == rule and route.method == method for route in self.routes):
+            raise HTTPError(400, "Unknown route.")
+        capture = self.profiler.capture(rule, method, self._count_param('requests', 10))
+        return capture.report()
+
+    def _count_param(self, name, default):
+        """Reads a parameter that must be a whole number of at least 1, answering 400 otherwise."""
+        try:
+            value = int(request.params.get(name, default))
+        except ValueError:
+            value = 0
+        if value < 1:
+            raise HTTPError(400, f"{name} must be a whole number of at least 1.")
+        return value
+
+    def _capture(self, capture_id):
+        """Returns a kept profile capture, answering 404 for the others."""
+        capture = self.profiler.captures.get(capture_id)
+        if capture is None:
+            raise HTTPError(404, "Unknown capture.")
+        return capture
+
+    def show_profile(self, capture_id):
+        """
+        Callback reporting the progress of a capture, and its top functions by the sort parameter.
+
+        Returns:
+            dict: The capture report.
+        """
+        self.admin_check()
+        sort = request.params.get('sort', 'cumulative')
+        if sort not in pstats.Stats.sort_arg_dict_default:
+            raise HTTPError(400, "Unknown sort.")
+        return self._capture(capture_id).report(self._count_param('limit', 30), sort)
+
+    def export_profile_pstats(self, capture_id):
+        """
+        Callback exporting the statistics of a capture, for pstats.Stats, snakeviz or gprof2dot.
+
+        Returns:
+            bytes: The statistics in the pstats format.
+        """
+        self.admin_check()
+        response.content_type = 'application/octet-stream'
+        response.set_header('Content-Disposition', f'attachment; filename="profile-{capture_id}.pstats"')
+        return self._capture(capture_id).pstats_dump()
+
+    def export_profile_collapsed(self, capture_id):
+        """
+        Callback exporting the sampled stacks of a capture, for flamegraph.pl, speedscope or inferno.
+
+        Returns:
+            str: The stacks in the collapsed format.
+        """
+        self.admin_check()
+        response.content_type = 'text/plain; charset=utf-8'
+        return self._capture(capture_id).collapsed()
+
+    def _memory_options(self):
+        """Reads the limit, key_type and match parameters of the memory routes."""
+        key_type = request.params.get('key_type', 'lineno')
+        if key_type not in ('lineno', 'filename', 'traceback'):
+            raise HTTPError(400, "Unknown key_type.")
+        return {"limit": self._count_param('limit', 20), "key_type": key_type,
+                "match": request.params.get('match') or None}
+
+    def take_memory_snapshot(self):
+        """
+        Callback taking a tracemalloc snapshot, tracing allocations from now on if it was not yet.
+
+        Returns:
+            dict: The largest allocations of the snapshot.
+        """
+        self.admin_check()
+        return self.memory_profiler.top(self.memory_profiler.snapshot(), **self._memory_options())
+
+    def show_memory_snapshot(self, snapshot_id):
+        """
+        Callback reporting the largest allocations of a snapshot.
+
+        Returns:
+            dict: The top allocations, optionally only those with a frame in a file matching match.
+        """
+        self.admin_check()
+        try:
+            return self.memory_profiler.top(snapshot_id, **self._memory_options())
+        except KeyError:
+            raise HTTPError(404, "Unknown snapshot.")
+
+    def diff_memory_snapshots(self):
+        """
+        Callback comparing the snapshots given by the from and to parameters, to a new snapshot without to.
+
+        Returns:
+            dict: The allocations that grew or shrank the most.
+        """
+        self.admin_check()
+        options = self._memory_options()
+        try:
+            first = int(request.params['from'])
+            second = int(request.params['to']) if request.params.get('to') else self.memory_profiler.snapshot()
+            return self.memory_profiler.diff(first, second, **options)
+        except (KeyError, ValueError):
+            raise HTTPError(404, "Unknown snapshot.")
+
+    def stop_memory_profiler(self):
+        """
+        Callback stopping the allocation tracing and dropping the snapshots.
+
+        Returns:
+            dict: Whether allocations are still traced.
+        """
+        self.admin_check()
+        self.memory_profiler.stop()
+        return {"tracing": self.memory_profiler.tracing}
+
+    def enqueue(self, kind, payload, **options):
+        """
+        Hands work to the background workers, or runs it right away when there are none.
+
+        Args:
+            kind (str): The job kind, a key of job_handlers.
+            payload (dict): The arguments of the handler.
+            **options: The priority, delay and max_attempts of the job, see JobQueue.enqueue.
+
+        Returns:
+            int: The job id, None if the work was done inline.
+        """
+        if self.jobs is None:
+            self.job_handlers[kind](payload)
+            return None
+        return self.jobs.enqueue(kind, payload, **options)
+
+    def remove_job(self, payload):
+        """
+        Job handler removing an object and, through the foreign keys, everything that references it.
+
+        Args:
+            payload (dict): The db_path, and the type and id of the object.
+
+        Returns:
+            dict: Whether the object still existed.
+        """
+        object_mapper = UserInfo(payload["db_path"]).object_mapper
+        obj_class = {"user": User, "topic": Topic, "review": Review}[payload["type"]]
+        obj = object_mapper.get(obj_class, id=payload["id"])
+        if not obj:
+            # a retried job whose earlier attempt removed it
+            return {"removed": False}
+        object_mapper.remove(obj)
+        return {"removed": True}
+
+    def expire_sessions_job(self, payload):
+        """
+        Job handler deleting the expired sessions of a database, then queueing its next run.
+
+        Args:
+            payload (dict): The db_path.
+
+        Returns:
+            dict: The number of deleted sessions.
+        """
+        expired = SessionManager(payload["db_path"]).expire_sessions()
+        if self.jobs is not None:
+            self.jobs.enqueue("expire_sessions", payload, delay=self.session_cleanup_interval)
+        return {"expired": expired}
+
+    def show_job(self, job_id):
+        """
+        Callback for the job status route, only the user who caused a job can see it.
+
+        Args:
+            job_id (int): The job id returned by enqueue.
+
+        Returns:
+            dict: The status, attempts, last error and result of the job.
+        """
+        self.login_check()
+        job = self.jobs.get(job_id) if self.jobs else None
+        user_id = self._current_user_id()
+        # job ids are sequential, the jobs of other users and of the server itself are not revealed,
+        # also not to a signed cookie whose session is gone, which has no user id
+        if job is None or user_id is None or job["payload"].get("owner") != user_id:
+            raise HTTPError(404, "Unknown job.")
+        return {name: job[name] for name in ("id", "kind", "status", "attempts", "max_attempts", "error", "result")}
+
     def home(self):
         """
         Callback for the home route.
@@ -100,10 +465,15 @@ class WebServer(Bottle):
         """
         username = request.forms.get('username')
         password = request.forms.get('password')
-        session_id = UserInfo(self.database_path).login(username, password)
+        session_id = UserInfo(self.database_path, self.session_tokens).login(username, password)
 
         # set cookie
-        response.set_cookie("session_id", session_id, secret=self.secret)
+        if self.session_tokens:
+            # the token is signed already
+            if session_id:
+                response.set_cookie("session_id", session_id, httponly=True, max_age=int(self.session_tokens.ttl))
+        else:
+            response.set_cookie("session_id", session_id, secret=self.secret)
 
         if session_id:
             self.logged_in_user = username
@@ -118,11 +488,40 @@ class WebServer(Bottle):
         Returns:
             str: Does nothing if user is logged in, redirects to login page if user is not logged in.
         """
-        session_id = request.get_cookie("session_id", secret=self.secret)
-    
-        if not session_id:
+        # a cookie whose session expired or was deleted by the expiry sweep is logged out
+        if self._current_user_id() is None:
             return redirect('/login')
 
+    def _session_cookie(self):
+        """
+        Reads the session cookie.
+
+        Returns:
+            str: The session ID, or the session token when session tokens are used, None without a cookie.
+        """
+        if self.session_tokens:
+            return request.get_cookie("session_id")
+        return request.get_cookie("session_id", secret=self.secret)
+
+    def _current_user_id(self):
+        """
+        Returns the ID of the logged in user.
+
+        Session tokens are verified without any database access, session IDs
+        are looked up in the session table, and their expiry moved forward.
+
+        Returns:
+            str: The user ID, None if there is no valid session, or it is inactive or expired.
+        """
+        session_id = self._session_cookie()
+        if not session_id:
+            return None
+        if self.session_tokens:
+            claims = self.session_tokens.verify(session_id)
+            return claims["user_id"] if claims else None
+        session = UserInfo(self.database_path).session_manager.get_valid_session(session_id)
+        return session.user_id if session else None
+
     def register(self):
         """
         Callback for the registration route.
@@ -144,7 +543,11 @@ class WebServer(Bottle):
         username = request.forms.get('username')
         password = request.forms.get('password')
         email = request.forms.get('email')
-        UserInfo(self.database_path).register(username, email, password)
+        try:
+            UserInfo(self.database_path).register(username, email, password)
+        except ValueError:
+            # the username or email belongs to another user
+            return template('register', error="This username or email is already registered.")
         return redirect('/login')
 
     def create_review(self, topic_id):
@@ -176,8 +579,7 @@ class WebServer(Bottle):
             else:
                 action = None  # No known action
             
-            session_id = request.get_cookie("session_id", secret=self.secret)
-            user_id = UserInfo(self.database_path).session_manager.get_session(session_id).user_id
+            user_id = self._current_user_id()
 
             status = "draft" if action == "Save Draft" else "published"
 
@@ -242,10 +644,10 @@ class WebServer(Bottle):
 
         if request.method == 'POST':
             review = user_info.object_mapper.get(Review, id=review_id)
-            session_id = request.get_cookie("session_id", secret=self.secret)
-            user_id = user_info.session_manager.get_session(session_id).user_id
+            user_id = self._current_user_id()
             if review.user_id == user_id:
-                user_info.object_mapper.remove(review)
+                self.enqueue("remove", {"db_path": self.database_path, "type": "review", "id": review.id,
+                                        "owner": user_id}, priority=1)
             return redirect('/reviews')
         reviews = user_info.object_mapper.get(Review)
         return template('list_reviews.tpl', reviews=reviews, filter_criteria="all", request=request, base="base_logged_in.tpl")
@@ -265,6 +667,34 @@ class WebServer(Bottle):
             reviews = [review for review in reviews if review.status != "draft"]
             return template('list_reviews.tpl', title="Reviews", reviews=reviews, filter_criteria=filter_criteria, base="base_logged_in.tpl")
         
+    def load_suggestions(self):
+        """Indexes the topic names and usernames of the database for /search/suggest."""
+        self.suggestions.load(self.database_path)
+
+    def suggest(self):
+        """
+        Completes what was typed so far in the review search, from memory.
+
+        Query parameters:
+            q: The prefix typed so far.
+            k: The largest number of completions per kind, 10 by default.
+
+        Returns:
+            dict: The "topics" and "users" completions, as JSON.
+        """
+        # usernames are only listed to logged in users
+        self.login_check()
+        if self.suggestions.db_path != self.database_path:
+            self.load_suggestions()
+        try:
+            limit = min(max(int(request.query.get('k') or 10), 1), 50)
+        except ValueError:
+            limit = 10
+        prefix = request.query.getunicode('q') or ''
+        if not prefix:
+            return {"topics": [], "users": []}
+        return self.suggestions.suggest(prefix, limit)
+
     def list_topics(self):
         """
         List all topics available.
@@ -273,14 +703,37 @@ class WebServer(Bottle):
             str: HTML response displaying a list of topics.
         """
         self.login_check()
-        topics = UserInfo(self.database_path).object_mapper.get(Topic)
-        raw_reviews = UserInfo(self.database_path).object_mapper.get(Review)
+        object_mapper = UserInfo(self.database_path).object_mapper
+        topics = object_mapper.get(Topic)
+        raw_reviews = object_mapper.get(Review)
       
-        reviews = {}
-        for topic in topics:
-            reviews[topic.id] = [review for review in raw_reviews if review.topic_id == topic.id and review.status == "published"]
+        reviews = {topic.id: [] for topic in topics}
+        for review in raw_reviews:
+            if review.status == "published" and review.topic_id in reviews:
+                reviews[review.topic_id].append(review)
         return template('list_topics.tpl', title="Topics", topics=topics, reviews=reviews, base="base_logged_in.tpl")
 
+    def stream_topics(self):
+        """
+        Streams the reviews published or edited on the topics being viewed, as Server-Sent Events.
+
+        The topics are passed as repeated "topic" query parameters, all topics
+        are streamed when there are none.
+
+        Returns:
+            The event stream, or a 503 response when too many streams are open.
+        """
+        self.login_check()
+        try:
+            subscription = self.notifications.subscribe(request.query.getall('topic'))
+        except TooManySubscribers:
+            response.status = 503
+            response.set_header('Retry-After', '30')
+            return "Too many open streams"
+        response.content_type = 'text/event-stream'
+        response.set_header('Cache-Control', 'no-cache')
+        return self.notifications.stream(subscription)
+
     def list_reviews(self):
         """
         List all reviews available.
@@ -291,10 +744,9 @@ class WebServer(Bottle):
         self.login_check()
         filter_criteria = request.forms.get('filter') or 'all'
 
-        #get session id from cookie
-        session_id = request.get_cookie("session_id", secret=self.secret)
-        user_id = UserInfo(self.database_path).session_manager.get_session(session_id).user_id
-        reviews = UserInfo(self.database_path).object_mapper.get(Review)
+        user_info = UserInfo(self.database_path)
+        user_id = self._current_user_id()
+        reviews = user_info.object_mapper.get(Review)
 
         if filter_criteria == 'all':
             reviews = [review for review in reviews if review.user_id == user_id]
@@ -329,8 +781,7 @@ class WebServer(Bottle):
         
             topic_name = request.forms.get('name')
             topic_description = request.forms.get('description')
-            session_id = request.get_cookie("session_id", secret=self.secret)
-            user_id = UserInfo(self.database_path).session_manager.get_session(session_id).user_id
+            user_id = self._current_user_id()
             topic = Topic(topic_name, topic_description, user_id)
             UserInfo(self.database_path).object_mapper.add(topic)
             return redirect("/topics")
@@ -338,8 +789,8 @@ class WebServer(Bottle):
     def logout(self):
         if request.method == 'POST':
             #get session id from cookie
-            session_id = request.get_cookie("session_id", secret=self.secret)
-            UserInfo(self.database_path).logout(session_id)
+            session_id = self._session_cookie()
+            UserInfo(self.database_path, self.session_tokens).logout(session_id)
             response.delete_cookie("session_id")
             return redirect('/login')
         return template('logout.tpl', title="Logout", base="base_logged_in.tpl")
@@ -347,9 +798,73 @@ class WebServer(Bottle):
 if __name__ == "__main__":
     host_name = "localhost"
     server_port = 8080
+
+    # log statements slower than FEEDBACK_FLOW_SLOW_QUERY_MS together with their query plan
+    if os.environ.get('FEEDBACK_FLOW_SLOW_QUERY_MS'):
+        logging.basicConfig(level=logging.INFO)
+        QueryTracer(slow_threshold_ms=float(os.environ['FEEDBACK_FLOW_SLOW_QUERY_MS'])).install()
+
     app = WebServer()
 
-    TEMPLATE_PATH.insert(0, './src/templates/')
+    # wait up to FEEDBACK_FLOW_BUSY_TIMEOUT_MS for a database lock, and at most FEEDBACK_FLOW_REQUEST_DEADLINE_MS per request
+    if os.environ.get('FEEDBACK_FLOW_BUSY_TIMEOUT_MS'):
+        SQLiteConnection.contention = ContentionPolicy(busy_timeout=float(os.environ['FEEDBACK_FLOW_BUSY_TIMEOUT_MS']) / 1000)
+    if os.environ.get('FEEDBACK_FLOW_REQUEST_DEADLINE_MS'):
+        app.deadlines.timeout = float(os.environ['FEEDBACK_FLOW_REQUEST_DEADLINE_MS']) / 1000
+
+    # commit the writes arriving within FEEDBACK_FLOW_GROUP_COMMIT_MS of each other together
+    if os.environ.get('FEEDBACK_FLOW_GROUP_COMMIT_MS'):
+        GroupCommitWriter(app.database_path, window_ms=float(os.environ['FEEDBACK_FLOW_GROUP_COMMIT_MS'])).install()
+
+    # shard the reviews across FEEDBACK_FLOW_REVIEW_SHARDS database files
+    if os.environ.get('FEEDBACK_FLOW_REVIEW_SHARDS'):
+        PartitionedDataStore.enable(app.database_path, int(os.environ['FEEDBACK_FLOW_REVIEW_SHARDS']))
+
+    # authenticate requests with signed session tokens instead of looking sessions up, signed with
+    # FEEDBACK_FLOW_SESSION_SECRET or the generated key in FEEDBACK_FLOW_SESSION_KEY_FILE, never with a default key
+    if os.environ.get('FEEDBACK_FLOW_SESSION_TOKENS'):
+        try:
+            signing_key = load_signing_key(os.environ.get('FEEDBACK_FLOW_SESSION_SECRET'),
+                                           os.environ.get('FEEDBACK_FLOW_SESSION_KEY_FILE', 'src/database/session_key'))
+        except ValueError as e:
+            raise SystemExit(f"FEEDBACK_FLOW_SESSION_TOKENS is set but {e}")
+        app.session_tokens = SessionTokens(signing_key, revocations=RevocationList('src/database/revoked_sessions.json'))
+
+    # give every subdomain of FEEDBACK_FLOW_TENANT_DOMAIN its own database, e.g. cs101.<domain>: those listed in
+    # the FEEDBACK_FLOW_TENANTS JSON object of tenant databases, or else those whose database was created
+    if os.environ.get('FEEDBACK_FLOW_TENANT_DOMAIN'):
+        tenant_databases = json.loads(os.environ['FEEDBACK_FLOW_TENANTS']) if os.environ.get('FEEDBACK_FLOW_TENANTS') else None
+        app.tenants = TenantRouter(os.environ['FEEDBACK_FLOW_TENANT_DOMAIN'], databases=tenant_databases)
+
+    # analyze, vacuum and back up the database every FEEDBACK_FLOW_MAINTENANCE_HOURS
+    maintenance = None
+    if os.environ.get('FEEDBACK_FLOW_MAINTENANCE_HOURS'):
+        maintenance = MaintenanceScheduler(app.database_path, interval=float(os.environ['FEEDBACK_FLOW_MAINTENANCE_HOURS']) * 3600,
+                                           backup_dir='src/database/backups').start()
+
+    # enable the /admin profiling routes for requests with the FEEDBACK_FLOW_ADMIN_TOKEN bearer token
+    app.admin_token = os.environ.get('FEEDBACK_FLOW_ADMIN_TOKEN')
+
+    # run deletes and session cleanup on FEEDBACK_FLOW_JOB_WORKERS background threads
+    workers = None
+    if os.environ.get('FEEDBACK_FLOW_JOB_WORKERS'):
+        app.jobs = JobQueue(app.database_path)
+        workers = JobWorkers(app.jobs, app.job_handlers, workers=int(os.environ['FEEDBACK_FLOW_JOB_WORKERS'])).start()
+        # the job queues its own next run, a database whose cleanup is already queued keeps that one
+        if not app.jobs.pending("expire_sessions"):
+            app.enqueue("expire_sessions", {"db_path": app.database_path})
 
-    app.run(host=host_name, port=server_port)
+    TEMPLATE_PATH.insert(0, './src/templates/')
+    app.warm_up.start()
+
+    # streams hold their connection open, serve every connection on its own thread
+    app.run(host=host_name, port=server_port, server_class=ThreadingWSGIServer)
+    if maintenance:
+        maintenance.stop()
+    if workers:
+        workers.stop()
+    if app.tenants:
+        app.tenants.close()
+    if app.session_tokens:
+        app.session_tokens.revocations.save()
     print("Server stopped.")
\ No newline at end of file
@@ -0,0 +1,167 @@
+"""
+suggestions.py - Autocomplete for the review search
+
+Searching reviews scans every review, user and topic, too slow to run on
+every keystroke. A SuggestionIndex keeps the topic names and usernames in
+memory, in sorted arrays searched with bisect, so completing a prefix costs a
+binary search plus the k entries returned. The index is loaded from the
+database once and kept up to date through the ObjectMapper listeners.
+"""
+
+import bisect
+import threading
+from src.app_logic.app_logic import Topic, User
+from src.data_management.object_mapper import ObjectMapper
+
+
+class PrefixIndex:
+    """Names kept sorted case-insensitively, completed by prefix."""
+
+    def __init__(self, names: dict = None):
+        """
+        Initializes the index.
+
+        Args:
+            names (dict, optional): The names to index, by id.
+        """
+        self.names = dict(names or {})
+        self.entries = sorted((name.casefold(), name, id) for id, name in self.names.items())
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, id: str, name: str):
+        """
+        Adds a name, or renames the entry with the same id.
+
+        Args:
+            id (str): The id of the object named.
+            name (str): The name.
+        """
+        with self.lock:
+            if self.names.get(id) == name:
+                return
+            self._discard(id)
+            self.names[id] = name
+            bisect.insort(self.entries, (name.casefold(), name, id))
+
+    def remove(self, id: str):
+        """
+        Removes the name of an object, if it is indexed.
+
+        Args:
+            id (str): The id of the object named.
+        """
+        with self.lock:
+            self._discard(id)
+
+    def _discard(self, id: str):
+        """Removes the entry of an id, the lock must be held."""
+        name = self.names.pop(id, None)
+        if name is not None:
+            entry = (name.casefold(), name, id)
+            index = bisect.bisect_left(self.entries, entry)
+            if index < len(self.entries) and self.entries[index] == entry:
+                del self.entries[index]
+
+    def complete(self, prefix: str, limit: int = 10) -> list:
+        """
+        Returns the names starting with a prefix, ignoring case.
+
+        Args:
+            prefix (str): The prefix typed so far.
+            limit (int): The largest number of names returned.
+
+        Returns:
+            list: Up to limit names, in alphabetical order.
+        """
+        key = prefix.casefold()
+        entries = self.entries
+        index = bisect.bisect_left(entries, (key,))
+        result = []
+        for folded, name, _ in entries[index:index + limit]:
+            if not folded.startswith(key):
+                break
+            result.append(name)
+        return result
+
+
+class SuggestionIndex:
+    """The topic names and usernames of a database, completed by prefix."""
+
+    def __init__(self, limit: int = 10):
+        """
+        Initializes an empty index, see load.
+
+        Args:
+            limit (int): The default number of completions returned per kind.
+        """
+        self.limit = limit
+        self.db_path = None
+        self.topics = PrefixIndex()
+        self.users = PrefixIndex()
+
+    def load(self, db_path: str):
+        """
+        Indexes the topic names and usernames of a database, replacing what was indexed.
+
+        Args:
+            db_path (str): The database name, relative to src/database/.
+
+        Returns:
+            SuggestionIndex: The index itself.
+        """
+        object_mapper = ObjectMapper(db_path)
+        self.topics = PrefixIndex({topic.id: topic.name for topic in object_mapper.get(Topic, only=("name",))})
+        self.users = PrefixIndex({user.id: user.username for user in object_mapper.get(User, only=("username",))})
+        self.db_path = db_path
+        return self
+
+    def install(self):
+        """Keeps the index up to date with the objects added and removed through ObjectMapper."""
+        ObjectMapper.listeners.append(self.on_add)
+        ObjectMapper.remove_listeners.append(self.on_remove)
+        return self
+
+    def uninstall(self):
+        """Stops following ObjectMapper."""
+        if self.on_add in ObjectMapper.listeners:
+            ObjectMapper.listeners.remove(self.on_add)
+        if self.on_remove in ObjectMapper.remove_listeners:
+            ObjectMapper.remove_listeners.remove(self.on_remove)
+
+    def on_add(self, obj_type: str, obj, db_path: str = None):
+        """ObjectMapper listener, indexes the topics and users added to or renamed in the indexed database."""
+        if db_path != self.db_path:
+            return
+        if obj_type == "topic":
+            self.topics.add(obj.id, obj.name)
+        elif obj_type == "user":
+            self.users.add(obj.id, obj.username)
+
+    def on_remove(self, obj_type: str, obj, db_path: str = None):
+        """ObjectMapper listener, forgets the topics and users removed from the indexed database."""
+        if db_path != self.db_path:
+            return
+        if obj_type == "topic":
+            self.topics.remove(obj.id)
+        elif obj_type == "user":
+            self.users.remove(obj.id)
+            # the user's topics were deleted with them by the foreign keys
+            self.topics = PrefixIndex({topic.id: topic.name for topic in
+                                       ObjectMapper(self.db_path).get(Topic, only=("name",))})
+
+    def suggest(self, prefix: str, limit: int = None) -> dict:
+        """
+        Completes a prefix with the topic names and usernames starting with it.
+
+        Args:
+            prefix (str): The prefix typed so far.
+            limit (int, optional): The largest number of completions per kind.
+
+        Returns:
+            dict: The "topics" and "users" completions.
+        """
+        limit = limit or self.limit
+        return {"topics": self.topics.complete(prefix, limit), "users": self.users.complete(prefix, limit)}
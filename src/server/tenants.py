@@ -0,0 +1,271 @@
+"""
+tenants.py - One database per course
+
+With a single database every course shares one file and one write lock, so
+a busy course slows all the others down. A TenantRouter gives each course
+its own SQLite file, picked by the subdomain the request was made to:
+cs101.feedback.example.com uses src/database/tenant_cs101.db, requests to
+any other host the server's own database.
+
+Requests are routed before anyone is authenticated, so a request never
+creates a tenant: only the configured tenants, or those whose database was
+created beforehand with create or the command line, exist. Other subdomains
+are unknown.
+
+The tenants in use are kept open, each with its store, a few SQLite
+connections every request to the tenant reuses, its live update bus and
+autocomplete index. At most max_open are kept, the least recently used one
+is closed to open another, closing its connections, and tenants idle for
+longer than idle_timeout are closed too. Tenants with a live update stream
+open are never evicted.
+
+Usage (from the repository root):
+    $ python3 -m src.server.tenants cs101 cs102
+"""
+
+import argparse
+import collections
+import os
+import re
+import threading
+import time
+from src.data_management.data_store import DataStore, SQLiteConnection
+from src.server.notifications import NotificationBus
+from src.server.suggestions import SuggestionIndex
+
+# Tenant names are single DNS labels
+TENANT_NAME = re.compile(r"^[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?$")
+
+
+class UnknownTenant(KeyError):
+    """Raised for a tenant that is not configured or not created, or whose name is not valid."""
+
+
+class Tenant:
+    """The database of one tenant, and the in-memory state kept for it."""
+
+    def __init__(self, name: str, database_path: str, now: float, connections: int = 4):
+        """
+        Opens the tenant's database, creating it if needed.
+
+        Args:
+            name (str): The tenant name.
+            database_path (str): The database name, relative to src/database/.
+            now (float): The current time, in seconds.
+            connections (int): The largest number of idle connections kept open per database file.
+        """
+        self.name = name
+        self.database_path = database_path
+        self.data_store = DataStore.open(database_path)
+        # every store and mapper opened for the tenant's requests connects through SQLiteConnection,
+        # which takes these connections instead of opening new ones
+        shards = getattr(self.data_store, "shards", ())
+        self.connection_paths = [self.data_store.db_path] + [shard.db_path for shard in shards]
+        for path in self.connection_paths:
+            SQLiteConnection.cache_connections(path, connections)
+        self.notifications = NotificationBus(db_path=database_path).install()
+        # loaded on first use by the server, see WebServer.suggest
+        self.suggestions = SuggestionIndex().install()
+        # SessionTokens of the tenant when sessions are signed tokens, see WebServer.session_tokens
+        self.session_tokens = None
+        self.last_used = now
+
+    @property
+    def busy(self) -> bool:
+        """Whether live update streams of the tenant are open."""
+        return bool(self.notifications.subscriptions)
+
+    def close(self):
+        """Stops following the database, closes its connections and releases the store."""
+        self.notifications.uninstall()
+        self.suggestions.uninstall()
+        for path in self.connection_paths:
+            SQLiteConnection.uncache_connections(path)
+        # stores registered with DataStore.factories are shared, their owner closes them
+        if self.database_path not in DataStore.factories and hasattr(self.data_store, "close"):
+            self.data_store.close()
+
+
+class TenantRouter:
+    """Maps the subdomains of a domain to their own databases, keeping the recently used ones open."""
+
+    def __init__(self, domain: str, databases: dict = None, database_name: str = "tenant_{}.db",
+                 max_open: int = 64, idle_timeout: float = 900.0, connections: int = 4, clock=time.monotonic):
+        """
+        Initializes the router.
+
+        Args:
+            domain (str): The domain whose subdomains are tenants, e.g. "feedback.example.com".
+            databases (dict, optional): The database name of each tenant. When given, only these
+                tenants exist; otherwise the subdomains whose database, named after database_name,
+                was created exist.
+            database_name (str): The database name of a tenant, formatted with its name.
+            max_open (int): The largest number of tenants kept open.
+            idle_timeout (float): Seconds after which an unused tenant is closed.
+            connections (int): The largest number of idle connections an open tenant keeps per database file.
+            clock: Returns the current time in seconds.
+        """
+        self.domain = domain.lower().strip(".")
+        self.databases = databases
+        self.database_name = database_name
+        self.max_open = max_open
+        self.idle_timeout = idle_timeout
+        self.connections = connections
+        self.clock = clock
+        self.open_tenants = collections.OrderedDict()
+        self.opened = 0
+        self.evicted = 0
+        self.lock = threading.Lock()
+
+    def resolve(self, host: str):
+        """
+        Returns the tenant a request is for.
+
+        Args:
+            host (str): The Host header of the request.
+
+        Returns:
+            str: The tenant name, None for hosts outside the domain and the domain itself.
+        """
+        host = (host or "").split(":")[0].lower().rstrip(".")
+        if not host.endswith("." + self.domain):
+            return None
+        return host[:-len(self.domain) - 1]
+
+    def database_path(self, name: str) -> str:
+        """
+        Returns the database name of a tenant.
+
+        Args:
+            name (str): The tenant name.
+
+        Raises:
+            UnknownTenant: If the tenant is not configured, or its database was not created.
+        """
+        database_path = self._database_name(name)
+        if self.databases is None and not os.path.exists(DataStore.resolve(database_path)):
+            raise UnknownTenant(name)
+        return database_path
+
+    def _database_name(self, name: str) -> str:
+        """Returns the database name of a configured tenant or a valid tenant name, whether it exists or not."""
+        if self.databases is not None:
+            if name not in self.databases:
+                raise UnknownTenant(name)
+            return self.databases[name]
+        if not TENANT_NAME.match(name):
+            raise UnknownTenant(name)
+        return self.database_name.format(name)
+
+    def create(self, name: str) -> str:
+        """
+        Creates the database of a new tenant, so its subdomain is served.
+
+        Args:
+            name (str): The tenant name.
+
+        Returns:
+            str: The database name of the tenant.
+
+        Raises:
+            UnknownTenant: If the tenant is not configured, or its name is not a valid DNS label.
+        """
+        database_path = self._database_name(name)
+        DataStore(database_path)
+        return database_path
+
+    def get(self, name: str) -> Tenant:
+        """
+        Returns an open tenant, opening it if needed.
+
+        Args:
+            name (str): The tenant name.
+
+        Returns:
+            Tenant: The tenant, marked as just used.
+
+        Raises:
+            UnknownTenant: If there is no such tenant.
+        """
+        now = self.clock()
+        with self.lock:
+            evicted = self._evict_idle(now)
+            tenant = self.open_tenants.pop(name, None)
+            if tenant:
+                tenant.last_used = now
+                self.open_tenants[name] = tenant
+        self._close(evicted)
+        if tenant:
+            return tenant
+
+        # opening creates the database on first use, which must not hold up the other tenants
+        opened = Tenant(name, self.database_path(name), now, self.connections)
+        with self.lock:
+            tenant = self.open_tenants.pop(name, None)
+            if tenant is None:
+                tenant, opened = opened, None
+                self.opened += 1
+            tenant.last_used = now
+            self.open_tenants[name] = tenant
+            evicted = self._evict_over_limit()
+        self._close(evicted)
+        if opened:
+            # another request opened the tenant meanwhile
+            opened.close()
+        return tenant
+
+    def evict_idle(self):
+        """Closes the tenants unused for longer than idle_timeout."""
+        with self.lock:
+            evicted = self._evict_idle(self.clock())
+        self._close(evicted)
+
+    def _evict_idle(self, now: float) -> list:
+        """Removes the idle tenants that are not busy, the lock must be held."""
+        evicted = [tenant for tenant in self.open_tenants.values()
+                   if now - tenant.last_used > self.idle_timeout and not tenant.busy]
+        for tenant in evicted:
+            del self.open_tenants[tenant.name]
+        return evicted
+
+    def _evict_over_limit(self) -> list:
+        """Removes the least recently used tenants that are not busy beyond max_open, the lock must be held."""
+        evicted = []
+        for tenant in list(self.open_tenants.values()):
+            if len(self.open_tenants) <= self.max_open:
+                break
+            if not tenant.busy:
+                del self.open_tenants[tenant.name]
+                evicted.append(tenant)
+        return evicted
+
+    def _close(self, tenants: list):
+        """Closes removed tenants, outside the lock."""
+        for tenant in tenants:
+            tenant.close()
+        if tenants:
+            with self.lock:
+                self.evicted += len(tenants)
+
+    def close(self):
+        """Closes every open tenant."""
+        with self.lock:
+            tenants = list(self.open_tenants.values())
+            self.open_tenants.clear()
+        self._close(tenants)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create the databases of new tenants.")
+    parser.add_argument("names", nargs="+", help="tenant names, the subdomains they are served at")
+    parser.add_argument("--database-name", default="tenant_{}.db",
+                        help="database name of a tenant, relative to src/database/ and formatted with its name")
+    args = parser.parse_args(argv)
+
+    router = TenantRouter("", database_name=args.database_name)
+    for name in args.names:
+        print(f"Created {DataStore.resolve(router.create(name))}")
+
+
+if __name__ == "__main__":
+    main()
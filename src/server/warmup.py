@@ -0,0 +1,156 @@
+"""
+warmup.py - Server warm-up before taking traffic
+
+A fresh server compiles each template the first time a page uses it, and its
+first queries read the database from disk, so the first requests after a
+deploy are much slower than the rest. WarmUp does that work up front:
+- compiles every template in src/templates/ into bottle's template cache,
+  the base templates they rebase on included,
+- creates and migrates the schema once, see DataStore._create_tables,
+- reads the database files, review shards included, so their pages are in
+  the operating system's page cache, and loads the hot tables, which also
+  builds the row converters and the autocomplete index.
+
+The server's /ready route answers 503 until the warm-up is complete, so a
+load balancer only sends traffic once it is. Each step is timed, and the
+report is logged at INFO level.
+"""
+
+import glob
+import logging
+import os
+import re
+import threading
+import time
+from bottle import SimpleTemplate, TEMPLATE_PATH, TEMPLATES
+from src.app_logic.app_logic import Review, Topic, User
+from src.data_management.data_store import DataStore
+from src.data_management.object_mapper import ObjectMapper
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "../templates")
+# % rebase('base.tpl', ...) and % include('name.tpl', ...) lines
+TEMPLATE_REFERENCE = re.compile(r"^\s*%\s*(?:rebase|include)\(\s*['\"]([^'\"]+)['\"]", re.MULTILINE)
+# Read in chunks of this many bytes when priming the page cache
+READ_CHUNK = 1 << 20
+
+
+class WarmUp:
+    """Prepares a WebServer for traffic, and tells when it is ready."""
+
+    def __init__(self, app, template_dir: str = TEMPLATE_DIR, hot_models: tuple = (Topic, User, Review)):
+        """
+        Initializes the warm-up, run by run or start.
+
+        Args:
+            app (WebServer): The server to warm up.
+            template_dir (str): The directory of the templates to compile.
+            hot_models (tuple): The models whose tables are loaded.
+        """
+        self.app = app
+        self.template_dir = template_dir
+        self.hot_models = hot_models
+        self.ready = threading.Event()
+        self.report = {}
+        self.paths = []
+        self.thread = None
+
+    def start(self):
+        """Runs the warm-up in a background thread, so the server can start answering /ready meanwhile."""
+        self.thread = threading.Thread(target=self.run, name="warm-up", daemon=True)
+        self.thread.start()
+        return self
+
+    def run(self) -> dict:
+        """
+        Runs every warm-up step, then marks the server ready.
+
+        A step failing is logged and reported, the server is marked ready
+        regardless since it can still serve, only slower.
+
+        Returns:
+            dict: The duration of each step, and the startup time since the server was created.
+        """
+        started = time.perf_counter()
+        report = {}
+        for name, step in (("templates", self.compile_templates), ("schema", self.create_schema),
+                           ("pages", self.prime_pages), ("caches", self.prime_caches)):
+            step_started = time.perf_counter()
+            try:
+                report[name] = step()
+            except Exception as e:
+                logger.exception("warm-up step %s failed", name)
+                report[name] = {"error": str(e)}
+            report[name]["duration_s"] = round(time.perf_counter() - step_started, 3)
+        report["duration_s"] = round(time.perf_counter() - started, 3)
+        report["startup_s"] = round(time.perf_counter() - self.app.created, 3)
+        self.report = report
+        self.ready.set()
+        logger.info("warm-up complete: %s", report)
+        return report
+
+    def compile_templates(self) -> dict:
+        """
+        Compiles every template into the cache bottle's template() renders from.
+
+        Returns:
+            dict: The number of templates compiled.
+        """
+        names = sorted(os.path.basename(path) for path in glob.glob(os.path.join(self.template_dir, "*.tpl")))
+        lookup = [self.template_dir] + TEMPLATE_PATH
+        compiled = {}
+        for name in names:
+            template = SimpleTemplate(name=name, lookup=lookup)
+            template.co  # noqa: B018 -- reading the cached co property compiles the template now
+            compiled[name] = template
+        # template('login') and template('login.tpl') are cached under different keys, register both
+        by_name = dict(compiled)
+        by_name.update((os.path.splitext(name)[0], template) for name, template in compiled.items())
+        for template in compiled.values():
+            # rendering compiles the rebased or included templates again for every template, share them instead
+            with open(template.filename, encoding="utf-8") as source:
+                for reference in TEMPLATE_REFERENCE.findall(source.read()):
+                    if reference in by_name:
+                        template.cache[reference] = by_name[reference]
+        for name, template in by_name.items():
+            TEMPLATES[(id(TEMPLATE_PATH), name)] = template
+        return {"compiled": len(compiled)}
+
+    def create_schema(self) -> dict:
+        """
+        Creates and migrates the schema, so the requests opening the database never have to.
+
+        Returns:
+            dict: The database files of the store.
+        """
+        data_store = DataStore.open(self.app.database_path)
+        self.paths = [data_store.db_path] + [shard.db_path for shard in getattr(data_store, "shards", ())]
+        return {"files": len(self.paths)}
+
+    def prime_pages(self) -> dict:
+        """
+        Reads the database files, so their pages come from memory rather than disk.
+
+        Returns:
+            dict: The number of bytes read.
+        """
+        read = 0
+        # in-memory databases have no file
+        for path in filter(os.path.isfile, self.paths):
+            with open(path, "rb") as database_file:
+                while chunk := database_file.read(READ_CHUNK):
+                    read += len(chunk)
+        return {"bytes": read}
+
+    def prime_caches(self) -> dict:
+        """
+        Loads the hot tables, which builds the row converters, and the autocomplete index.
+
+        Returns:
+            dict: The number of rows loaded per table.
+        """
+        object_mapper = ObjectMapper(self.app.database_path)
+        rows = {model.__name__.lower(): len(object_mapper.get(model)) for model in self.hot_models}
+        self.app.load_suggestions()
+        return {"rows": rows}
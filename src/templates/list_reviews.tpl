@@ -4,11 +4,33 @@
 <form action="/reviews/search" method="post">
     <h4>Search for any review by topic or username</h4>
     <div>
-        <input type="text" name="query" placeholder="Search for any reviews..." required>
+        <input type="text" name="query" id="search-query" list="search-suggestions" autocomplete="off" placeholder="Search for any reviews..." required>
+        <datalist id="search-suggestions"></datalist>
         <input type="submit" value="Search">
     </div>
 </form>
 
+<!-- Autocomplete: topic names and usernames starting with what was typed so far -->
+<script>
+    var query = document.getElementById("search-query");
+    var suggestions = document.getElementById("search-suggestions");
+    query.addEventListener("input", function () {
+        var prefix = query.value;
+        if (!prefix) { return; }
+        fetch("/search/suggest?k=8&q=" + encodeURIComponent(prefix))
+            .then(function (response) { return response.json(); })
+            .then(function (completions) {
+                if (query.value !== prefix) { return; }
+                suggestions.innerHTML = "";
+                completions.topics.concat(completions.users).forEach(function (name) {
+                    var option = document.createElement("option");
+                    option.value = name;
+                    suggestions.appendChild(option);
+                });
+            });
+    });
+</script>
+
 <h2>Your Reviews</h2>
 
 <!-- Filter Buttons -->
@@ -6,9 +6,9 @@
     <li>
         {{topic.name}}: {{topic.description}}
         <a href='/topics/{{topic.id}}/create_review'>Create Review</a>
-        <ul>
+        <ul id="reviews-{{topic.id}}">
             % for review in reviews.get(topic.id, []):
-                <li>
+                <li id="review-{{review.id}}">
                 {{review.review_text}}
                 <!-- Effort Rating -->
                 <p>Effort expended on this topic: {{review.ratings[0]}}/10</p>
@@ -26,4 +26,33 @@
         </ul>
     </li>
 % end
-</ul>
\ No newline at end of file
+</ul>
+
+<!-- Live updates: reviews published or edited while the page is open are added without reloading -->
+<script>
+    var labels = ["Effort expended on this topic", "Communication with team",
+                  "Participation in critical reviews", "Attending team meetings"];
+    var stream = new EventSource("/topics/stream");
+    stream.addEventListener("review", function (event) {
+        var review = JSON.parse(event.data);
+        var list = document.getElementById("reviews-" + review.topic_id);
+        if (!list) { return; }
+        var item = document.getElementById("review-" + review.id) || document.createElement("li");
+        item.id = "review-" + review.id;
+        item.textContent = review.review_text;
+        labels.forEach(function (label, index) {
+            var rating = document.createElement("p");
+            rating.textContent = label + ": " + review.ratings[index] + "/10";
+            item.appendChild(rating);
+        });
+        list.appendChild(item);
+    });
+    stream.addEventListener("review-removed", function (event) {
+        var item = document.getElementById("review-" + JSON.parse(event.data).id);
+        if (item) { item.remove(); }
+    });
+    stream.addEventListener("reset", function () {
+        stream.close();
+        window.location.reload();
+    });
+</script>
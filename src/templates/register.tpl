@@ -1,4 +1,7 @@
 % rebase('base.tpl', title='Register')
+    % if defined('error'):
+    <p>{{error}}</p>
+    % end
     <form action="/register" method="post">
         <label>Username:</label>
         <input type="text" name="username">
@@ -1,6 +1,12 @@
+import datetime
 from src.data_management.object_mapper import ObjectMapper
 from src.app_logic.app_logic import Session
 
+# A session expires this long after it was last used
+SESSION_LIFETIME = datetime.timedelta(hours=1)
+# Using a session moves its expiry forward at most this often, so most requests do not write
+REFRESH_INTERVAL = datetime.timedelta(minutes=1)
+
 class SessionManager:
     """Manages user sessions, including creation, retrieval, and updating of session data.
 
@@ -48,6 +54,39 @@ class SessionManager:
         """
         return self.object_mapper.get(Session, id)
 
+    def get_valid_session(self, id: str, now=None):
+        """
+        Retrieves a session that is active and has not expired, moving its expiry
+        forward when it was last used more than REFRESH_INTERVAL ago.
+
+        Args:
+            id (str): The ID of the session to retrieve.
+            now (datetime, optional): The current time, datetime.now() by default.
+
+        Returns:
+            Session: The session object if it is valid, None otherwise.
+        """
+        now = now or datetime.datetime.now()
+        session = self.get_session(id)
+        if not session or not session.is_active or session.expires_at <= now:
+            return None
+        if now - session.last_activity_at >= REFRESH_INTERVAL:
+            self.refresh_session(session, now)
+        return session
+
+    def refresh_session(self, session, now=None):
+        """Marks a session active and used, so it expires SESSION_LIFETIME from now.
+
+        Args:
+            session (Session): The session object to refresh.
+            now (datetime, optional): The current time, datetime.now() by default.
+        """
+        now = now or datetime.datetime.now()
+        session.is_active = 1
+        session.last_activity_at = now
+        session.expires_at = now + SESSION_LIFETIME
+        self.update_session(session)
+
     def get_user_session(self, user_id: int):
         """Retrieves the session associated with a user.
 
@@ -60,8 +99,8 @@ class SessionManager:
         sessions = self.object_mapper.get(Session)
         for session in sessions:
             if session.user_id == user_id:
-                session.is_active = 1
-                self.update_session(session)
+                # logging in again starts a new lifetime, the expiry sweep keeps the session
+                self.refresh_session(session)
                 return session
         return None
 
@@ -72,3 +111,27 @@ class SessionManager:
             session (Session): The session object to update.
         """
         self.object_mapper.add(session)
+
+    def get_active_sessions(self, now=None):
+        """Retrieves the active sessions that have not expired, an indexed range scan.
+
+        Args:
+            now (datetime, optional): The current time, datetime.now() by default.
+
+        Returns:
+            list: The Session objects, the soonest to expire first.
+        """
+        now = now or datetime.datetime.now()
+        return self.object_mapper.get_range(Session, "expires_at", after=now, is_active=1)
+
+    def expire_sessions(self, now=None):
+        """Deletes the sessions that have expired, an indexed range scan.
+
+        Args:
+            now (datetime, optional): The current time, datetime.now() by default.
+
+        Returns:
+            int: The number of deleted sessions.
+        """
+        now = now or datetime.datetime.now()
+        return self.object_mapper.data_store.delete_range("session", "expires_at", before=now)
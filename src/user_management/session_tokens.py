@@ -0,0 +1,263 @@
+"""
+session_tokens.py - Stateless signed session tokens
+
+A session token carries the user id, its issue and expiry times and a random
+token id, signed with HMAC-SHA256. Verifying it is pure CPU: no database
+lookup is needed to authenticate a request. Logging out adds the token id to
+a RevocationList, which only has to remember a token until it would have
+expired anyway and is saved to a JSON file now and then, so revocations
+survive a restart.
+
+The signature is the only credential check, so whoever knows the signing key
+can log in as anyone: the key must be at least 32 random bytes, given in the
+environment or generated into a key file that is kept out of the repository.
+
+Usage (from the repository root):
+    $ python3 -m src.user_management.session_tokens --generate-key src/database/session_key
+"""
+
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+import uuid
+
+
+# The shortest signing key accepted, in bytes, the size of an HMAC-SHA256 digest
+MIN_KEY_BYTES = 32
+
+
+def _encode(data: bytes) -> str:
+    """Encodes bytes as unpadded URL-safe base64."""
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _decode(text: str) -> bytes:
+    """Decodes unpadded URL-safe base64."""
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class RevocationList:
+    """The ids of revoked tokens that have not expired yet, saved to a JSON file periodically."""
+
+    def __init__(self, path: str = None, persist_interval: float = 30.0):
+        """
+        Initializes the list, loading the revocations saved before.
+
+        Args:
+            path (str, optional): The JSON file the list is saved to, kept in memory only when None.
+            persist_interval (float): The least number of seconds between two saves.
+        """
+        self.path = path
+        self.persist_interval = persist_interval
+        self.revoked = {}
+        self.lock = threading.Lock()
+        self.last_saved = time.time()
+        if path and os.path.exists(path):
+            with open(path) as file:
+                self.revoked = json.load(file)
+        self.prune()
+
+    def __contains__(self, token_id: str) -> bool:
+        return token_id in self.revoked
+
+    def __len__(self) -> int:
+        return len(self.revoked)
+
+    def add(self, token_id: str, expires_at: float):
+        """
+        Revokes a token, saving the list if it was not saved for persist_interval seconds.
+
+        Args:
+            token_id (str): The id of the token.
+            expires_at (float): When the token expires, it is forgotten afterwards.
+        """
+        with self.lock:
+            self.revoked[token_id] = expires_at
+            due = time.time() - self.last_saved >= self.persist_interval
+        if due:
+            self.save()
+
+    def prune(self):
+        """Forgets the revoked tokens that have expired, they are rejected anyway."""
+        now = time.time()
+        with self.lock:
+            self.revoked = {token_id: expires_at for token_id, expires_at in self.revoked.items()
+                            if expires_at > now}
+
+    def save(self):
+        """Saves the unexpired revocations, replacing the file atomically."""
+        self.prune()
+        if not self.path:
+            return
+        with self.lock:
+            revoked = dict(self.revoked)
+            self.last_saved = time.time()
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(revoked, file)
+        os.replace(temporary_path, self.path)
+
+
+class SessionTokens:
+    """Issues and verifies HMAC-signed session tokens."""
+
+    def __init__(self, secret: str, ttl: float = 3600.0, revocations: RevocationList = None):
+        """
+        Initializes the token signer.
+
+        Args:
+            secret (str or bytes): The signing key, at least MIN_KEY_BYTES long, see load_signing_key.
+            ttl (float): How many seconds a token is valid for.
+            revocations (RevocationList, optional): The revoked tokens, an in-memory list by default.
+
+        Raises:
+            ValueError: If the signing key is too short.
+        """
+        self.key = secret.encode("utf-8") if isinstance(secret, str) else secret
+        if not self.key or len(self.key) < MIN_KEY_BYTES:
+            raise ValueError(f"the session signing key must be at least {MIN_KEY_BYTES} bytes long")
+        self.ttl = ttl
+        self.revocations = revocations if revocations is not None else RevocationList()
+
+    def derive(self, context: str):
+        """
+        Returns a signer whose tokens only verify in a given context, e.g. one tenant's database.
+
+        Its key is derived from this signer's key, and it shares the revocations.
+
+        Args:
+            context (str): The context, e.g. the tenant name.
+
+        Returns:
+            SessionTokens: The derived signer.
+        """
+        key = hmac.new(self.key, context.encode("utf-8"), hashlib.sha256).digest()
+        return SessionTokens(key, self.ttl, self.revocations)
+
+    def _sign(self, payload: str) -> str:
+        """Returns the encoded signature of an encoded payload."""
+        return _encode(hmac.new(self.key, payload.encode("ascii"), hashlib.sha256).digest())
+
+    def issue(self, user_id: str) -> str:
+        """
+        Issues a token for a user.
+
+        Args:
+            user_id (str): The ID of the logged in user.
+
+        Returns:
+            str: The token, "<payload>.<signature>".
+        """
+        issued_at = int(time.time())
+        claims = [user_id, issued_at, issued_at + int(self.ttl), uuid.uuid4().hex]
+        payload = _encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+        return f"{payload}.{self._sign(payload)}"
+
+    def _claims(self, token: str):
+        """Returns the claims of a token with a valid signature, None otherwise."""
+        if not token or token.count(".") != 1:
+            return None
+        payload, signature = token.split(".")
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            return None
+        try:
+            user_id, issued_at, expires_at, token_id = json.loads(_decode(payload))
+        except ValueError:
+            return None
+        return {"user_id": user_id, "issued_at": issued_at, "expires_at": expires_at, "token_id": token_id}
+
+    def verify(self, token: str):
+        """
+        Verifies a token without any database access.
+
+        Args:
+            token (str): The token.
+
+        Returns:
+            dict or None: The user_id, issued_at, expires_at and token_id claims,
+            or None if the token is forged, expired or revoked.
+        """
+        claims = self._claims(token)
+        if claims is None or claims["expires_at"] <= time.time() or claims["token_id"] in self.revocations:
+            return None
+        return claims
+
+    def revoke(self, token: str) -> bool:
+        """
+        Revokes a token, e.g. on logout.
+
+        Args:
+            token (str): The token.
+
+        Returns:
+            bool: True if the token was valid and is now revoked, False otherwise.
+        """
+        claims = self.verify(token)
+        if claims is None:
+            return False
+        self.revocations.add(claims["token_id"], claims["expires_at"])
+        return True
+
+
+def load_signing_key(secret: str = None, key_file: str = None) -> bytes:
+    """
+    Returns the session signing key given in the environment, or else read from a key file.
+
+    There is no default key: a key in the repository would let anyone sign tokens.
+
+    Args:
+        secret (str, optional): The key itself, e.g. from FEEDBACK_FLOW_SESSION_SECRET.
+        key_file (str, optional): A file holding the key in hex, written by generate_key_file.
+
+    Returns:
+        bytes: The signing key.
+
+    Raises:
+        ValueError: If neither gives a key, or the key is shorter than MIN_KEY_BYTES.
+    """
+    if secret:
+        key = secret.encode("utf-8")
+    elif key_file and os.path.exists(key_file):
+        with open(key_file) as file:
+            key = bytes.fromhex(file.read().strip())
+    else:
+        raise ValueError("no session signing key: set FEEDBACK_FLOW_SESSION_SECRET or generate a key file with "
+                         "python3 -m src.user_management.session_tokens --generate-key <path>")
+    if len(key) < MIN_KEY_BYTES:
+        raise ValueError(f"the session signing key must be at least {MIN_KEY_BYTES} bytes long")
+    return key
+
+
+def generate_key_file(path: str):
+    """
+    Writes a new random signing key to a file only its owner can read.
+
+    Args:
+        path (str): The key file, which must not exist yet.
+
+    Raises:
+        FileExistsError: If the file exists, replacing the key would end every session.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(descriptor, "w") as file:
+        file.write(secrets.token_hex(MIN_KEY_BYTES) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the signing key of the session tokens.")
+    parser.add_argument("--generate-key", metavar="PATH", required=True, help="the key file to write")
+    args = parser.parse_args(argv)
+
+    generate_key_file(args.generate_key)
+    print(f"Wrote a new session signing key to {args.generate_key}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,14 +5,17 @@ from src.user_management.session_management import SessionManager
 from src.data_management.object_mapper import ObjectMapper
 
 class UserInfo:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, session_tokens=None):
         """
         Initializes a UserInfo instance.
 
         Args:
             db_path (str): The path to the database where user information is stored.
+            session_tokens (SessionTokens, optional): Issues stateless signed session
+                tokens on login instead of session rows, when set.
         """
         self.db_path = db_path
+        self.session_tokens = session_tokens
         self.object_mapper = ObjectMapper(self.db_path)
         self.session_manager = SessionManager(self.db_path)
 
@@ -43,13 +46,16 @@ class UserInfo:
             password (str): The password of the user trying to log in.
 
         Returns:
-            SessionManager: The SessionManager object if login is successful, None otherwise.
+            str: The session ID, or the signed session token when session tokens
+            are used, if login is successful, None otherwise.
         """
 
         users = self.object_mapper.get(User)
         print(f"Users:{users}\nID: {users[0].id}")
         for user in users:
             if user.username == username and self._verify_password(user.hashed_password, password):
+                if self.session_tokens:
+                    return self.session_tokens.issue(user.id)
                 user_session = self.session_manager.get_user_session(user.id)
                 print(f"User session: {user_session}")
                 if user_session:
@@ -66,8 +72,12 @@ class UserInfo:
         Logs out a user by invalidating the session with the given session ID.
 
         Args:
-            id (str): The ID of the session to be invalidated.
+            id (str): The ID of the session to be invalidated, or the session token
+                to revoke when session tokens are used.
         """
+        if self.session_tokens:
+            self.session_tokens.revoke(id)
+            return
         session = self.session_manager.get_session(id)
         if session:
             session.is_active = 0
@@ -118,14 +128,16 @@ class UserInfo:
 
         result = []
         all_reviews = self.object_mapper.get(Review)  # This retrieves all reviews.
-        all_topics = self.object_mapper.get(Topic)  # This retrieves all topics.
-        all_users = self.object_mapper.get(User)  # This retrieves all users
+        all_topics = self.object_mapper.get(Topic, only=("name",))  # This retrieves all topic names.
+        all_users = self.object_mapper.get(User, only=("username",))  # This retrieves all usernames
+
+        # look authors and topics up by id instead of scanning them for every review
+        usernames = {user.id: user.username for user in all_users}
+        topic_names = {topic.id: topic.name for topic in all_topics}
 
         for review in all_reviews:
-            for user in all_users:
-                if user.id == review.user_id and query in user.username:
-                    result.append(review)
-            for topic in all_topics:
-                if topic.id == review.topic_id and query in topic.name:
-                    result.append(review)
+            if review.user_id in usernames and query in usernames[review.user_id]:
+                result.append(review)
+            if review.topic_id in topic_names and query in topic_names[review.topic_id]:
+                result.append(review)
         return result
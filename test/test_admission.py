@@ -0,0 +1,98 @@
+"""This module contains unit tests for the admission.py module."""
+import threading
+from unittest import TestCase
+from bottle import Bottle
+from src.server.admission import AdmissionControlPlugin, TokenBucket
+from src.server.metrics import MetricsPlugin
+from test.wsgi import call
+
+
+class TestAdmission(TestCase):
+    """Unit tests for the TokenBucket and AdmissionControlPlugin classes."""
+    def setUp(self):
+        self.now = 0.0
+        self.app = Bottle()
+        self.metrics = MetricsPlugin()
+        self.app.install(self.metrics)
+
+    def _install(self, **limits):
+        """installs an admission plugin driven by the test clock"""
+        self.admission = AdmissionControlPlugin(clock=lambda: self.now, **limits)
+        self.app.install(self.admission)
+        self.app.route("/login", method="POST", callback=lambda: "ok", admission=True)
+        self.app.route("/other", method="POST", callback=lambda: "ok")
+
+    def test_token_bucket(self):
+        """tests that a bucket allows a burst, then refills at its rate"""
+        bucket = TokenBucket(rate=2, burst=2, now=0)
+        self.assertEqual(bucket.take(0), 0)
+        self.assertEqual(bucket.take(0), 0)
+        self.assertEqual(bucket.take(0), 0.5)
+        self.assertEqual(bucket.take(0.5), 0)
+
+    def test_client_rate_limit(self):
+        """tests that a client over its rate gets a 429 with Retry-After while others are admitted"""
+        self._install(client_rate=0.5, client_burst=2)
+        self.assertEqual(call(self.app, "/login", "POST")[0], "200 OK")
+        self.assertEqual(call(self.app, "/login", "POST")[0], "200 OK")
+        status, headers, _ = call(self.app, "/login", "POST")
+        self.assertEqual(status, "429 Too Many Requests")
+        self.assertEqual(headers["Retry-After"], "2")
+        self.assertEqual(call(self.app, "/login", "POST", remote_addr="10.0.0.2")[0], "200 OK")
+        self.assertEqual(call(self.app, "/other", "POST")[0], "200 OK")
+        self.now = 2.0
+        self.assertEqual(call(self.app, "/login", "POST")[0], "200 OK")
+        self.assertIn('feedback_flow_http_requests_total{route="/login",method="POST",status="429"} 1',
+                      self.metrics.render())
+
+    def test_forwarded_for_is_ignored(self):
+        """tests that a forged X-Forwarded-For still counts against the client's own address"""
+        self._install(client_rate=0.5, client_burst=1)
+        self.assertEqual(call(self.app, "/login", "POST", headers={"X-Forwarded-For": "10.0.0.2"})[0], "200 OK")
+        self.assertEqual(call(self.app, "/login", "POST", headers={"X-Forwarded-For": "10.0.0.3"})[0],
+                         "429 Too Many Requests")
+        self.assertEqual(call(self.app, "/login", "POST", remote_addr="10.0.0.2")[0], "200 OK")
+        self.assertEqual(list(self.admission.client_buckets), ["127.0.0.1", "10.0.0.2"])
+
+    def test_trusted_proxy(self):
+        """tests that only a trusted proxy's requests count against the address it forwarded"""
+        self._install(client_rate=0.5, client_burst=1, trusted_proxies=["10.0.0.1"])
+        forwarded = {"X-Forwarded-For": "203.0.113.5, 10.0.0.1"}
+        self.assertEqual(call(self.app, "/login", "POST", remote_addr="10.0.0.1", headers=forwarded)[0], "200 OK")
+        self.assertEqual(call(self.app, "/login", "POST", remote_addr="10.0.0.1",
+                              headers={"X-Forwarded-For": "198.51.100.7"})[0], "200 OK")
+        self.assertEqual(call(self.app, "/login", "POST", remote_addr="10.0.0.1", headers=forwarded)[0],
+                         "429 Too Many Requests")
+        self.assertEqual(list(self.admission.client_buckets), ["198.51.100.7", "203.0.113.5"])
+
+    def test_global_rate_limit(self):
+        """tests that the global bucket limits all clients together"""
+        self._install(global_rate=1, global_burst=2)
+        statuses = [call(self.app, "/login", "POST", remote_addr=f"10.0.0.{i}")[0] for i in range(3)]
+        self.assertEqual(statuses, ["200 OK", "200 OK", "429 Too Many Requests"])
+
+    def test_client_buckets_are_bounded(self):
+        """tests that the least recently seen clients are forgotten"""
+        self._install(max_clients=2)
+        for i in range(3):
+            call(self.app, "/login", "POST", remote_addr=f"10.0.0.{i}")
+        self.assertEqual(list(self.admission.client_buckets), ["10.0.0.1", "10.0.0.2"])
+
+    def test_wait_queue(self):
+        """tests that requests beyond the concurrency limit wait in a bounded queue"""
+        self._install(max_concurrent=1, max_queue=1, queue_timeout=5)
+        release = threading.Event()
+        self.app.route("/slow", method="POST", callback=lambda: release.wait(5) and "ok", admission=True)
+        statuses = []
+        threads = [threading.Thread(target=lambda: statuses.append(call(self.app, "/slow", "POST")[0])) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        while self.admission.waiting < 1:
+            threading.Event().wait(0.001)
+        # one request runs and one waits, so the queue is full
+        self.assertEqual(call(self.app, "/slow", "POST")[0], "429 Too Many Requests")
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(statuses, ["200 OK", "200 OK"])
+        self.assertEqual(self.admission.rejected, 1)
@@ -58,3 +58,29 @@ class TestAppLogic(TestCase):
             "is_active" : 'e',
         }
         self.assertEqual(self.session.data, review_data)
+
+    def test_models_have_no_instance_dict(self):
+        """tests that the models store their fields in slots"""
+        for obj in (self.user, self.topic, self.review, self.session):
+            self.assertFalse(hasattr(obj, "__dict__"))
+
+    def test_row_loader(self):
+        """tests that a model can be built straight from a row tuple in any column order"""
+        load = Review.row_loader(("status", "id", "topic_id", "user_id", "review_ratings", "review_text"))
+        review = load(("published", "c", "b", "a", "[1,2,3,4]", "this is a test"))
+        self.assertIsInstance(review, Review)
+        self.assertEqual(review.data, {**self.review.data, "status": "published"})
+        self.assertIs(load, Review.row_loader(["status", "id", "topic_id", "user_id", "review_ratings", "review_text"]))
+
+    def test_row_loader_rejects_unknown_columns(self):
+        """tests that a row loader cannot be generated for columns the model does not have"""
+        self.assertRaises(ValueError, Review.row_loader, ("id", "name"))
+        self.assertRaises(ValueError, Review.row_loader, ("id", "status = None; import os"))
+
+    def test_ratings_are_cached(self):
+        """tests that ratings are parsed once and re-parsed when review_ratings changes"""
+        review = Review('text', 'a', 'b', "draft", '[1,2,3,4]')
+        self.assertIs(review.ratings, review.ratings)
+        self.assertEqual(review.ratings, [1, 2, 3, 4])
+        review.review_ratings = '[5,6,7,8]'
+        self.assertEqual(review.ratings, [5, 6, 7, 8])
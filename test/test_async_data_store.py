@@ -0,0 +1,81 @@
+"""This module contains unit tests for the async_data_store.py module."""
+import asyncio
+import os
+import sqlite3
+import threading
+from unittest import IsolatedAsyncioTestCase
+from src.app_logic.app_logic import User, Topic, Review
+from src.data_management.async_data_store import AsyncDataStore, AsyncObjectMapper, ConnectionPool
+from src.data_management.data_store import SQLiteConnection
+
+class TestAsyncDataStore(IsolatedAsyncioTestCase):
+    """Unit tests for the AsyncDataStore and AsyncObjectMapper classes."""
+    async def asyncSetUp(self):
+        # Before each test, clear all tables to ensure there's no leftover data
+        self.object_mapper = AsyncObjectMapper("test_async.db")
+        self.object_mapper.object_mapper.data_store.clear_tables()
+        self.user = User("test_user", "test_user@example.com", "test_password")
+        await self.object_mapper.add(self.user)
+
+    async def asyncTearDown(self):
+        self.object_mapper.close()
+
+    async def test_add_get_remove(self):
+        """tests adding, retrieving and removing an object"""
+        topic = Topic("topic", "description", self.user.id)
+        self.assertTrue(await self.object_mapper.add(topic))
+        self.assertEqual((await self.object_mapper.get(Topic, topic.id)).name, "topic")
+        self.assertTrue(await self.object_mapper.remove(topic))
+        self.assertFalse(await self.object_mapper.get(Topic, topic.id))
+
+    async def test_data_store_operations(self):
+        """tests the async equivalents of the DataStore operations"""
+        data_store = self.object_mapper.data_store
+        topic = Topic("topic", "description", self.user.id)
+        self.assertTrue(await data_store.save(topic.data, "topic"))
+        self.assertEqual((await data_store.load("topic", topic.id))[0]["name"], "topic")
+        self.assertEqual(await data_store.load_rows("topic", columns=["name"]), [("topic",)])
+        self.assertTrue(await data_store.delete(topic.id, "topic"))
+        self.assertEqual(await data_store.load("topic"), [])
+
+    async def test_gather_reads(self):
+        """tests that independent reads can be awaited together"""
+        topic = Topic("topic", "description", self.user.id)
+        await self.object_mapper.add(topic)
+        reviews = [Review(f"review {i}", self.user.id, topic.id) for i in range(5)]
+        await asyncio.gather(*(self.object_mapper.add(review) for review in reviews))
+
+        loaded_reviews, users, topics = await self.object_mapper.get_all(Review, User, Topic)
+        self.assertEqual({review.id for review in loaded_reviews}, {review.id for review in reviews})
+        self.assertEqual([user.username for user in users], ["test_user"])
+        self.assertEqual([topic.name for topic in topics], ["topic"])
+        review_rows, user_rows = await self.object_mapper.data_store.load_all("review", "user")
+        self.assertEqual((len(review_rows), len(user_rows)), (5, 1))
+
+    async def test_pool_reuses_connections(self):
+        """tests that the pool threads keep one connection per database open"""
+        async with AsyncDataStore("test_async.db", ConnectionPool(size=1)) as data_store:
+            def connection():
+                with SQLiteConnection(data_store.data_store.db_path) as connection:
+                    return id(connection), threading.current_thread().name
+            first = await data_store.pool.run(connection)
+            second = await data_store.pool.run(connection)
+        self.assertEqual(first, second)
+        self.assertNotEqual(first[1], threading.current_thread().name)
+
+    async def test_pool_closes_connections(self):
+        """tests that closing the pool closes the connections its threads kept open"""
+        pool = ConnectionPool(size=2)
+        def connection():
+            with SQLiteConnection(self.object_mapper.object_mapper.data_store.db_path) as connection:
+                return connection
+        connections = await asyncio.gather(pool.run(connection), pool.run(connection))
+        pool.close()
+        for connection in connections:
+            self.assertRaises(sqlite3.ProgrammingError, connection.execute, "SELECT 1")
+        self.assertEqual(pool.connections, [])
+
+    @classmethod
+    def tearDownClass(cls):
+        # After all tests, delete the test database
+        os.remove("src/database/test_async.db")
@@ -0,0 +1,145 @@
+"""This module contains unit tests for the change_log.py module."""
+import os
+from unittest import TestCase
+from src.app_logic.app_logic import User, Topic, Review
+from src.data_management.change_log import ChangeLog, ChangeLogConsumer
+from src.data_management.data_store import SQLiteConnection
+from src.data_management.object_mapper import ObjectMapper
+from src.data_management.partitioned_data_store import PartitionedDataStore
+
+class TestChangeLog(TestCase):
+    """Unit tests for the ChangeLog and ChangeLogConsumer classes."""
+    @classmethod
+    def setUpClass(cls):
+        # Create a new test database for this test suite
+        cls.object_mapper = ObjectMapper("test_change_log.db")
+        cls.change_log = ChangeLog("test_change_log.db")
+
+    def setUp(self):
+        # Before each test, clear all tables and consumers to ensure there's no leftover data
+        self.object_mapper.data_store.clear_tables()
+        with SQLiteConnection(self.change_log.db_path) as connection:
+            connection.execute("DELETE FROM change_log_checkpoint")
+        self.start = self.change_log.latest_sequence()
+
+    def _operations(self):
+        """returns the (table, operation) pairs logged since the test started"""
+        return [(change.table_name, change.operation) for change in self.change_log.read(self.start)]
+
+    def test_operations_are_logged(self):
+        """tests that inserts, updates through upserts and deletes are logged in order, unchanged saves are not"""
+        user = User("test_user", "test_user@example.com", "test_password")
+        self.object_mapper.add(user)
+        user.email = "new@example.com"
+        self.object_mapper.add(user)
+        self.object_mapper.add(user)
+        self.object_mapper.remove(user)
+        self.assertEqual(self._operations(), [("user", "insert"), ("user", "update"), ("user", "delete")])
+        seqs = [change.seq for change in self.change_log.read(self.start)]
+        self.assertEqual(seqs, sorted(seqs))
+        self.assertEqual(seqs[-1], self.change_log.latest_sequence())
+
+    def test_cascaded_and_failed_writes(self):
+        """tests that cascaded deletes are logged, failed writes and unique conflicts are not"""
+        user = User("test_user", "test_user@example.com", "test_password")
+        self.object_mapper.add(user)
+        topic = Topic("topic", "description", user.id)
+        self.object_mapper.add(topic)
+        with self.assertRaises(ValueError):
+            self.object_mapper.add(Topic("topic", "same name", user.id))
+        with self.assertRaises(ValueError):
+            self.object_mapper.add(Topic("orphan", "description", "no such user"))
+        self.object_mapper.remove(user)
+        self.assertEqual([(change.row_id, change.operation) for change in self.change_log.read(self.start)],
+                         [(user.id, "insert"), (topic.id, "insert"), (topic.id, "delete"), (user.id, "delete")])
+
+    def test_consumer_reads_in_batches_from_checkpoint(self):
+        """tests that a consumer handles every change once, in batches, and resumes from its checkpoint"""
+        consumer = ChangeLogConsumer("test_change_log.db", "cache", batch_size=2,
+                                     tables=("user",), from_start=False)
+        users = [User(f"user{i}", f"user{i}@example.com", "password") for i in range(5)]
+        for user in users:
+            self.object_mapper.add(user)
+        self.object_mapper.add(Topic("topic", "description", users[0].id))
+
+        batches = []
+        self.assertEqual(consumer.consume(batches.append), 5)
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        self.assertEqual([change.row_id for batch in batches for change in batch], [user.id for user in users])
+        self.assertEqual(consumer.consume(batches.append), 0)
+
+        self.object_mapper.remove(users[0])
+        resumed = ChangeLogConsumer("test_change_log.db", "cache", tables=("user",))
+        self.assertEqual([(change.row_id, change.operation) for change in resumed.poll()],
+                         [(users[0].id, "delete")])
+
+    def test_failed_batch_is_read_again(self):
+        """tests that the checkpoint only moves past batches the handler returned from"""
+        consumer = ChangeLogConsumer("test_change_log.db", "index", from_start=False)
+        self.object_mapper.add(User("test_user", "test_user@example.com", "test_password"))
+
+        def fail(batch):
+            raise RuntimeError("index unavailable")
+        with self.assertRaises(RuntimeError):
+            consumer.consume(fail)
+        self.assertEqual(len(consumer.poll()), 1)
+
+    def test_compact(self):
+        """tests that compaction keeps the latest entry per row and drops consumed old deletions"""
+        consumer = ChangeLogConsumer("test_change_log.db", "aggregates", from_start=False)
+        kept = User("kept", "kept@example.com", "password")
+        deleted = User("deleted", "deleted@example.com", "password")
+        for user in (kept, deleted):
+            self.object_mapper.add(user)
+            user.email = "new_" + user.email
+            self.object_mapper.add(user)
+        self.object_mapper.remove(deleted)
+
+        result = self.change_log.compact(retention_seconds=0)
+        self.assertEqual(result, {"superseded": 3, "deletions": 0})
+        self.assertEqual(self._operations(), [("user", "update"), ("user", "delete")])
+
+        consumer.consume(lambda batch: None)
+        self.assertEqual(self.change_log.compact(retention_seconds=0)["deletions"], 1)
+        self.assertEqual(self._operations(), [("user", "update")])
+
+    def test_partitioned_reviews_are_logged(self):
+        """tests that review changes are logged and consumed from their shards, and that moved reviews are not deleted"""
+        data_store = PartitionedDataStore.enable("test_change_log_partitioned.db", 2)
+        try:
+            object_mapper = ObjectMapper("test_change_log_partitioned.db")
+            consumer = ChangeLogConsumer("test_change_log_partitioned.db", "reviews", from_start=False)
+            user = User("test_user", "test_user@example.com", "test_password")
+            object_mapper.add(user)
+            topics = [Topic(f"topic{i}", "description", user.id) for i in range(4)]
+            reviews = []
+            for topic in topics:
+                object_mapper.add(topic)
+                reviews.append(Review("text", user.id, topic.id))
+                object_mapper.add(reviews[-1])
+            reviews[0].review_text = "edited"
+            object_mapper.add(reviews[0])
+            object_mapper.remove(reviews[1])
+
+            changes = []
+            consumer.consume(changes.extend)
+            logged = [(change.shard, change.seq) for change in changes if change.table_name == "review"]
+            self.assertEqual(logged, sorted(logged))
+            shard = {review.id: data_store.shards.index(data_store.shard_for(review.topic_id)) for review in reviews}
+            expected = [(shard[review.id], review.id, "insert") for review in reviews]
+            expected += [(shard[reviews[0].id], reviews[0].id, "update"), (shard[reviews[1].id], reviews[1].id, "delete")]
+            self.assertCountEqual([(change.shard, change.row_id, change.operation) for change in changes
+                                   if change.table_name == "review"], expected)
+
+            result = data_store.rebalance(3)
+            moved = ChangeLogConsumer("test_change_log_partitioned.db", "reviews").poll()
+            self.assertEqual([change.operation for change in moved], ["insert"] * result["moved"])
+        finally:
+            PartitionedDataStore.disable("test_change_log_partitioned.db")
+
+    @classmethod
+    def tearDownClass(cls):
+        # After all tests, delete the test databases
+        for name in os.listdir("src/database"):
+            if name.startswith("test_change_log"):
+                os.remove(os.path.join("src/database", name))
@@ -1,7 +1,11 @@
 """This module contains unit tests for the data_store.py module."""
+import datetime
 import os
+import sqlite3
+import threading
+import time
 from unittest import TestCase
-from src.data_management.data_store import DataStore
+from src.data_management.data_store import ContentionPolicy, DatabaseLocked, DataStore, SQLiteConnection
 
 class TestDataStore(TestCase):
     """Unit tests for the DataStore class."""
@@ -95,6 +99,157 @@ class TestDataStore(TestCase):
         """tests that data cannot be deleted from an invalid table"""
         self.assertFalse(self.data_store.delete(1, "user"))
 
+    def _session(self, id, expires_at, is_active=1):
+        """returns the data of a session expiring at the given time"""
+        return {"id": id, "user_id": None, "created_at": expires_at - datetime.timedelta(hours=1),
+                "expires_at": expires_at, "last_activity_at": expires_at, "is_active": is_active}
+
+    def test_timestamps_are_stored_as_epoch_milliseconds(self):
+        """tests that datetimes are stored as integers and loaded back as datetimes"""
+        expires_at = datetime.datetime(2024, 5, 1, 12, 30, 15, 250000)
+        self.assertTrue(self.data_store.save(self._session("1", expires_at), "session"))
+        with SQLiteConnection(self.data_store.db_path) as connection:
+            stored = connection.execute("SELECT expires_at FROM session").fetchone()[0]
+        self.assertEqual(stored, round(expires_at.timestamp() * 1000))
+        self.assertEqual(self.data_store.load("session", "1")[0]["expires_at"], expires_at)
+        self.assertEqual(self.data_store.load_rows("session", columns=["expires_at"]), [(expires_at,)])
+
+    def test_load_and_delete_range(self):
+        """tests that range queries compare timestamps and scan the expires_at indexes"""
+        now = datetime.datetime(2024, 5, 1, 12, 0)
+        for i, hours in enumerate((-2, -1, 1, 2)):
+            self.data_store.save(self._session(str(i), now + datetime.timedelta(hours=hours), is_active=i % 2), "session")
+        active = self.data_store.load_range("session", "expires_at", after=now, columns=["id"], equals={"is_active": 1})
+        self.assertEqual(active, [("3",)])
+        with SQLiteConnection(self.data_store.db_path) as connection:
+            sweep = connection.execute("EXPLAIN QUERY PLAN SELECT id FROM session WHERE expires_at <= ?", (0,)).fetchone()
+            lookup = connection.execute("EXPLAIN QUERY PLAN SELECT id FROM session WHERE is_active = ? AND expires_at > ?",
+                                        (1, 0)).fetchone()
+        self.assertIn("USING INDEX session_expires_at (expires_at<?)", sweep[3])
+        self.assertIn("USING INDEX session_active (is_active=? AND expires_at>?)", lookup[3])
+        self.assertEqual(self.data_store.delete_range("session", "expires_at", before=now), 2)
+        self.assertEqual(sorted(row[0] for row in self.data_store.load_rows("session", columns=["id"])), ["2", "3"])
+
+    def test_migrate_text_timestamps(self):
+        """tests that sessions stored as ISO text by an older version are converted once"""
+        expires_at = datetime.datetime(2024, 5, 1, 12, 30, 15)
+        with SQLiteConnection(self.data_store.db_path) as connection:
+            connection.execute("INSERT INTO session VALUES (?, NULL, ?, ?, ?, 1)",
+                               ("1", str(expires_at), str(expires_at), str(expires_at)))
+            connection.execute("PRAGMA user_version = 0")
+        DataStore("test.db")
+        with SQLiteConnection(self.data_store.db_path) as connection:
+            self.assertEqual(connection.execute("PRAGMA user_version").fetchone()[0], DataStore.SCHEMA_VERSION)
+            self.assertEqual(connection.execute("SELECT typeof(expires_at) FROM session").fetchone()[0], "integer")
+        self.assertEqual(self.data_store.load("session", "1")[0]["expires_at"], expires_at)
+
+    def test_save_updates_given_columns(self):
+        """tests that saving an existing row only updates the given columns, in place"""
+        user_data = {"id": "1", "username": "test_user_1", "hashed_password": "test_password_1",
+                     "email": "test_email_1@example.com"}
+        self.assertTrue(self.data_store.save(user_data, "user"))
+        changed = dict(user_data, hashed_password="changed", email="changed@example.com")
+        self.assertTrue(self.data_store.save(changed, "user", ("email",)))
+        stored = self.data_store.load("user", "1")[0]
+        self.assertEqual((stored["email"], stored["hashed_password"]), ("changed@example.com", "test_password_1"))
+        query, _ = self.data_store._construct_insert_query("user", tuple(changed), ("email",))
+        self.assertTrue(query.endswith("ON CONFLICT (id) DO UPDATE SET email = excluded.email"))
+
+    def test_migrate_replace_triggers(self):
+        """tests that the change_log insert triggers written for REPLACE INTO are created again for upserts"""
+        with SQLiteConnection(self.data_store.db_path) as connection:
+            connection.execute("DROP TRIGGER user_log_insert")
+            connection.execute("CREATE TRIGGER user_log_insert BEFORE INSERT ON user BEGIN SELECT 1; END")
+            connection.execute("PRAGMA user_version = 2")
+        DataStore("test.db")
+        with SQLiteConnection(self.data_store.db_path) as connection:
+            sql = connection.execute("SELECT sql FROM sqlite_master WHERE name = 'user_log_insert'").fetchone()[0]
+        self.assertIn("AFTER INSERT ON user", sql)
+
+    def _lock_database(self):
+        """returns a connection holding the write lock of the test database"""
+        connection = sqlite3.connect(self.data_store.db_path, isolation_level=None, check_same_thread=False)
+        connection.execute("BEGIN EXCLUSIVE")
+        return connection
+
+    def test_locked_database_raises(self):
+        """tests that a save failing on a lock is retried, counted, then raised as DatabaseLocked rather than False"""
+        policy = SQLiteConnection.contention
+        SQLiteConnection.contention = ContentionPolicy(busy_timeout=0.01, retries=2, backoff=0.001)
+        locker = self._lock_database()
+        try:
+            with self.assertRaises(DatabaseLocked):
+                self.data_store.save({"id": "1", "username": "u", "hashed_password": "p", "email": "e"}, "user")
+            self.assertEqual(SQLiteConnection.contention.lock_waits, 2)
+            self.assertEqual(SQLiteConnection.contention.lock_timeouts, 1)
+            self.assertGreater(SQLiteConnection.contention.lock_wait_seconds, 0.02)
+        finally:
+            locker.rollback()
+            locker.close()
+            SQLiteConnection.contention = policy
+
+    def test_lock_released_during_backoff(self):
+        """tests that a save succeeds once the lock is released while it is being retried"""
+        policy = SQLiteConnection.contention
+        SQLiteConnection.contention = ContentionPolicy(busy_timeout=0.01, retries=50, backoff=0.005, max_backoff=0.02)
+        locker = self._lock_database()
+        release = threading.Timer(0.1, locker.rollback)
+        release.start()
+        try:
+            self.assertTrue(self.data_store.save({"id": "1", "username": "u", "hashed_password": "p", "email": "e"}, "user"))
+            self.assertGreater(SQLiteConnection.contention.lock_waits, 0)
+            self.assertEqual(SQLiteConnection.contention.lock_timeouts, 0)
+        finally:
+            release.join()
+            locker.close()
+            SQLiteConnection.contention = policy
+
+    def test_deadline_bounds_lock_waits(self):
+        """tests that the deadline of the current thread cuts the busy timeout and the retries short"""
+        locker = self._lock_database()
+        try:
+            started = time.perf_counter()
+            with ContentionPolicy.deadline(0.1), ContentionPolicy.deadline(10):
+                self.assertLessEqual(ContentionPolicy.remaining(), 0.1)
+                with self.assertRaises(DatabaseLocked):
+                    self.data_store.delete("1", "user")
+            self.assertLess(time.perf_counter() - started, 1.0)
+            self.assertIsNone(ContentionPolicy.remaining())
+        finally:
+            locker.rollback()
+            locker.close()
+
+    def test_in_memory_database(self):
+        """tests that an in-memory database keeps its data between calls until it is released"""
+        uri = "file:test_data_store_memory?mode=memory&cache=shared"
+        DataStore(uri).save({"id": "1", "username": "u", "hashed_password": "p", "email": "e"}, "user")
+        self.assertEqual(DataStore(uri).load("user", "1")[0]["username"], "u")
+        self.assertFalse(os.path.exists(uri))
+        DataStore.release(uri)
+        self.assertEqual(DataStore(uri).load("user"), [])
+        DataStore.release(uri)
+        self.assertEqual(DataStore.resolve(":memory:"), "file:feedback_flow?mode=memory&cache=shared")
+
+    def test_absolute_path_snapshot_and_restore(self):
+        """tests that a database can live anywhere, and be copied to a file and back"""
+        path = os.path.abspath("src/database/test_data_store_dir/absolute.db")
+        snapshot_path = "src/database/test_data_store_snapshot.db"
+        uri = "file:test_data_store_restored?mode=memory&cache=shared"
+        try:
+            data_store = DataStore(path)
+            self.assertEqual(data_store.db_path, path)
+            data_store.save({"id": "1", "username": "u", "hashed_password": "p", "email": "e"}, "user")
+            data_store.snapshot(snapshot_path)
+            restored = DataStore(uri)
+            restored.restore(snapshot_path)
+            self.assertEqual(restored.load("user", "1")[0]["username"], "u")
+            self.assertRaises(FileNotFoundError, restored.restore, "src/database/test_data_store_missing.db")
+        finally:
+            DataStore.release(uri)
+            os.remove(path)
+            os.rmdir(os.path.dirname(path))
+            os.remove(snapshot_path)
+
     @classmethod
     def tearDownClass(cls):
         os.remove("src/database/test.db")
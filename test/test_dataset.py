@@ -0,0 +1,63 @@
+"""This module contains unit tests for the benchmarks/dataset.py module."""
+import json
+import os
+import sqlite3
+from unittest import TestCase
+from benchmarks.dataset import DatasetGenerator, parse_size
+
+class TestDatasetGenerator(TestCase):
+    """Unit tests for the DatasetGenerator class."""
+    db_path = "test_dataset.db"
+
+    def _dump(self):
+        """returns every row of every table, in a stable order"""
+        connection = sqlite3.connect("src/database/" + self.db_path)
+        try:
+            return {table: connection.execute(f"SELECT * FROM {table} ORDER BY id").fetchall()
+                    for table in ("user", "topic", "session", "review")}
+        finally:
+            connection.close()
+
+    def test_counts(self):
+        """tests that the requested number of rows is written"""
+        DatasetGenerator(users=7, topics=3, reviews=50, session_fraction=1.0).write(self.db_path)
+        dump = self._dump()
+        self.assertEqual(len(dump["user"]), 7)
+        self.assertEqual(len(dump["topic"]), 3)
+        self.assertEqual(len(dump["session"]), 7)
+        self.assertEqual(len(dump["review"]), 50)
+
+    def test_reproducible(self):
+        """tests that the same seed produces identical data and a different seed does not"""
+        DatasetGenerator.for_reviews(200, seed=3).write(self.db_path)
+        first = self._dump()
+        DatasetGenerator.for_reviews(200, seed=3).write(self.db_path)
+        self.assertEqual(first, self._dump())
+        DatasetGenerator.for_reviews(200, seed=4).write(self.db_path)
+        self.assertNotEqual(first, self._dump())
+
+    def test_ratings_are_valid(self):
+        """tests that every review has four ratings between 1 and 10"""
+        DatasetGenerator.for_reviews(200).write(self.db_path)
+        for review in self._dump()["review"]:
+            ratings = json.loads(review[5])
+            self.assertEqual(len(ratings), 4)
+            self.assertTrue(all(1 <= rating <= 10 for rating in ratings))
+
+    def test_hot_topic_skew(self):
+        """tests that a high skew concentrates reviews on the first topic"""
+        summary = DatasetGenerator(users=10, topics=10, reviews=500, hot_topic_skew=2.0).write(self.db_path)
+        # the dump holds the ids in their stored form, 16 byte blobs
+        hot_topic_id = bytes.fromhex(summary["topics"][0][0])
+        hot_reviews = [review for review in self._dump()["review"] if review[2] == hot_topic_id]
+        self.assertGreater(len(hot_reviews), 500 / 10 * 2)
+
+    def test_parse_size(self):
+        """tests that human readable sizes are converted to row counts"""
+        self.assertEqual(parse_size("1k"), 1000)
+        self.assertEqual(parse_size("1M"), 1000000)
+
+    @classmethod
+    def tearDownClass(cls):
+        # After all tests, delete the test database
+        os.remove("src/database/" + cls.db_path)
@@ -0,0 +1,31 @@
+"""This module contains unit tests for the deadlines.py module."""
+from unittest import TestCase
+from bottle import Bottle
+from src.data_management.data_store import ContentionPolicy, DatabaseLocked
+from src.server.deadlines import DeadlinePlugin
+from test.wsgi import call
+
+
+class TestDeadlinePlugin(TestCase):
+    """Unit tests for the DeadlinePlugin class."""
+    def setUp(self):
+        self.app = Bottle()
+        self.deadlines = DeadlinePlugin(timeout=0.5, retry_after=2)
+        self.app.install(self.deadlines)
+
+    def test_requests_have_a_deadline(self):
+        """tests that the database calls of a request see its deadline, and later calls do not"""
+        self.app.route("/remaining", callback=lambda: str(ContentionPolicy.remaining()))
+        response = call(self.app, "/remaining")
+        self.assertTrue(0 < float(response.text) <= 0.5)
+        self.assertIsNone(ContentionPolicy.remaining())
+
+    def test_locked_database_is_503(self):
+        """tests that a request finding the database locked is answered with 503 and Retry-After"""
+        def locked():
+            raise DatabaseLocked("database is locked")
+        self.app.route("/locked", callback=locked)
+        status, headers, _ = call(self.app, "/locked")
+        self.assertTrue(status.startswith("503"))
+        self.assertEqual(headers["Retry-After"], "2")
+        self.assertEqual(self.deadlines.rejected, 1)
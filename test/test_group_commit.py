@@ -0,0 +1,97 @@
+"""This module contains unit tests for the group_commit.py module."""
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+from src.app_logic.app_logic import User, Session
+from src.data_management.data_store import ContentionPolicy, DatabaseLocked, DataStore
+from src.data_management.group_commit import GroupCommitWriter
+from src.data_management.object_mapper import ObjectMapper
+
+class TestGroupCommitWriter(TestCase):
+    """Unit tests for the GroupCommitWriter class."""
+    @classmethod
+    def setUpClass(cls):
+        # Create a new test database for this test suite
+        cls.data_store = DataStore("test_group_commit.db")
+        cls.object_mapper = ObjectMapper("test_group_commit.db")
+
+    def setUp(self):
+        # Before each test, clear all tables and route the writes through a new writer
+        self.data_store.clear_tables()
+        self.writer = GroupCommitWriter("test_group_commit.db", window_ms=20).install()
+
+    def tearDown(self):
+        self.writer.uninstall()
+
+    def test_concurrent_writes_are_grouped(self):
+        """tests that writes arriving together are committed in fewer transactions"""
+        users = [User(f"user{i}", f"user{i}@example.com", "password") for i in range(20)]
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            results = list(executor.map(self.object_mapper.add, users))
+        self.assertTrue(all(results))
+        self.assertEqual(self.writer.operations, 20)
+        self.assertLess(self.writer.commits, 20)
+        self.assertEqual(len(self.object_mapper.get(User)), 20)
+
+    def test_failed_write_does_not_fail_its_group(self):
+        """tests that a write violating a constraint is rolled back on its own"""
+        user = User("user", "user@example.com", "password")
+        self.object_mapper.add(user)
+        query, columns = self.data_store._construct_insert_query("session")
+        orphan = Session(user_id="no such user")
+        params = [self.data_store._adapt("session", columns, (session.data[c] for c in columns))
+                  for session in (Session(user.id), orphan, Session(user.id))]
+        futures = [self.writer.submit(query, session_params) for session_params in params]
+        self.assertEqual(futures[0].result(), 1)
+        with self.assertRaises(Exception):
+            futures[1].result()
+        self.assertEqual(futures[2].result(), 1)
+        self.assertEqual(len(self.object_mapper.get(Session)), 2)
+
+    def test_save_and_delete_results(self):
+        """tests that DataStore reports the outcome of writes made through the writer"""
+        user = User("user", "user@example.com", "password")
+        self.assertTrue(self.data_store.save(user.data, "user"))
+        self.assertFalse(self.data_store.save({"id": "1"}, "user"))
+        self.assertTrue(self.data_store.delete(user.id, "user"))
+        self.assertFalse(self.data_store.delete(user.id, "user"))
+
+    def test_writes_are_bounded_by_the_deadline(self):
+        """tests that a write still queued at its thread's deadline is cancelled and reported as locked"""
+        first, second = (User(f"user{i}", f"user{i}@example.com", "password") for i in range(2))
+        query, columns = self.data_store._construct_insert_query("user")
+        blocker = sqlite3.connect(self.data_store.db_path)
+        blocker.execute("BEGIN IMMEDIATE")
+        try:
+            # the writer thread takes the first write and waits for the lock the blocker holds
+            future = self.writer.submit(query, self.data_store._adapt("user", columns, (first.data[c] for c in columns)))
+            time.sleep(0.1)
+            started = time.monotonic()
+            with ContentionPolicy.deadline(0.05):
+                with self.assertRaises(DatabaseLocked):
+                    self.data_store.save(second.data, "user")
+            self.assertLess(time.monotonic() - started, 1)
+        finally:
+            blocker.rollback()
+            blocker.close()
+        self.assertEqual(future.result(), 1)
+        self.writer.uninstall()
+        self.assertEqual([user.id for user in self.object_mapper.get(User)], [first.id])
+        self.assertEqual(self.writer.operations, 1)
+
+    def test_uninstall_commits_queued_writes(self):
+        """tests that stopping the writer commits what is queued and restores direct writes"""
+        user = User("user", "user@example.com", "password")
+        query, columns = self.data_store._construct_insert_query("user")
+        future = self.writer.submit(query, self.data_store._adapt("user", columns, (user.data[c] for c in columns)))
+        self.writer.uninstall()
+        self.assertEqual(future.result(), 1)
+        self.assertNotIn(self.data_store.db_path, DataStore.writers)
+        self.assertTrue(self.object_mapper.remove(user))
+
+    @classmethod
+    def tearDownClass(cls):
+        # After all tests, delete the test database
+        os.remove("src/database/test_group_commit.db")
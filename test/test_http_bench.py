@@ -0,0 +1,43 @@
+"""This module contains unit tests for the benchmarks/http_bench.py module."""
+import json
+import os
+from unittest import TestCase
+from benchmarks import http_bench
+
+class TestHTTPBench(TestCase):
+    """Unit tests for the HTTP benchmark harness."""
+    @classmethod
+    def setUpClass(cls):
+        cls.report = http_bench.run_benchmarks(sizes=["30"], concurrency=(1, 2), requests=4, rebuild=True)
+
+    def test_percentile(self):
+        """tests nearest-rank percentiles"""
+        values = list(range(1, 101))
+        self.assertEqual(http_bench.percentile(values, 50), 50)
+        self.assertEqual(http_bench.percentile(values, 99), 99)
+        self.assertEqual(http_bench.percentile([], 50), 0.0)
+
+    def test_every_route_is_measured(self):
+        """tests that every route and concurrency level produces a result"""
+        measured = {(result["route"], result["concurrency"]) for result in self.report["results"]}
+        expected = {(route, level) for route in http_bench.ROUTES for level in (1, 2)}
+        self.assertEqual(measured, expected)
+
+    def test_routes_succeed(self):
+        """tests that the scenarios hit the routes successfully rather than erroring"""
+        for result in self.report["results"]:
+            self.assertEqual(result["requests"], 4)
+            for status in result["status_counts"]:
+                self.assertIn(status, ("200", "302", "303"), result["route"])
+
+    def test_report_is_json(self):
+        """tests that the report is machine-readable and contains the latency percentiles"""
+        report = json.loads(json.dumps(self.report))
+        for result in report["results"]:
+            self.assertEqual(set(result["latency_ms"]), {"mean", "p50", "p95", "p99", "max"})
+            self.assertLessEqual(result["latency_ms"]["p50"], result["latency_ms"]["p99"])
+
+    @classmethod
+    def tearDownClass(cls):
+        # After all tests, delete the benchmark database
+        os.remove("src/database/bench_30.db")
@@ -0,0 +1,236 @@
+"""This module contains unit tests for the job_queue.py module."""
+import datetime
+import json
+import threading
+from unittest import TestCase
+from bottle import cookie_encode
+from src.app_logic.app_logic import User, Topic, Review, Session
+from src.data_management.data_store import DataStore, SQLiteConnection
+from src.data_management.job_queue import JobQueue, JobWorkers
+from src.data_management.object_mapper import ObjectMapper
+from src.user_management.session_management import SessionManager
+from src.user_management.session_tokens import SessionTokens
+from src.user_management.user_info import UserInfo
+from test.wsgi import call
+
+DB_PATH = "file:test_job_queue?mode=memory&cache=shared"
+
+
+class TestJobQueue(TestCase):
+    """Unit tests for the JobQueue and JobWorkers classes."""
+    def setUp(self):
+        self.now = 1000.0
+        self.queue = JobQueue(DB_PATH, retry_delay=10, clock=lambda: self.now)
+        with SQLiteConnection(self.queue.db_path) as connection:
+            connection.execute("DELETE FROM job")
+
+    def test_claim_order(self):
+        """tests that jobs are claimed by priority, then by age, and not before their delay"""
+        low = self.queue.enqueue("kind", {"n": 1})
+        delayed = self.queue.enqueue("kind", {"n": 2}, priority=5, delay=30)
+        self.now += 1
+        high = self.queue.enqueue("kind", {"n": 3}, priority=5)
+        self.assertEqual(self.queue.claim("w").id, high)
+        self.assertEqual(self.queue.claim("w").id, low)
+        self.assertIsNone(self.queue.claim("w"))
+        self.now += 30
+        job = self.queue.claim("w")
+        self.assertEqual((job.id, job.payload, job.attempts), (delayed, {"n": 2}, 1))
+
+    def test_complete(self):
+        """tests that a completed job keeps its result and is counted as done"""
+        job_id = self.queue.enqueue("kind")
+        job = self.queue.claim("w")
+        self.assertEqual(self.queue.counts(), {"queued": 0, "running": 1, "done": 0, "failed": 0})
+        self.assertTrue(self.queue.complete(job, {"rows": 3}))
+        state = self.queue.get(job_id)
+        self.assertEqual((state["status"], state["result"], state["worker"]), ("done", {"rows": 3}, "w"))
+        self.assertIsNone(self.queue.get(job_id + 1))
+        self.now += 3600
+        self.assertEqual(self.queue.purge(older_than=60), 1)
+
+    def test_retries_with_backoff(self):
+        """tests that a failed job is retried after a growing delay, then marked failed"""
+        job_id = self.queue.enqueue("kind", max_attempts=2)
+        self.assertTrue(self.queue.fail(self.queue.claim("w"), "first"))
+        self.assertIsNone(self.queue.claim("w"))
+        self.now += 10
+        job = self.queue.claim("w")
+        self.assertEqual(job.attempts, 2)
+        self.queue.fail(job, "second")
+        state = self.queue.get(job_id)
+        self.assertEqual((state["status"], state["attempts"], state["error"]), ("failed", 2, "second"))
+
+    def test_visibility_timeout(self):
+        """tests that a job whose lease expired is claimed again and its first worker can no longer finish it"""
+        job_id = self.queue.enqueue("kind", max_attempts=2)
+        first = self.queue.claim("first", visibility_timeout=60)
+        self.now += 30
+        self.assertIsNone(self.queue.claim("second"))
+        self.assertTrue(self.queue.extend(first, 60))
+        self.now += 61
+        second = self.queue.claim("second", visibility_timeout=60)
+        self.assertEqual((second.id, second.attempts), (job_id, 2))
+        self.assertFalse(self.queue.complete(first, "stale"))
+        self.now += 61
+        self.assertIsNone(self.queue.claim("third"))
+        self.assertEqual(self.queue.get(job_id)["status"], "failed")
+
+    def test_workers(self):
+        """tests that a pool of workers runs every job exactly once"""
+        queue = JobQueue(DB_PATH)
+        ran = []
+        lock = threading.Lock()
+        done = threading.Event()
+
+        def handler(payload):
+            with lock:
+                ran.append(payload["n"])
+                if len(ran) == 20:
+                    done.set()
+            return payload["n"] * 2
+
+        workers = JobWorkers(queue, {"double": handler}, workers=4, poll_interval=0.05).start()
+        try:
+            job_ids = [queue.enqueue("double", {"n": n}) for n in range(20)]
+            self.assertTrue(done.wait(10))
+        finally:
+            workers.stop()
+        self.assertEqual(sorted(ran), list(range(20)))
+        self.assertEqual(queue.get(job_ids[7])["result"], 14)
+        self.assertEqual(workers.completed, 20)
+
+    def test_unknown_kind_and_errors(self):
+        """tests that jobs without a handler fail at once and raising handlers are retried"""
+        workers = JobWorkers(self.queue, {"broken": lambda payload: 1 / 0})
+        unknown = self.queue.enqueue("unknown")
+        broken = self.queue.enqueue("broken")
+        self.assertTrue(workers.run_once())
+        self.assertTrue(workers.run_once())
+        self.assertFalse(workers.run_once())
+        self.assertEqual(self.queue.get(unknown)["status"], "failed")
+        self.assertEqual(self.queue.get(broken)["status"], "queued")
+        self.assertIn("ZeroDivisionError", self.queue.get(broken)["error"])
+        self.assertEqual(workers.failed, 2)
+
+    def test_web_server_jobs(self):
+        """tests that the web server removes objects inline without workers, and through the queue with them"""
+        from src.server.server_app import WebServer
+        object_mapper = ObjectMapper(DB_PATH)
+        user = User("job_user", "job_user@example.com", "test_password")
+        object_mapper.add(user)
+        topic = Topic("Job topic", "description", user.id)
+        object_mapper.add(topic)
+        review = Review("text", user.id, topic.id)
+        object_mapper.add(review)
+        server = WebServer()
+        try:
+            self.assertIsNone(server.enqueue("remove", {"db_path": DB_PATH, "type": "review", "id": review.id}))
+            self.assertFalse(object_mapper.get(Review, id=review.id))
+
+            server.jobs = self.queue
+            job_id = server.enqueue("remove", {"db_path": DB_PATH, "type": "user", "id": user.id})
+            self.assertTrue(object_mapper.get(Topic, id=topic.id))
+            JobWorkers(self.queue, server.job_handlers).run_once()
+            self.assertEqual(self.queue.get(job_id)["result"], {"removed": True})
+            self.assertFalse(object_mapper.get(Topic, id=topic.id))
+        finally:
+            server.default_suggestions.uninstall()
+            server.default_notifications.uninstall()
+
+    def test_job_status_is_private(self):
+        """tests that a job is only shown to the user who caused it"""
+        from src.server.server_app import WebServer
+        server = WebServer()
+        server.jobs = self.queue
+        server.session_tokens = SessionTokens(b"k" * 32)
+        try:
+            own = server.enqueue("remove", {"db_path": DB_PATH, "type": "review", "id": "x", "owner": "user_1"})
+            system = server.enqueue("expire_sessions", {"db_path": DB_PATH})
+            response = call(server, f"/jobs/{own}", cookie=f"session_id={server.session_tokens.issue('user_1')}")
+            self.assertEqual((response.status, json.loads(response.body)["status"]), ("200 OK", "queued"))
+            for job_id in (own, system, system + 1):
+                status = call(server, f"/jobs/{job_id}", cookie=f"session_id={server.session_tokens.issue('user_2')}").status
+                self.assertTrue(status.startswith("404"))
+        finally:
+            server.default_suggestions.uninstall()
+            server.default_notifications.uninstall()
+
+    def test_job_status_is_private_with_session_cookies(self):
+        """tests that a signed session cookie only shows the jobs of its user, and nothing once its session is gone"""
+        from src.server.server_app import WebServer
+        server = WebServer()
+        server.jobs = self.queue
+        server.database_path = DB_PATH
+        try:
+            user = User("cookie_user", "cookie_user@example.com", "test_password")
+            ObjectMapper(DB_PATH).add(user)
+            session = SessionManager(DB_PATH).create_session(user.id)
+            own = server.enqueue("remove", {"db_path": DB_PATH, "type": "review", "id": "x", "owner": user.id})
+            system = server.enqueue("expire_sessions", {"db_path": DB_PATH})
+            cookie = f"session_id={cookie_encode(('session_id', session.id), server.secret).decode()}"
+            self.assertEqual(call(server, f"/jobs/{own}", cookie=cookie).status, "200 OK")
+            self.assertTrue(call(server, f"/jobs/{system}", cookie=cookie).status.startswith("404"))
+            forged = f"session_id={cookie_encode(('session_id', 'no-such-session'), server.secret).decode()}"
+            for job_id in (own, system):
+                response = call(server, f"/jobs/{job_id}", cookie=forged)
+                self.assertTrue(response.headers["Location"].endswith("/login"))
+        finally:
+            server.default_suggestions.uninstall()
+            server.default_notifications.uninstall()
+
+    def test_session_cleanup_keeps_logged_in_users(self):
+        """tests that logging in extends the registration session past the sweep, and a swept session is logged out"""
+        from src.server.server_app import WebServer
+        server = WebServer()
+        server.jobs = self.queue
+        server.database_path = DB_PATH
+        try:
+            user_info = UserInfo(DB_PATH)
+            user_info.register("sweep_user", "sweep_user@example.com", "test_password")
+            user = [user for user in user_info.object_mapper.get(User) if user.username == "sweep_user"][0]
+            # registered two hours ago, so the registration session has expired
+            session = [session for session in user_info.object_mapper.get(Session) if session.user_id == user.id][0]
+            session.expires_at = datetime.datetime.now() - datetime.timedelta(hours=1)
+            user_info.session_manager.update_session(session)
+
+            response = call(server, "/login", "POST", {"username": "sweep_user", "password": "test_password"})
+            cookie = response.headers["Set-Cookie"].split(";")[0]
+            server.enqueue("expire_sessions", {"db_path": DB_PATH})
+            JobWorkers(self.queue, server.job_handlers).run_once()
+            call(server, "/topics/create", "POST", {"name": "Swept", "description": "d"}, cookie=cookie)
+            topics = [topic for topic in user_info.object_mapper.get(Topic) if topic.name == "Swept"]
+            self.assertEqual([topic.user_id for topic in topics], [user.id])
+
+            user_info.session_manager.expire_sessions(datetime.datetime.now() + datetime.timedelta(hours=2))
+            response = call(server, "/topics/create", "POST", {"name": "Swept", "description": "d"}, cookie=cookie)
+            self.assertTrue(response.headers["Location"].endswith("/login"))
+            self.assertEqual(len([topic for topic in user_info.object_mapper.get(Topic) if topic.name == "Swept"]), 1)
+        finally:
+            server.default_suggestions.uninstall()
+            server.default_notifications.uninstall()
+
+    def test_session_cleanup_is_rescheduled(self):
+        """tests that the expire_sessions job queues its next run, and only with workers"""
+        from src.server.server_app import WebServer
+        server = WebServer()
+        try:
+            self.assertIsNone(server.enqueue("expire_sessions", {"db_path": DB_PATH}))
+            self.assertEqual(self.queue.pending("expire_sessions"), 0)
+            server.jobs = self.queue
+            server.enqueue("expire_sessions", {"db_path": DB_PATH})
+            workers = JobWorkers(self.queue, server.job_handlers)
+            self.assertTrue(workers.run_once())
+            self.assertEqual(self.queue.pending("expire_sessions"), 1)
+            self.assertFalse(workers.run_once())
+            self.now += server.session_cleanup_interval
+            self.assertTrue(workers.run_once())
+            self.assertEqual((self.queue.pending("expire_sessions"), workers.completed), (1, 2))
+        finally:
+            server.default_suggestions.uninstall()
+            server.default_notifications.uninstall()
+
+    @classmethod
+    def tearDownClass(cls):
+        # After all tests, drop the in-memory test database
+        DataStore.release(DB_PATH)
@@ -0,0 +1,80 @@
+"""This module contains unit tests for the maintenance.py module."""
+import os
+import shutil
+import sqlite3
+from unittest import TestCase
+from src.app_logic.app_logic import User
+from src.data_management.data_store import SQLiteConnection
+from src.data_management.maintenance import MaintenanceScheduler
+from src.data_management.object_mapper import ObjectMapper
+
+class TestMaintenanceScheduler(TestCase):
+    """Unit tests for the MaintenanceScheduler class."""
+    db_path = "test_maintenance.db"
+    backup_dir = "src/database/test_backups"
+
+    def setUp(self):
+        # a new database for every test, with no statistics and no free pages yet
+        self.object_mapper = ObjectMapper(self.db_path)
+        self.scheduler = MaintenanceScheduler(self.db_path, vacuum_step_pages=4, backup_dir=self.backup_dir,
+                                              keep_backups=2)
+        self.users = [User(f"user{i}", f"user{i}@example.com", "x" * 2000) for i in range(100)]
+        for user in self.users:
+            self.object_mapper.add(user)
+
+    def _count(self, path: str, query: str):
+        with SQLiteConnection(path) as connection:
+            return connection.execute(query).fetchone()[0]
+
+    def test_incremental_vacuum_reclaims_free_pages(self):
+        """tests that the pages freed by deletes are given back to the file system"""
+        path = self.object_mapper.data_store.db_path
+        self.object_mapper.data_store.clear_tables()
+        size = os.path.getsize(path)
+        self.assertGreater(self._count(path, "PRAGMA freelist_count"), 0)
+        report = self.scheduler.incremental_vacuum(path)
+        self.assertEqual(report["free_pages"], 0)
+        self.assertGreater(report["reclaimed_bytes"], 0)
+        self.assertEqual(os.path.getsize(path), size - report["reclaimed_bytes"])
+
+    def test_vacuum_budget(self):
+        """tests that incremental vacuum stops once its time budget is spent"""
+        self.object_mapper.data_store.clear_tables()
+        self.scheduler.vacuum_budget = 0
+        report = self.scheduler.incremental_vacuum(self.object_mapper.data_store.db_path)
+        self.assertEqual(report["freed_pages"], 0)
+        self.assertGreater(report["free_pages"], 0)
+
+    def test_optimize(self):
+        """tests that statistics are collected on the first run and refreshed afterwards"""
+        path = self.object_mapper.data_store.db_path
+        self.assertTrue(self.scheduler.optimize(path)["analyzed"])
+        self.assertGreater(self._count(path, "SELECT COUNT(*) FROM sqlite_stat1"), 0)
+        self.assertFalse(self.scheduler.optimize(path)["analyzed"])
+
+    def test_backups(self):
+        """tests that a backup holds every row and that only the newest backups are kept"""
+        reports = [self.scheduler.run_once() for _ in range(3)]
+        backups = sorted(os.listdir(self.backup_dir))
+        self.assertEqual(len(backups), 2)
+        latest = reports[-1]["files"][self.object_mapper.data_store.db_path]["backup"]["path"]
+        self.assertEqual(os.path.basename(latest), backups[-1])
+        connection = sqlite3.connect(latest)
+        try:
+            self.assertEqual(connection.execute("SELECT COUNT(*) FROM user").fetchone()[0], len(self.users))
+        finally:
+            connection.close()
+
+    def test_scheduled_runs(self):
+        """tests that the background thread runs maintenance until stopped"""
+        self.scheduler.backup_dir = None
+        self.scheduler.interval = 0.01
+        self.scheduler.start()
+        while not self.scheduler.reports:
+            self.scheduler.stopped.wait(0.01)
+        self.scheduler.stop()
+        self.assertIn("vacuum", self.scheduler.reports[0]["files"][self.object_mapper.data_store.db_path])
+
+    def tearDown(self):
+        shutil.rmtree(self.backup_dir, ignore_errors=True)
+        os.remove("src/database/" + self.db_path)
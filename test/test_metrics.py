@@ -0,0 +1,84 @@
+"""This module contains unit tests for the metrics.py module."""
+from unittest import TestCase
+from bottle import Bottle, redirect
+from src.data_management.data_store import DataStore, SQLiteConnection
+from src.server.metrics import Histogram, MetricsPlugin
+from test.wsgi import call
+
+
+class TestMetrics(TestCase):
+    """Unit tests for the Histogram and MetricsPlugin classes."""
+    @classmethod
+    def setUpClass(cls):
+        cls.data_store = DataStore("file:test_metrics?mode=memory&cache=shared")
+
+    def setUp(self):
+        self.app = Bottle()
+        self.metrics = MetricsPlugin()
+        self.app.install(self.metrics)
+        self.app.route("/hello", callback=lambda: "hello")
+        self.app.route("/load", callback=lambda: str(self.data_store.load("user")))
+        self.app.route("/away", callback=lambda: redirect("/hello"))
+
+    def tearDown(self):
+        self.app.uninstall(self.metrics)
+
+    def test_histogram(self):
+        """tests that observations land in the right cumulative buckets"""
+        histogram = Histogram((1, 5))
+        for value in (0.5, 1, 3, 10):
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative(), [(1, 2), (5, 3), ("+Inf", 4)])
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(histogram.sum, 14.5)
+
+    def test_requests_are_counted(self):
+        """tests that requests are counted per route and status"""
+        call(self.app, "/hello")
+        call(self.app, "/hello")
+        call(self.app, "/away")
+        output = self.metrics.render()
+        self.assertIn('feedback_flow_http_requests_total{route="/hello",method="GET",status="200"} 2', output)
+        self.assertIn('feedback_flow_http_requests_total{route="/away",method="GET",status="302"} 1', output)
+        self.assertIn('feedback_flow_http_response_size_bytes_sum{route="/hello",method="GET"} 10.0', output)
+        self.assertIn('feedback_flow_http_requests_in_flight{route="/hello",method="GET"} 0', output)
+        self.assertIn('feedback_flow_http_request_duration_seconds_count{route="/hello",method="GET"} 2', output)
+
+    def test_db_calls_are_attributed(self):
+        """tests that DataStore calls are counted against the request that made them"""
+        call(self.app, "/load")
+        call(self.app, "/hello")
+        output = self.metrics.render()
+        self.assertIn('feedback_flow_db_calls_total{route="/load",method="GET"} 1', output)
+        self.assertIn('feedback_flow_db_calls_total{route="/hello",method="GET"} 0', output)
+
+    def test_db_calls_outside_requests_are_ignored(self):
+        """tests that DB calls made outside of a request are not attributed to any route"""
+        call(self.app, "/hello")
+        self.data_store.load("user")
+        self.assertIn('feedback_flow_db_calls_total{route="/hello",method="GET"} 0', self.metrics.render())
+
+    def test_uninstall_removes_listener(self):
+        """tests that uninstalling the plugin stops listening to database calls"""
+        call(self.app, "/hello")
+        self.assertIn(self.metrics.record_db_call, SQLiteConnection.listeners)
+        self.app.uninstall(self.metrics)
+        self.assertNotIn(self.metrics.record_db_call, SQLiteConnection.listeners)
+
+    def test_web_server_metrics_route(self):
+        """tests that the web server exposes its metrics in the Prometheus text format"""
+        from src.server.server_app import WebServer
+        server = WebServer()
+        try:
+            call(server, "/")
+            response = call(server, "/metrics")
+        finally:
+            server.uninstall(server.metrics)
+        self.assertTrue(response.status.startswith("200"))
+        self.assertIn("# TYPE feedback_flow_http_request_duration_seconds histogram", response.text)
+        self.assertIn('feedback_flow_http_requests_total{route="/",method="GET",status="200"} 1', response.text)
+
+    @classmethod
+    def tearDownClass(cls):
+        # After all tests, drop the in-memory test database
+        DataStore.release("file:test_metrics?mode=memory&cache=shared")
@@ -0,0 +1,48 @@
+"""This module contains unit tests for the benchmarks/micro_bench.py module."""
+import os
+import tempfile
+from unittest import TestCase
+from benchmarks import micro_bench
+
+class TestMicroBench(TestCase):
+    """Unit tests for the data layer micro-benchmarks."""
+    @classmethod
+    def setUpClass(cls):
+        cls.report = micro_bench.run_all(review_count=40, number=2, repetitions=2, warmup=1,
+                                         db_path="test_micro_bench.db")
+
+    def test_every_benchmark_runs(self):
+        """tests that every registered benchmark produces a summary"""
+        self.assertEqual(set(self.report["benchmarks"]), set(micro_bench.BENCHMARKS))
+        for result in self.report["benchmarks"].values():
+            self.assertEqual(result["repetitions"], 2)
+            self.assertLessEqual(result["min_us"], result["median_us"])
+            self.assertLessEqual(result["median_us"], result["max_us"])
+
+    def test_summarize(self):
+        """tests the statistical summary of the samples"""
+        summary = micro_bench.summarize([0.001, 0.002, 0.003])
+        self.assertEqual(summary["median_us"], 2000.0)
+        self.assertEqual(summary["min_us"], 1000.0)
+        self.assertEqual(summary["stdev_us"], 1000.0)
+
+    def test_compare_flags_regressions(self):
+        """tests that only benchmarks slower than the threshold are reported"""
+        baseline = {"benchmarks": {"fast": {"median_us": 100.0}, "slow": {"median_us": 100.0}}}
+        report = {"benchmarks": {"fast": {"median_us": 110.0}, "slow": {"median_us": 150.0},
+                                 "new": {"median_us": 5.0}}}
+        regressions = micro_bench.compare(report, baseline, threshold=0.2)
+        self.assertEqual([regression["benchmark"] for regression in regressions], ["slow"])
+
+    def test_baseline_round_trip(self):
+        """tests that a stored baseline can be loaded back and passes the check"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "baseline.json")
+            micro_bench.save_baseline(self.report, path)
+            baseline = micro_bench.load_baseline(path)
+        self.assertEqual(micro_bench.compare(self.report, baseline, threshold=0.0), [])
+
+    @classmethod
+    def tearDownClass(cls):
+        # After all tests, delete the benchmark database
+        os.remove("src/database/test_micro_bench.db")
@@ -0,0 +1,84 @@
+"""This module contains unit tests for the migrate.py module."""
+import datetime
+import os
+import sqlite3
+from unittest import TestCase
+from src.app_logic.app_logic import User, Topic, Review, Session
+from src.data_management.change_log import ChangeLog
+from src.data_management.migrate import migrate
+from src.data_management.object_mapper import ObjectMapper
+
+# The tables as the first versions created them: hex text ids and ISO text timestamps
+LEGACY_SCHEMA = """
+CREATE TABLE user (id TEXT PRIMARY KEY, username TEXT NOT NULL UNIQUE, hashed_password TEXT NOT NULL,
+                   email TEXT NOT NULL UNIQUE);
+CREATE TABLE topic (id TEXT PRIMARY KEY, user_id INTEGER, name TEXT NOT NULL UNIQUE, description TEXT NOT NULL,
+                    FOREIGN KEY (user_id) REFERENCES user (id) ON DELETE CASCADE);
+CREATE TABLE review (id TEXT PRIMARY KEY, user_id INTEGER, topic_id INTEGER, review_text TEXT, status TEXT,
+                     review_ratings TEXT, FOREIGN KEY (user_id) REFERENCES user (id) ON DELETE CASCADE,
+                     FOREIGN KEY (topic_id) REFERENCES topic (id) ON DELETE CASCADE);
+CREATE TABLE session (id TEXT PRIMARY KEY, user_id INTEGER, created_at TIMESTAMP NOT NULL,
+                      expires_at TIMESTAMP NOT NULL, last_activity_at TIMESTAMP NOT NULL, is_active BOOLEAN NOT NULL,
+                      FOREIGN KEY (user_id) REFERENCES user (id) ON DELETE CASCADE);
+"""
+
+class TestMigrate(TestCase):
+    """Unit tests for the migrate function and DataStore's migration."""
+    db_path = "test_migrate.db"
+
+    def setUp(self):
+        # write a database the way the first versions did
+        self.user = User("test_user", "test_user@example.com", "test_password")
+        self.topic = Topic("topic", "description", self.user.id)
+        self.review = Review("great work", self.user.id, self.topic.id)
+        self.session = Session(self.user.id, is_active=1)
+        connection = sqlite3.connect("src/database/" + self.db_path)
+        connection.executescript(LEGACY_SCHEMA)
+        for table, obj in (("user", self.user), ("topic", self.topic), ("review", self.review), ("session", self.session)):
+            data = obj.data
+            connection.execute(f"INSERT INTO {table} ({', '.join(data)}) VALUES ({', '.join('?' for _ in data)})",
+                               tuple(str(value) if table == "session" and key.endswith("_at") else value
+                                     for key, value in data.items()))
+        connection.commit()
+        connection.close()
+
+    def test_migrate(self):
+        """tests that ids become 16 byte blobs and timestamps integers, and objects load unchanged"""
+        result = migrate(self.db_path)
+        self.assertEqual((result["from_version"], result["to_version"]), (0, 3))
+        connection = sqlite3.connect("src/database/" + self.db_path)
+        try:
+            self.assertEqual(connection.execute("SELECT typeof(id), length(id), typeof(topic_id) FROM review").fetchone(),
+                             ("blob", 16, "blob"))
+            self.assertEqual(connection.execute("SELECT typeof(expires_at) FROM session").fetchone()[0], "integer")
+            self.assertEqual(connection.execute("PRAGMA foreign_key_check").fetchall(), [])
+            plan = connection.execute("EXPLAIN QUERY PLAN SELECT topic.name FROM review "
+                                      "CROSS JOIN topic ON topic.id = review.topic_id").fetchall()
+            self.assertIn("SEARCH topic USING INDEX", plan[-1][3])
+        finally:
+            connection.close()
+
+        object_mapper = ObjectMapper(self.db_path)
+        review = object_mapper.get(Review, self.review.id)
+        self.assertEqual((review.user_id, review.topic_id, review.review_text),
+                         (self.user.id, self.topic.id, "great work"))
+        # timestamps are stored to the millisecond
+        self.assertAlmostEqual(object_mapper.get(Session, self.session.id).expires_at, self.session.expires_at,
+                               delta=datetime.timedelta(milliseconds=1))
+        # the migrated rows keep their foreign keys and their changes are logged with hex ids
+        start = ChangeLog(self.db_path).latest_sequence()
+        object_mapper.remove(self.user)
+        self.assertEqual(object_mapper.get(Review), [])
+        self.assertIn(("review", self.review.id, "delete"),
+                      [(change.table_name, change.row_id, change.operation) for change in ChangeLog(self.db_path).read(start)])
+
+    def test_other_ids_are_kept(self):
+        """tests that ids that are not 32 character hex strings are stored and loaded as they are"""
+        object_mapper = ObjectMapper(self.db_path)
+        user = User("other_user", "other_user@example.com", "test_password", id="user-1")
+        object_mapper.add(user)
+        self.assertEqual(object_mapper.get(User, "user-1").username, "other_user")
+        self.assertTrue(object_mapper.remove(user))
+
+    def tearDown(self):
+        os.remove("src/database/" + self.db_path)
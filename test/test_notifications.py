@@ -0,0 +1,81 @@
+"""This module contains unit tests for the notifications.py module."""
+import json
+from unittest import TestCase
+from src.app_logic.app_logic import User, Topic, Review
+from src.data_management.data_store import DataStore
+from src.data_management.object_mapper import ObjectMapper
+from src.server.notifications import NotificationBus, TooManySubscribers, format_event
+
+class TestNotificationBus(TestCase):
+    """Unit tests for the NotificationBus class."""
+    @classmethod
+    def setUpClass(cls):
+        # Create a new test database with a user and two topics
+        cls.object_mapper = ObjectMapper("file:test_notifications?mode=memory&cache=shared")
+        cls.object_mapper.data_store.clear_tables()
+        cls.user = User("test_user", "test_user@example.com", "test_password")
+        cls.object_mapper.add(cls.user)
+        cls.topics = [Topic(f"topic{i}", "description", cls.user.id) for i in range(2)]
+        for topic in cls.topics:
+            cls.object_mapper.add(topic)
+
+    def setUp(self):
+        self.bus = NotificationBus(max_subscribers=2, queue_size=2, heartbeat=0.01, max_duration=0.05).install()
+
+    def tearDown(self):
+        self.bus.uninstall()
+
+    def _events(self, subscription):
+        """returns the (event, data) pairs of a finished stream"""
+        events = []
+        for chunk in self.bus.stream(subscription):
+            if chunk.startswith("event:"):
+                event, data = chunk.splitlines()[:2]
+                events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+        return events
+
+    def test_published_reviews_reach_their_topic(self):
+        """tests that ObjectMapper.add pushes published reviews to the streams of their topic only"""
+        viewer = self.bus.subscribe([self.topics[0].id])
+        other = self.bus.subscribe([self.topics[1].id])
+        review = Review("great work", self.user.id, self.topics[0].id, status="published")
+        self.object_mapper.add(review)
+
+        events = self._events(viewer)
+        self.assertEqual([event for event, data in events], ["review"])
+        self.assertEqual(events[0][1]["id"], review.id)
+        self.assertEqual(events[0][1]["review_text"], "great work")
+        self.assertEqual(self._events(other), [])
+
+    def test_unpublished_reviews_are_removed(self):
+        """tests that saving a review as a draft tells the viewers to remove it"""
+        viewer = self.bus.subscribe()
+        review = Review("draft", self.user.id, self.topics[1].id)
+        self.object_mapper.add(review)
+        self.assertEqual(self._events(viewer), [("review-removed", {"id": review.id, "topic_id": self.topics[1].id})])
+
+    def test_slow_client_is_reset(self):
+        """tests that a stream whose queue overflows is dropped and told to reload"""
+        viewer = self.bus.subscribe()
+        for i in range(3):
+            self.bus.publish(self.topics[0].id, "review", {"id": str(i)})
+        self.assertNotIn(viewer, self.bus.subscriptions)
+        self.assertEqual(self._events(viewer), [("reset", {})])
+
+    def test_connection_cap(self):
+        """tests that streams beyond the cap are refused until one ends"""
+        first = self.bus.subscribe()
+        self.bus.subscribe()
+        with self.assertRaises(TooManySubscribers):
+            self.bus.subscribe()
+        self._events(first)
+        self.bus.subscribe()
+
+    def test_format_event(self):
+        """tests the Server-Sent Events format"""
+        self.assertEqual(format_event("review", {"id": "1"}), 'event: review\ndata: {"id": "1"}\n\n')
+
+    @classmethod
+    def tearDownClass(cls):
+        # After all tests, drop the in-memory test database
+        DataStore.release("file:test_notifications?mode=memory&cache=shared")
@@ -1,15 +1,15 @@
 """This module contains unit tests for the object_mapper.py module."""
-import os
 from unittest import TestCase
+from src.data_management.data_store import DataStore
 from src.data_management.object_mapper import ObjectMapper
-from src.app_logic.app_logic import User
+from src.app_logic.app_logic import User, Review, Topic
 
 class TestUserMapper(TestCase):
     """Unit tests for the UserMapper class."""
     @classmethod
     def setUpClass(cls):
         # Create a new test database for this test suite
-        cls.object_mapper = ObjectMapper("test.db")
+        cls.object_mapper = ObjectMapper("file:test_object_mapper?mode=memory&cache=shared")
 
     def setUp(self):
         # Before each test, clear all tables to ensure there's no leftover data
@@ -25,6 +25,25 @@ class TestUserMapper(TestCase):
         user = "testuser"
         self.assertRaises(ValueError, self.object_mapper.add, user)
 
+    def test_failing_listeners_do_not_fail_writes(self):
+        """tests that a raising listener is logged, the write succeeds and the other listeners still run"""
+        def broken(obj_type, obj, db_path):
+            raise RuntimeError("listener failed")
+        notified = []
+        ObjectMapper.listeners.extend([broken, lambda *args: notified.append(args[0])])
+        ObjectMapper.remove_listeners.extend([broken, lambda *args: notified.append(args[0])])
+        try:
+            user = User("test", "testemail", "testpassword")
+            with self.assertLogs("src.data_management.object_mapper", level="ERROR") as logs:
+                self.assertTrue(self.object_mapper.add(user))
+                self.assertTrue(self.object_mapper.remove(user))
+        finally:
+            del ObjectMapper.listeners[-2:]
+            del ObjectMapper.remove_listeners[-2:]
+        self.assertEqual(notified, ["user", "user"])
+        self.assertEqual(len(logs.records), 2)
+        self.assertIn("RuntimeError: listener failed", logs.output[0])
+
     def test_get_success(self):
         """tests that data can be retrieved from the database"""
         user = User("test", "testemail", "testpassword")
@@ -51,7 +70,82 @@ class TestUserMapper(TestCase):
         self.object_mapper.remove(user)
         self.assertRaises(ValueError, self.object_mapper.remove, user)
 
+    def test_get_defers_columns_by_default(self):
+        """tests that the model's DEFERRED columns are loaded on first access"""
+        user = User("test", "testemail", "testpassword")
+        self.object_mapper.add(user)
+        loaded = self.object_mapper.get(User, id=user.id)
+        self.assertEqual(loaded.unloaded_fields, ("email", "hashed_password"))
+        self.assertEqual(loaded.hashed_password, "testpassword")
+        self.assertEqual(loaded.unloaded_fields, ())
+        self.assertEqual(loaded.data, user.data)
+
+    def test_get_projection(self):
+        """tests that only the requested columns are loaded"""
+        user = User("test", "testemail", "testpassword")
+        self.object_mapper.add(user)
+        topic = Topic("topic", "description", user.id)
+        self.object_mapper.add(topic)
+        loaded = self.object_mapper.get(Topic, only=("name",))[0]
+        self.assertEqual((loaded.id, loaded.name), (topic.id, "topic"))
+        self.assertEqual(loaded.unloaded_fields, ("description", "user_id"))
+        loaded_all = self.object_mapper.get(User, defer=())[0]
+        self.assertEqual(loaded_all.unloaded_fields, ())
+
+    def test_get_projection_unknown_column(self):
+        """tests that projecting a column the table does not have fails"""
+        self.assertRaises(ValueError, self.object_mapper.get, User, only=("password",))
+
+    def test_load_deferred_batches(self):
+        """tests that deferred columns of several objects are loaded together"""
+        user = User("test", "testemail", "testpassword")
+        self.object_mapper.add(user)
+        topic = Topic("topic", "description", user.id)
+        self.object_mapper.add(topic)
+        for i in range(3):
+            self.object_mapper.add(Review(f"review {i}", user.id, topic.id))
+        reviews = self.object_mapper.get(Review, defer=("review_text",))
+        self.object_mapper.load_deferred(reviews)
+        self.assertEqual(sorted(review.review_text for review in reviews), ["review 0", "review 1", "review 2"])
+        self.assertTrue(all(review.unloaded_fields == () for review in reviews))
+
+    def test_dirty_fields(self):
+        """tests that only the fields changed since the object was loaded or saved are dirty"""
+        user = User("test", "testemail", "testpassword")
+        self.assertEqual(user.dirty_fields, User.FIELDS)
+        self.object_mapper.add(user)
+        self.assertEqual(user.dirty_fields, ())
+        user.email = "newemail"
+        self.assertEqual(user.dirty_fields, ("email",))
+
+        loaded = self.object_mapper.get(User, id=user.id)
+        self.assertEqual(loaded.unloaded_fields, ("email", "hashed_password"))
+        self.assertEqual(loaded.dirty_fields, ())
+        loaded.username = "renamed"
+        self.assertEqual(loaded.dirty_fields, ("username",))
+        self.assertTrue(self.object_mapper.add(loaded))
+        self.assertEqual(loaded.dirty_fields, ())
+        stored = self.object_mapper.get(User, id=user.id, defer=())
+        self.assertEqual((stored.username, stored.email, stored.hashed_password), ("renamed", "testemail", "testpassword"))
+
+    def test_update_in_place(self):
+        """tests that saving a changed object updates its row without touching the rows referencing it"""
+        user = User("test", "testemail", "testpassword")
+        self.object_mapper.add(user)
+        topic = Topic("topic", "description", user.id)
+        self.object_mapper.add(topic)
+        review = Review("review", user.id, topic.id)
+        self.object_mapper.add(review)
+        review = self.object_mapper.get(Review, id=review.id)
+        review.status = "published"
+        self.object_mapper.add(review)
+        user.email = "newemail"
+        self.object_mapper.add(user)
+        self.assertEqual(self.object_mapper.get(Review, id=review.id).status, "published")
+        self.assertEqual(len(self.object_mapper.get(Topic)), 1)
+        self.assertRaises(ValueError, self.object_mapper.add, User("test", "otheremail", "testpassword"))
+
     @classmethod
     def tearDownClass(cls):
-        # After all tests, delete the test database
-        os.remove("src/database/test.db")
+        # After all tests, drop the in-memory test database
+        DataStore.release("file:test_object_mapper?mode=memory&cache=shared")
@@ -0,0 +1,112 @@
+"""This module contains unit tests for the partitioned_data_store.py module."""
+import os
+from unittest import TestCase
+from src.app_logic.app_logic import User, Topic, Review
+from src.data_management.data_store import DataStore, SQLiteConnection
+from src.data_management.object_mapper import ObjectMapper
+from src.data_management.partitioned_data_store import PartitionedDataStore
+
+class TestPartitionedDataStore(TestCase):
+    """Unit tests for the PartitionedDataStore class."""
+    @classmethod
+    def setUpClass(cls):
+        # Create a new test database split into three review shards
+        cls.data_store = PartitionedDataStore.enable("test_partitioned.db", 3)
+        cls.object_mapper = ObjectMapper("test_partitioned.db")
+
+    def setUp(self):
+        # Before each test, clear all tables to ensure there's no leftover data
+        self.data_store.clear_tables()
+        self.user = User("test_user", "test_user@example.com", "test_password")
+        self.object_mapper.add(self.user)
+        self.topics = [Topic(f"topic{i}", "description", self.user.id) for i in range(6)]
+        for topic in self.topics:
+            self.object_mapper.add(topic)
+
+    def _add_reviews(self):
+        """adds two reviews to every topic"""
+        reviews = [Review(f"review of {topic.name}", self.user.id, topic.id)
+                   for topic in self.topics for _ in range(2)]
+        for review in reviews:
+            self.object_mapper.add(review)
+        return reviews
+
+    def _shard_counts(self, store):
+        """returns the number of reviews in every shard file"""
+        counts = []
+        for shard in store.shards:
+            with SQLiteConnection(shard.db_path) as connection:
+                counts.append(connection.execute("SELECT COUNT(*) FROM review").fetchone()[0])
+        return counts
+
+    def test_object_mapper_is_routed(self):
+        """tests that ObjectMapper uses the registered partitioned store"""
+        self.assertIs(self.object_mapper.data_store, self.data_store)
+
+    def test_reviews_are_sharded_by_topic(self):
+        """tests that every review is stored only in the shard of its topic"""
+        reviews = self._add_reviews()
+        self.assertEqual(sum(self._shard_counts(self.data_store)), len(reviews))
+        for review in reviews:
+            shard = self.data_store.shard_for(review.topic_id)
+            self.assertEqual(len(shard.load_rows("review", id=review.id)), 1)
+        with SQLiteConnection(self.data_store.db_path) as connection:
+            self.assertEqual(connection.execute("SELECT COUNT(*) FROM review").fetchone()[0], 0)
+
+    def test_reads_merge_all_shards(self):
+        """tests that loading reviews merges the rows of every shard"""
+        reviews = self._add_reviews()
+        loaded = self.object_mapper.get(Review)
+        self.assertEqual({review.id for review in loaded}, {review.id for review in reviews})
+        self.assertEqual(self.object_mapper.get(Review, reviews[3].id).review_text, reviews[3].review_text)
+        self.assertEqual(len(self.object_mapper.get(User)), 1)
+
+    def test_delete(self):
+        """tests deleting a review, and that deleting a topic deletes its reviews from its shard"""
+        reviews = self._add_reviews()
+        self.assertTrue(self.object_mapper.remove(reviews[0]))
+        self.assertFalse(self.object_mapper.get(Review, reviews[0].id))
+        self.object_mapper.remove(self.topics[-1])
+        remaining = self.object_mapper.get(Review)
+        self.assertEqual(len(remaining), len(reviews) - 3)
+        self.assertNotIn(self.topics[-1].id, {review.topic_id for review in remaining})
+
+    def test_shard_count_mismatch(self):
+        """tests that opening the database with another shard count asks for a rebalance"""
+        with self.assertRaises(ValueError):
+            PartitionedDataStore("test_partitioned.db", 5)
+
+    def test_rebalance(self):
+        """tests moving an unpartitioned database into shards and changing the shard count"""
+        data_store = DataStore("test_rebalance.db")
+        data_store.clear_tables()
+        for table, rows in (("user", [self.user]), ("topic", self.topics)):
+            for row in rows:
+                data_store.save(row.data, table)
+        reviews = [Review("text", self.user.id, topic.id) for topic in self.topics for _ in range(3)]
+        for review in reviews:
+            data_store.save(review.data, "review")
+
+        partitioned = PartitionedDataStore("test_rebalance.db", 2)
+        self.assertEqual(partitioned.rebalance(), {"shards": 2, "moved": len(reviews)})
+        self.assertEqual(sum(self._shard_counts(partitioned)), len(reviews))
+
+        partitioned.rebalance(4)
+        self.assertEqual(sum(self._shard_counts(partitioned)), len(reviews))
+        self.assertEqual(len(PartitionedDataStore("test_rebalance.db").shards), 4)
+        for review in reviews:
+            shard = partitioned.shard_for(review.topic_id)
+            self.assertEqual(len(shard.load_rows("review", id=review.id)), 1)
+
+        partitioned.rebalance(1)
+        self.assertEqual(self._shard_counts(partitioned), [len(reviews)])
+        self.assertFalse(os.path.exists("src/database/test_rebalance.review-1.db"))
+        partitioned.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        # After all tests, delete the test databases
+        PartitionedDataStore.disable("test_partitioned.db")
+        for name in os.listdir("src/database"):
+            if name.startswith(("test_partitioned", "test_rebalance")):
+                os.remove(os.path.join("src/database", name))
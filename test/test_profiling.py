@@ -0,0 +1,170 @@
+"""This module contains unit tests for the profiling.py module."""
+import json
+import marshal
+import time
+from unittest import TestCase
+from bottle import Bottle
+from src.data_management.data_store import DataStore
+from src.server.profiling import MemoryProfiler, ProfilerPlugin
+from src.user_management.session_tokens import SessionTokens
+from test.wsgi import call
+
+DB_PATH = "file:test_profiling?mode=memory&cache=shared"
+ADMIN = {"Authorization": "Bearer admin-secret"}
+
+
+def busy_loop(seconds):
+    """keeps the CPU busy, so the sampler catches it"""
+    deadline = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < deadline:
+        total += 1
+    return total
+
+class TestProfilerPlugin(TestCase):
+    """Unit tests for the ProfilerPlugin class."""
+    def setUp(self):
+        self.profiler = ProfilerPlugin(sample_interval=0.001)
+        self.app = Bottle()
+        self.app.install(self.profiler)
+        self.calls = 0
+
+        @self.app.route('/slow')
+        def slow():
+            self.calls += 1
+            busy_loop(0.03)
+            return "done"
+
+    def test_capture_next_requests(self):
+        """tests that only the requested number of requests are profiled, into pstats and collapsed stacks"""
+        capture = self.profiler.capture("/slow", "GET", requests=2)
+        for _ in range(3):
+            self.assertEqual(call(self.app, "/slow")[2], b"done")
+        self.assertTrue(capture.done.wait(1))
+        report = capture.report()
+        self.assertEqual((report["started"], report["completed"], self.calls), (2, 2, 3))
+        self.assertIn("busy_loop", report["top"])
+        self.assertNotIn(("/slow", "GET"), self.profiler.armed)
+
+        stats = marshal.loads(capture.pstats_dump())
+        busy = [value for (filename, line, name), value in stats.items() if name == "busy_loop"]
+        self.assertEqual(busy[0][1], 2)
+
+        collapsed = capture.collapsed()
+        self.assertGreater(report["samples"], 0)
+        for line in collapsed.splitlines():
+            stack, count = line.rsplit(" ", 1)
+            self.assertTrue(stack.startswith("slow (test_profiling.py:"))
+            self.assertGreater(int(count), 0)
+        self.assertIn(";busy_loop (test_profiling.py:", collapsed)
+
+    def test_new_capture_replaces_armed(self):
+        """tests that a new capture of a route cancels the one still armed, and old captures are dropped"""
+        first = self.profiler.capture("/slow", requests=5)
+        second = self.profiler.capture("/slow", requests=1)
+        self.assertTrue(first.done.is_set())
+        call(self.app, "/slow")
+        self.assertEqual((first.completed, second.completed), (0, 1))
+        self.profiler.keep = 2
+        self.profiler.capture("/other", requests=1).cancel()
+        self.assertEqual(list(self.profiler.captures), [second.id, second.id + 1])
+
+
+class TestMemoryProfiler(TestCase):
+    """Unit tests for the MemoryProfiler class."""
+    def setUp(self):
+        self.profiler = MemoryProfiler(frames=10)
+
+    def tearDown(self):
+        self.profiler.stop()
+
+    def test_snapshot_diff(self):
+        """tests that the allocations made between two snapshots are reported at their line"""
+        first = self.profiler.snapshot()
+        self.assertTrue(self.profiler.tracing)
+        allocated = [str(n) * 10 for n in range(2000)]
+        second = self.profiler.snapshot()
+        diff = self.profiler.diff(first, second, limit=5, match="*test_profiling.py")
+        self.assertGreater(diff["size_diff_kb"], 10)
+        self.assertIn("test_profiling.py", diff["top"][0]["where"])
+        self.assertGreaterEqual(diff["top"][0]["count_diff"], 2000)
+        top = self.profiler.top(second, limit=3, key_type="traceback", match="*test_profiling.py")
+        self.assertIsInstance(top["top"][0]["where"], list)
+        self.assertRaises(KeyError, self.profiler.top, second + 1)
+        del allocated
+
+
+class TestAdminRoutes(TestCase):
+    """Unit tests for the profiling routes of the web server."""
+    def setUp(self):
+        from src.server.server_app import WebServer
+        self.server = WebServer()
+        self.server.database_path = DB_PATH
+
+    def tearDown(self):
+        self.server.memory_profiler.stop()
+        self.server.suggestions.uninstall()
+        self.server.notifications.uninstall()
+
+    def test_admin_token(self):
+        """tests that the admin routes are hidden without a token and forbidden with a wrong one"""
+        self.assertTrue(call(self.server, "/admin/profile", "POST", {"route": "/search/suggest"})[0].startswith("404"))
+        self.server.admin_token = "admin-secret"
+        self.assertTrue(call(self.server, "/admin/profile", "POST", {"route": "/search/suggest"})[0].startswith("403"))
+        self.assertTrue(call(self.server, "/admin/profile", "POST", {"route": "/search/suggest"},
+                             headers={"Authorization": "Bearer wrong"})[0].startswith("403"))
+
+    def test_profile_route(self):
+        """tests that a route is profiled through the admin routes and its profile exported"""
+        self.server.admin_token = "admin-secret"
+        status, _, body = call(self.server, "/admin/profile", "POST", {"route": "/nowhere"}, headers=ADMIN)
+        self.assertTrue(status.startswith("400"))
+        status, _, body = call(self.server, "/admin/profile", "POST", {"route": "/search/suggest", "requests": "1"},
+                               headers=ADMIN)
+        capture_id = json.loads(body)["id"]
+        self.server.session_tokens = SessionTokens(b"k" * 32)
+        call(self.server, "/search/suggest", params={"q": "a"},
+             cookie=f"session_id={self.server.session_tokens.issue('user_1')}")
+        report = json.loads(call(self.server, f"/admin/profile/{capture_id}", headers=ADMIN)[2])
+        self.assertEqual((report["completed"], report["done"]), (1, True))
+        self.assertIn("suggest", report["top"])
+        response = call(self.server, f"/admin/profile/{capture_id}/pstats", headers=ADMIN)
+        self.assertEqual(response.headers["Content-Type"], "application/octet-stream")
+        self.assertTrue(marshal.loads(response.body))
+        self.assertTrue(call(self.server, f"/admin/profile/{capture_id}/collapsed", headers=ADMIN).status.startswith("200"))
+        self.assertTrue(call(self.server, "/admin/profile/999", headers=ADMIN)[0].startswith("404"))
+
+    def test_profile_parameters_are_checked(self):
+        """tests that request counts below 1, non-numbers and unknown sort keys are answered with 400"""
+        self.server.admin_token = "admin-secret"
+        for requests in ("0", "-3", "many"):
+            status = call(self.server, "/admin/profile", "POST", {"route": "/search/suggest", "requests": requests},
+                          headers=ADMIN).status
+            self.assertTrue(status.startswith("400"))
+        self.assertEqual(self.server.profiler.armed, {})
+        status, _, body = call(self.server, "/admin/profile", "POST", {"route": "/search/suggest", "requests": "1"},
+                               headers=ADMIN)
+        capture_id = json.loads(body)["id"]
+        for params in ({"sort": "nonsense"}, {"limit": "x"}):
+            status = call(self.server, f"/admin/profile/{capture_id}", params=params, headers=ADMIN).status
+            self.assertTrue(status.startswith("400"))
+        self.assertTrue(call(self.server, f"/admin/profile/{capture_id}", params={"sort": "tottime"},
+                             headers=ADMIN).status.startswith("200"))
+
+    def test_memory_routes(self):
+        """tests that snapshots are taken, compared and dropped through the admin routes"""
+        self.server.admin_token = "admin-secret"
+        status, _, body = call(self.server, "/admin/memory/snapshot", "POST", headers=ADMIN)
+        first = json.loads(body)["snapshot"]
+        status, _, body = call(self.server, "/admin/memory/diff", params={"from": first, "match": "*server_app.py"},
+                               headers=ADMIN)
+        self.assertEqual(json.loads(body)["from"], first)
+        self.assertTrue(call(self.server, "/admin/memory/diff", params={"from": 999},
+                             headers=ADMIN)[0].startswith("404"))
+        status, _, body = call(self.server, "/admin/memory/stop", "POST", headers=ADMIN)
+        self.assertEqual(json.loads(body), {"tracing": False})
+
+    @classmethod
+    def tearDownClass(cls):
+        # After all tests, drop the in-memory test database
+        DataStore.release(DB_PATH)
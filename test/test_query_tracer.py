@@ -0,0 +1,78 @@
+"""This module contains unit tests for the query_tracer.py module."""
+from unittest import TestCase
+from src.data_management.data_store import DataStore, SQLiteConnection
+from src.data_management.query_tracer import QueryTracer
+
+class TestQueryTracer(TestCase):
+    """Unit tests for the QueryTracer class."""
+    @classmethod
+    def setUpClass(cls):
+        cls.data_store = DataStore("file:test_query_tracer?mode=memory&cache=shared")
+
+    def setUp(self):
+        self.data_store.clear_tables()
+        self.tracer = QueryTracer(slow_threshold_ms=1000).install()
+        self.user_data = {
+            "id": "1",
+            "username": "test_user_1",
+            "hashed_password": "test_password_1",
+            "email": "test_email_1@example.com",
+        }
+
+    def tearDown(self):
+        self.tracer.uninstall()
+
+    def test_install(self):
+        """tests that installing and uninstalling the tracer hooks it into new connections"""
+        self.assertIs(SQLiteConnection.tracer, self.tracer)
+        self.tracer.uninstall()
+        self.assertIsNone(SQLiteConnection.tracer)
+
+    def test_statements_are_aggregated(self):
+        """tests that executions of the same statement share statistics"""
+        self.data_store.save(self.user_data, "user")
+        self.data_store.load("user", id="1")
+        self.data_store.load("user", id="2")
+        stats = {data["sql"]: data for data in self.tracer.stats()}
+        self.assertEqual(stats["SELECT * FROM user WHERE id = ?"]["count"], 2)
+        self.assertEqual(len([sql for sql in stats if sql.startswith("INSERT INTO user")]), 1)
+
+    def test_full_scans_are_flagged(self):
+        """tests that a statement reading a whole table is reported as a full scan"""
+        self.data_store.load("review")
+        self.data_store.load("review", id="1")
+        full_scans = [data["sql"] for data in self.tracer.full_scans()]
+        self.assertEqual(full_scans, ["SELECT * FROM review"])
+
+    def test_slow_queries_are_logged(self):
+        """tests that statements over the threshold are logged with their plan"""
+        self.tracer.slow_threshold = 0
+        with self.assertLogs("src.data_management.query_tracer", level="WARNING") as logs:
+            self.data_store.load("user")
+        self.assertIn("SELECT * FROM user", logs.output[0])
+        self.assertIn("SCAN user", logs.output[0])
+
+    def test_bound_values_are_not_kept(self):
+        """tests that the statistics and the slow log never contain the values bound to a statement"""
+        self.tracer.slow_threshold = 0
+        with self.assertLogs("src.data_management.query_tracer", level="WARNING") as logs:
+            self.data_store.save(self.user_data, "user")
+        for value in ("test_password_1", "test_email_1@example.com"):
+            self.assertNotIn(value, str(self.tracer.stats()))
+            self.assertNotIn(value, "\n".join(logs.output))
+
+    def test_normalize(self):
+        """tests that literals are replaced so statements aggregate"""
+        self.assertEqual(QueryTracer.normalize("SELECT *  FROM user WHERE id = 'abc' AND n = 10"),
+                         "SELECT * FROM user WHERE id = ? AND n = ?")
+
+    def test_reset(self):
+        """tests that statistics can be cleared"""
+        self.data_store.load("user")
+        self.tracer.reset()
+        self.assertEqual(self.tracer.stats(), [])
+
+    @classmethod
+    def tearDownClass(cls):
+        # After all tests, drop the in-memory test database
+        DataStore.release("file:test_query_tracer?mode=memory&cache=shared")
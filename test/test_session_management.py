@@ -2,11 +2,12 @@
 This module contains unittests for the session management functions.
 It includes tests for session creation, validation, termination, and other related utilities.
 """
-import os
+import datetime
 import unittest
 from unittest.mock import patch, Mock
 
 # Local imports
+from src.data_management.data_store import DataStore
 from src.data_management.object_mapper import ObjectMapper
 from src.user_management.session_management import SessionManager
 from src.app_logic.app_logic import Session
@@ -21,7 +22,7 @@ class TestSessionManager(unittest.TestCase):
         """
         Set up the class for SessionManager tests by initializing paths and mappers.
         """
-        cls.db_path = "test.db"
+        cls.db_path = "file:test_session_management?mode=memory&cache=shared"
         cls.object_mapper = ObjectMapper(cls.db_path)
         cls.session_manager = SessionManager(cls.db_path)
 
@@ -97,13 +98,46 @@ class TestSessionManager(unittest.TestCase):
                     retrieved_session = self.session_manager.get_user_session(user_id)
                     self.assertEqual(retrieved_session.is_active, 0)
 
+    def test_active_sessions_and_expiry_sweep(self):
+        """
+        Test that active sessions are those not yet expired, and that the sweep deletes the expired ones.
+        """
+        now = datetime.datetime(2024, 5, 1, 12, 0)
+        expired = Session(user_id=None, created_at=now - datetime.timedelta(hours=2), is_active=1)
+        inactive = Session(user_id=None, created_at=now, is_active=0)
+        active = Session(user_id=None, created_at=now, is_active=1)
+        for session in (expired, inactive, active):
+            self.object_mapper.add(session)
+
+        sessions = self.session_manager.get_active_sessions(now)
+        self.assertEqual([session.id for session in sessions], [active.id])
+        self.assertEqual(sessions[0].expires_at, active.expires_at)
+        self.assertEqual(self.session_manager.expire_sessions(now), 1)
+        self.assertEqual(sorted(session.id for session in self.object_mapper.get(Session)),
+                         sorted([inactive.id, active.id]))
+
+    def test_valid_sessions_are_extended(self):
+        """
+        Test that only active, unexpired sessions are valid, and that using one moves its expiry forward.
+        """
+        now = datetime.datetime(2024, 5, 1, 12, 0)
+        session = Session(user_id=None, created_at=now, last_activity_at=now, is_active=1)
+        self.object_mapper.add(session)
+
+        self.assertEqual(self.session_manager.get_valid_session(session.id, now + datetime.timedelta(seconds=30)).expires_at,
+                         now + datetime.timedelta(hours=1))
+        later = now + datetime.timedelta(minutes=50)
+        self.session_manager.get_valid_session(session.id, later)
+        self.assertEqual(self.session_manager.get_session(session.id).expires_at, later + datetime.timedelta(hours=1))
+        self.assertIsNone(self.session_manager.get_valid_session(session.id, later + datetime.timedelta(hours=1)))
+        self.assertIsNone(self.session_manager.get_valid_session("no-such-session", now))
 
     @classmethod
     def tearDownClass(cls):
         """
         Clean up after tests by removing the test database file.
         """
-        os.remove("src/database/test.db")
+        DataStore.release("file:test_session_management?mode=memory&cache=shared")
 
 if __name__ == '__main__':
     unittest.main()
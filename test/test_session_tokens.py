@@ -0,0 +1,85 @@
+"""This module contains unit tests for the session_tokens.py module."""
+import os
+import time
+from unittest import TestCase
+from src.user_management.session_tokens import RevocationList, SessionTokens, generate_key_file, load_signing_key
+
+TEST_KEY = "test_secret_of_at_least_32_bytes"
+
+class TestSessionTokens(TestCase):
+    """Unit tests for the SessionTokens and RevocationList classes."""
+    def setUp(self):
+        self.session_tokens = SessionTokens(TEST_KEY, ttl=60)
+
+    def test_issue_and_verify(self):
+        """tests that an issued token verifies and carries the user id and expiry"""
+        token = self.session_tokens.issue("user_1")
+        claims = self.session_tokens.verify(token)
+        self.assertEqual(claims["user_id"], "user_1")
+        self.assertEqual(claims["expires_at"] - claims["issued_at"], 60)
+        self.assertNotEqual(self.session_tokens.issue("user_1"), token)
+
+    def test_forged_tokens_are_rejected(self):
+        """tests that tampered tokens and tokens signed with another key do not verify"""
+        token = self.session_tokens.issue("user_1")
+        payload, signature = token.split(".")
+        other = SessionTokens(b"o" * 32).issue("user_1")
+        for forged in (f"{payload}x.{signature}", f"{other.split('.')[0]}.{signature}", other, "garbage", "", None):
+            self.assertIsNone(self.session_tokens.verify(forged))
+
+    def test_expired_tokens_are_rejected(self):
+        """tests that a token is rejected once its ttl has passed"""
+        session_tokens = SessionTokens(TEST_KEY, ttl=-1)
+        self.assertIsNone(session_tokens.verify(session_tokens.issue("user_1")))
+
+    def test_signing_key(self):
+        """tests that there is no default signing key, short keys are refused and key files are generated once"""
+        for secret in ("secret", "", None):
+            self.assertRaises(ValueError, SessionTokens, secret)
+        self.assertRaises(ValueError, load_signing_key)
+        self.assertRaises(ValueError, load_signing_key, "secret")
+        self.assertEqual(load_signing_key(TEST_KEY, "src/database/no_such_key"), TEST_KEY.encode())
+        path = "src/database/test_session_key"
+        try:
+            generate_key_file(path)
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+            key = load_signing_key(None, path)
+            self.assertEqual(len(key), 32)
+            self.assertRaises(FileExistsError, generate_key_file, path)
+            self.assertEqual(load_signing_key(None, path), key)
+        finally:
+            os.remove(path)
+
+    def test_derive(self):
+        """tests that the tokens of a derived signer only verify with signers derived for the same context"""
+        cs101 = self.session_tokens.derive("cs101")
+        token = cs101.issue("user_1")
+        self.assertEqual(self.session_tokens.derive("cs101").verify(token)["user_id"], "user_1")
+        self.assertIsNone(self.session_tokens.derive("cs102").verify(token))
+        self.assertIsNone(self.session_tokens.verify(token))
+        self.assertIs(cs101.revocations, self.session_tokens.revocations)
+
+    def test_revoke(self):
+        """tests that a revoked token no longer verifies while other tokens still do"""
+        token = self.session_tokens.issue("user_1")
+        other = self.session_tokens.issue("user_1")
+        self.assertTrue(self.session_tokens.revoke(token))
+        self.assertIsNone(self.session_tokens.verify(token))
+        self.assertIsNotNone(self.session_tokens.verify(other))
+        self.assertFalse(self.session_tokens.revoke(token))
+
+    def test_revocations_are_persisted(self):
+        """tests that revocations are saved periodically, reloaded, and forgotten once expired"""
+        path = "src/database/test_revocations.json"
+        revocations = RevocationList(path, persist_interval=0)
+        session_tokens = SessionTokens(TEST_KEY, revocations=revocations)
+        token = session_tokens.issue("user_1")
+        session_tokens.revoke(token)
+        revocations.add("expired", time.time() - 1)
+        try:
+            reloaded = SessionTokens(TEST_KEY, revocations=RevocationList(path))
+            self.assertIsNone(reloaded.verify(token))
+            self.assertEqual(len(reloaded.revocations), 1)
+            self.assertNotIn("expired", reloaded.revocations)
+        finally:
+            os.remove(path)
@@ -0,0 +1,101 @@
+"""This module contains unit tests for the suggestions.py module."""
+import json
+import time
+from unittest import TestCase
+from src.app_logic.app_logic import User, Topic
+from src.data_management.data_store import DataStore
+from src.data_management.object_mapper import ObjectMapper
+from src.server.suggestions import PrefixIndex, SuggestionIndex
+from src.user_management.session_tokens import SessionTokens
+from test.wsgi import call
+
+
+class TestPrefixIndex(TestCase):
+    """Unit tests for the PrefixIndex class."""
+    def setUp(self):
+        self.index = PrefixIndex({"1": "Sprint review", "2": "sprint planning", "3": "Retro", "4": "Spring"})
+
+    def test_complete(self):
+        """tests that completions start with the prefix ignoring case, in order, up to the limit"""
+        self.assertEqual(self.index.complete("spr"), ["Spring", "sprint planning", "Sprint review"])
+        self.assertEqual(self.index.complete("SPRINT "), ["sprint planning", "Sprint review"])
+        self.assertEqual(self.index.complete("spr", limit=1), ["Spring"])
+        self.assertEqual(self.index.complete("x"), [])
+        self.assertEqual(self.index.complete("retrospective"), [])
+
+    def test_add_and_remove(self):
+        """tests that added names are completed, renames replace the old name and removed names are gone"""
+        self.index.add("5", "Retrospective")
+        self.assertEqual(self.index.complete("retro"), ["Retro", "Retrospective"])
+        self.index.add("3", "Standup")
+        self.assertEqual(self.index.complete("retro"), ["Retrospective"])
+        self.index.remove("4")
+        self.index.remove("unknown")
+        self.assertEqual(self.index.complete("spr"), ["sprint planning", "Sprint review"])
+        self.assertEqual(len(self.index), 4)
+
+    def test_complete_is_fast(self):
+        """tests that completing a prefix among 100,000 names takes well under a millisecond"""
+        index = PrefixIndex({str(i): f"topic {i}" for i in range(100000)})
+        started = time.perf_counter()
+        for _ in range(1000):
+            index.complete("topic 5", 10)
+        self.assertLess((time.perf_counter() - started) / 1000, 0.0005)
+
+
+class TestSuggestionIndex(TestCase):
+    """Unit tests for the SuggestionIndex class."""
+    def setUp(self):
+        # Create a new test database with a user and a topic
+        self.object_mapper = ObjectMapper("file:test_suggestions?mode=memory&cache=shared")
+        self.object_mapper.data_store.clear_tables()
+        self.user = User("alice", "alice@example.com", "test_password")
+        self.object_mapper.add(self.user)
+        self.topic = Topic("Alerting", "description", self.user.id)
+        self.object_mapper.add(self.topic)
+        self.index = SuggestionIndex().load("file:test_suggestions?mode=memory&cache=shared").install()
+
+    def tearDown(self):
+        self.index.uninstall()
+
+    def test_load(self):
+        """tests that the topics and users already in the database are completed"""
+        self.assertEqual(self.index.suggest("al"), {"topics": ["Alerting"], "users": ["alice"]})
+
+    def test_follows_object_mapper(self):
+        """tests that objects added, renamed and removed through ObjectMapper update the index"""
+        user = User("albert", "albert@example.com", "test_password")
+        self.object_mapper.add(user)
+        topic = Topic("Allocation", "description", user.id)
+        self.object_mapper.add(topic)
+        self.assertEqual(self.index.suggest("al"), {"topics": ["Alerting", "Allocation"], "users": ["albert", "alice"]})
+
+        self.topic.name = "Monitoring"
+        self.object_mapper.add(self.topic)
+        self.object_mapper.remove(user)
+        self.assertEqual(self.index.suggest("al"), {"topics": [], "users": ["alice"]})
+        self.assertEqual(self.index.suggest("mon"), {"topics": ["Monitoring"], "users": []})
+
+    def test_web_server_route(self):
+        """tests that /search/suggest returns the completions as JSON, to logged in users only"""
+        from src.server.server_app import WebServer
+        server = WebServer()
+        server.database_path = "file:test_suggestions?mode=memory&cache=shared"
+        server.session_tokens = SessionTokens(b"k" * 32)
+        cookie = f"session_id={server.session_tokens.issue('user_1')}"
+        try:
+            response = call(server, "/search/suggest", query_string="q=AL")
+            self.assertTrue(response.headers["Location"].endswith("/login"))
+            status, _, body = call(server, "/search/suggest", query_string="q=AL&k=1", cookie=cookie)
+            self.assertTrue(status.startswith("200"))
+            self.assertEqual(json.loads(body), {"topics": ["Alerting"], "users": ["alice"]})
+            status, _, body = call(server, "/search/suggest", cookie=cookie)
+            self.assertEqual(json.loads(body), {"topics": [], "users": []})
+        finally:
+            server.suggestions.uninstall()
+            server.notifications.uninstall()
+
+    @classmethod
+    def tearDownClass(cls):
+        # After all tests, drop the in-memory test database
+        DataStore.release("file:test_suggestions?mode=memory&cache=shared")
@@ -0,0 +1,142 @@
+"""This module contains unit tests for the tenants.py module."""
+import json
+import os
+import threading
+from unittest import TestCase
+from src.app_logic.app_logic import User, Topic, Review
+from src.data_management.data_store import SQLiteConnection
+from src.data_management.object_mapper import ObjectMapper
+from src.server.tenants import TenantRouter, UnknownTenant
+from src.user_management.session_tokens import SessionTokens
+from test.wsgi import call
+
+DATABASES = {"cs101": "test_tenant_cs101.db", "cs102": "test_tenant_cs102.db", "cs103": "test_tenant_cs103.db"}
+
+
+class TestTenantRouter(TestCase):
+    """Unit tests for the TenantRouter class."""
+    def setUp(self):
+        self.now = 0.0
+        self.router = TenantRouter("feedback.example.com", databases=DATABASES, max_open=2,
+                                   idle_timeout=60, clock=lambda: self.now)
+
+    def tearDown(self):
+        self.router.close()
+
+    def test_resolve(self):
+        """tests that the subdomains of the domain are tenants and other hosts are not"""
+        self.assertEqual(self.router.resolve("cs101.feedback.example.com"), "cs101")
+        self.assertEqual(self.router.resolve("CS101.Feedback.Example.com:8080"), "cs101")
+        self.assertIsNone(self.router.resolve("feedback.example.com"))
+        self.assertIsNone(self.router.resolve("localhost:8080"))
+        self.assertIsNone(self.router.resolve(None))
+
+    def test_database_path(self):
+        """tests that tenants map to their configured database, or one named after them once it was created"""
+        self.assertEqual(self.router.database_path("cs101"), "test_tenant_cs101.db")
+        self.assertRaises(UnknownTenant, self.router.database_path, "cs999")
+        router = TenantRouter("feedback.example.com", database_name="test_tenant_{}.db")
+        self.assertRaises(UnknownTenant, router.get, "cs999")
+        self.assertFalse(os.path.exists("src/database/test_tenant_cs999.db"))
+        self.assertEqual(router.create("cs999"), "test_tenant_cs999.db")
+        self.assertEqual(router.database_path("cs999"), "test_tenant_cs999.db")
+        for name in ("a.b", "../x", "-x", ""):
+            self.assertRaises(UnknownTenant, router.create, name)
+
+    def test_least_recently_used_are_evicted(self):
+        """tests that at most max_open tenants stay open, the least recently used is closed first"""
+        cs101 = self.router.get("cs101")
+        self.assertIs(self.router.get("cs101"), cs101)
+        self.router.get("cs102")
+        self.router.get("cs101")
+        self.router.get("cs103")
+        self.assertEqual(list(self.router.open_tenants), ["cs101", "cs103"])
+        self.assertEqual((self.router.opened, self.router.evicted), (3, 1))
+
+    def test_idle_and_busy_tenants(self):
+        """tests that idle tenants are closed, unless a live update stream is open"""
+        cs101 = self.router.get("cs101")
+        subscription = cs101.notifications.subscribe()
+        self.router.get("cs102")
+        self.now = 61
+        self.router.evict_idle()
+        self.assertEqual(list(self.router.open_tenants), ["cs101"])
+        cs101.notifications.unsubscribe(subscription)
+        self.router.evict_idle()
+        self.assertEqual(list(self.router.open_tenants), [])
+
+    def test_open_tenants_keep_their_connections(self):
+        """tests that an open tenant's calls reuse its connections, and evicting it closes them"""
+        cs101 = self.router.get("cs101")
+        cache = SQLiteConnection.caches[cs101.data_store.db_path]
+        object_mapper = ObjectMapper(cs101.database_path)
+        for _ in range(3):
+            object_mapper.get(User)
+        # the connection is shared by the threads serving the requests
+        thread = threading.Thread(target=object_mapper.get, args=(User,))
+        thread.start()
+        thread.join()
+        self.assertEqual((cache.opened, len(cache.idle)), (1, 1))
+        self.router.get("cs102")
+        self.router.get("cs103")
+        self.assertNotIn(cs101.data_store.db_path, SQLiteConnection.caches)
+        self.assertEqual((cache.closed, cache.idle), (True, []))
+        self.assertEqual(len(SQLiteConnection.caches), 2)
+
+    def test_web_server_tenants(self):
+        """tests that each subdomain of the web server reads its own database"""
+        from src.server.server_app import WebServer
+        for name, db_path in DATABASES.items():
+            object_mapper = ObjectMapper(db_path)
+            object_mapper.data_store.clear_tables()
+            user = User(f"{name}_user", f"{name}@example.com", "test_password")
+            object_mapper.add(user)
+            object_mapper.add(Topic(f"{name} topic", "description", user.id))
+        server = WebServer()
+        server.tenants = self.router
+        server.session_tokens = SessionTokens(b"k" * 32)
+        try:
+            for name in DATABASES:
+                # tokens are signed with the tenant's own key
+                cookie = f"session_id={server.default_session_tokens.derive(name).issue(f'{name}_user')}"
+                status, _, body = call(server, "/search/suggest", host=f"{name}.feedback.example.com",
+                                       query_string="q=cs", cookie=cookie)
+                self.assertEqual(json.loads(body), {"topics": [f"{name} topic"], "users": [f"{name}_user"]})
+            status, _, body = call(server, "/search/suggest", host="cs999.feedback.example.com", query_string="q=cs")
+            self.assertTrue(status.startswith("404"))
+            server.tenants = TenantRouter("feedback.example.com", database_name="test_tenant_{}.db")
+            status, _, body = call(server, "/search/suggest", host="cs998.feedback.example.com", query_string="q=cs")
+            self.assertTrue(status.startswith("404"))
+            self.assertFalse(os.path.exists("src/database/test_tenant_cs998.db"))
+        finally:
+            server.default_suggestions.uninstall()
+            server.default_notifications.uninstall()
+
+    def test_web_server_notifications_stay_in_their_tenant(self):
+        """tests that a review published in a tenant is not sent to the streams of the server's own database"""
+        from src.server.server_app import WebServer
+        server = WebServer()
+        server.tenants = self.router
+        server.database_path = "test_tenant_default.db"
+        try:
+            cs101 = self.router.get("cs101")
+            default_subscription = server.default_notifications.subscribe()
+            tenant_subscription = cs101.notifications.subscribe()
+            object_mapper = ObjectMapper(cs101.database_path)
+            user = User("notify_user", "notify_user@example.com", "test_password")
+            object_mapper.add(user)
+            topic = Topic("notify topic", "description", user.id)
+            object_mapper.add(topic)
+            object_mapper.add(Review("private review text", user.id, topic.id, status="published"))
+            self.assertEqual(tenant_subscription.queue.get_nowait()[1]["review_text"], "private review text")
+            self.assertTrue(default_subscription.queue.empty())
+        finally:
+            server.default_suggestions.uninstall()
+            server.default_notifications.uninstall()
+
+    @classmethod
+    def tearDownClass(cls):
+        # After all tests, delete the test databases
+        for name in os.listdir("src/database"):
+            if name.startswith("test_tenant_"):
+                os.remove(os.path.join("src/database", name))
@@ -2,16 +2,17 @@
 This module contains unittests for the user information functions.
 It includes tests for user registration, login, logout, and searching reviews.
 """
-import os
 import unittest
 import uuid
 from unittest.mock import Mock
 
 # Local imports
 from src.user_management.session_management import SessionManager
+from src.data_management.data_store import DataStore
 from src.data_management.object_mapper import ObjectMapper
 from src.user_management.user_info import UserInfo
-from src.app_logic.app_logic import Review, User
+from src.user_management.session_tokens import SessionTokens
+from src.app_logic.app_logic import Review, User, Session
 
 class TestUserInfo(unittest.TestCase):
     """
@@ -23,7 +24,7 @@ class TestUserInfo(unittest.TestCase):
         """
         Set up the class for UserInfo tests by initializing paths and mappers.
         """
-        cls.db_path = "test.db"
+        cls.db_path = "file:test_user_info?mode=memory&cache=shared"
         cls.object_mapper = ObjectMapper(cls.db_path)
         cls.session_manager = SessionManager(cls.db_path)
         cls.user_info = UserInfo(cls.db_path)
@@ -43,6 +44,8 @@ class TestUserInfo(unittest.TestCase):
         password = "test_password"
         user = self.user_info.register(username, email, password)
         self.assertTrue(user)
+        # a taken username is refused rather than replacing the registered user
+        self.assertRaises(ValueError, self.user_info.register, username, "other@example.com", password)
 
     def test_login(self):
         """
@@ -67,6 +70,21 @@ class TestUserInfo(unittest.TestCase):
         retrieved_session = self.session_manager.get_session(user_id)
         self.assertFalse(retrieved_session.is_active)
 
+    def test_login_logout_with_session_tokens(self):
+        """
+        Test that login issues a signed session token and logout revokes it, without session rows.
+        """
+        session_tokens = SessionTokens(b"k" * 32)
+        user_info = UserInfo(self.db_path, session_tokens)
+        user_info.register("test_user", "test_user@example.com", "test_password")
+        sessions = len(self.session_manager.object_mapper.get(Session))
+        token = user_info.login("test_user", "test_password")
+        self.assertEqual(session_tokens.verify(token)["user_id"], self.object_mapper.get(User)[0].id)
+        self.assertIsNone(user_info.login("test_user", "wrong_password"))
+        user_info.logout(token)
+        self.assertIsNone(session_tokens.verify(token))
+        self.assertEqual(len(self.session_manager.object_mapper.get(Session)), sessions)
+
     #def test_search_review(self):
     def test_search_review(self):
         """
@@ -99,7 +117,7 @@ class TestUserInfo(unittest.TestCase):
         """
         Clean up after tests by removing the test database file.
         """
-        os.remove("src/database/test.db")
+        DataStore.release("file:test_user_info?mode=memory&cache=shared")
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,78 @@
+"""This module contains unit tests for the warmup.py module."""
+import json
+import os
+from unittest import TestCase
+from bottle import TEMPLATE_PATH, TEMPLATES, template
+from src.app_logic.app_logic import User, Topic
+from src.data_management.data_store import DataStore
+from src.data_management.object_mapper import ObjectMapper
+from src.server.server_app import WebServer
+from test.wsgi import call
+
+
+class TestWarmUp(TestCase):
+    """Unit tests for the WarmUp class."""
+    @classmethod
+    def setUpClass(cls):
+        # Create a new test database with a user and a topic
+        object_mapper = ObjectMapper("test_warmup.db")
+        object_mapper.data_store.clear_tables()
+        user = User("warm_user", "warm_user@example.com", "test_password")
+        object_mapper.add(user)
+        object_mapper.add(Topic("Warm topic", "description", user.id))
+
+    def setUp(self):
+        self.server = WebServer()
+        self.server.database_path = "test_warmup.db"
+
+    def tearDown(self):
+        self.server.suggestions.uninstall()
+        self.server.notifications.uninstall()
+
+    def test_ready_after_warm_up(self):
+        """tests that /ready answers 503 until the warm-up is complete, then returns its report"""
+        status, _, body = call(self.server, "/ready")
+        self.assertTrue(status.startswith("503"))
+        self.assertEqual(json.loads(body), {"ready": False})
+
+        self.server.warm_up.start().thread.join()
+        report = self.server.warm_up.report
+        status, _, body = call(self.server, "/ready")
+        self.assertTrue(status.startswith("200"))
+        self.assertEqual(json.loads(body)["warm_up"], report)
+        self.assertEqual(report["caches"]["rows"], {"topic": 1, "user": 1, "review": 0})
+        self.assertGreater(report["pages"]["bytes"], 0)
+        self.assertGreaterEqual(report["startup_s"], report["duration_s"])
+        self.assertEqual(self.server.suggestions.suggest("warm"), {"topics": ["Warm topic"], "users": ["warm_user"]})
+
+    def test_templates_are_compiled(self):
+        """tests that every template is compiled into bottle's cache and renders with its base template"""
+        report = self.server.warm_up.compile_templates()
+        self.assertEqual(report["compiled"], len([name for name in os.listdir("src/templates") if name.endswith(".tpl")]))
+        compiled = TEMPLATES[(id(TEMPLATE_PATH), "register.tpl")]
+        self.assertIn("co", vars(compiled))
+        self.assertIs(compiled.cache["base.tpl"], TEMPLATES[(id(TEMPLATE_PATH), "base.tpl")])
+        self.assertIn("<title>Register</title>", template("register.tpl"))
+
+    def test_templates_without_extension_are_compiled(self):
+        """tests that templates rendered by name without the .tpl extension come from the warm-up's cache"""
+        self.server.warm_up.compile_templates()
+        cached = dict(TEMPLATES)
+        self.assertIn('name="username"', template("login"))
+        template("register")
+        self.assertEqual(TEMPLATES, cached)
+        self.assertIs(TEMPLATES[(id(TEMPLATE_PATH), "login")], TEMPLATES[(id(TEMPLATE_PATH), "login.tpl")])
+
+    def test_schema_is_created_once(self):
+        """tests that opening the database again skips creating the tables, unless the file was replaced"""
+        data_store = DataStore("test_warmup.db")
+        key = (DataStore, data_store.db_path)
+        self.assertIn(key, DataStore._initialized)
+        DataStore._initialized[key] = ("stale", 0)
+        DataStore("test_warmup.db")
+        self.assertNotEqual(DataStore._initialized[key], ("stale", 0))
+
+    @classmethod
+    def tearDownClass(cls):
+        # After all tests, delete the test database
+        os.remove("src/database/test_warmup.db")
@@ -0,0 +1,39 @@
+"""This module contains a helper for calling a WSGI app in the unit tests."""
+import io
+from collections import namedtuple
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
+
+class Response(namedtuple("Response", ["status", "headers", "body"])):
+    """The status line, headers and body bytes of a response."""
+    @property
+    def text(self):
+        """the body decoded as UTF-8"""
+        return self.body.decode("utf-8")
+
+def call(app, path, method="GET", params=None, cookie=None, host=None, remote_addr="127.0.0.1",
+         query_string="", headers=None):
+    """
+    calls a WSGI app and returns its Response
+
+    params are form fields, sent in the body of a POST and in the query string otherwise,
+    headers are extra request headers such as {"Authorization": "Bearer ..."}
+    """
+    environ = {}
+    setup_testing_defaults(environ)
+    form = urlencode(params or {})
+    body = form.encode() if method == "POST" else b""
+    if form and method != "POST":
+        query_string = "&".join(part for part in (query_string, form) if part)
+    environ.update({"PATH_INFO": path, "REQUEST_METHOD": method, "QUERY_STRING": query_string,
+                    "REMOTE_ADDR": remote_addr, "wsgi.input": io.BytesIO(body),
+                    "CONTENT_TYPE": "application/x-www-form-urlencoded", "CONTENT_LENGTH": str(len(body))})
+    if cookie:
+        environ["HTTP_COOKIE"] = cookie
+    if host:
+        environ["HTTP_HOST"] = host
+    for name, value in (headers or {}).items():
+        environ["HTTP_" + name.upper().replace("-", "_")] = value
+    captured = {}
+    result = b"".join(app(environ, lambda status, headers, exc_info=None: captured.update(status=status, headers=dict(headers))))
+    return Response(captured["status"], captured["headers"], result)